@@ -1,7 +1,9 @@
 import asyncio
+import contextlib
 import datetime
 import os
 import shutil
+import sys
 import time
 from abc import ABC
 from pathlib import Path
@@ -46,13 +48,17 @@ from pydantic import BaseModel
 from sqlalchemy import select, create_engine
 
 from core.config import GlobalConfig
-from core.models import response_model
+from core.models import response_model, perm_model, group_model, metrics_model
 from core.orm import orm, Base
 from core.orm.tables import (
     GroupPerm,
     MemberPerm
 )
-from utils.launch_time import LaunchTimeService, add_launch_time
+from utils.http_pool import get_http_pool
+from utils.launch_time import LaunchTimeService, add_launch_time, add_phase_time, log_phase_time
+from utils.loop_watchdog import LoopWatchdogService
+from utils.module_loader import inspect_module, preload_dependencies
+from utils.render_pool import RenderPagePool
 from utils.self_upgrade import UpdaterService
 
 non_log = {
@@ -83,6 +89,8 @@ class Umaru(object):
     received_count: int = 0
     initialized: bool = False
     logs = []
+    # 延迟到初始化完成后加载的插件
+    deferred_modules: list[str] = []
 
     def __init__(self, g_config: GlobalConfig, base_path: str | Path):
         logger.opt(colors=True).info(f"<fg 227,122,80>{UMARU_BOT_LOGO}</>")
@@ -106,12 +114,15 @@ class Umaru(object):
         ) for bot_account in self.config.bot_accounts]
         if self.config.default_account:
             Ariadne.config(default_account=self.config.default_account)
+        # 统计监听器执行耗时
+        create(Broadcast).finale_dispatchers.append(metrics_model.MetricsDispatcher())
         Ariadne.launch_manager.add_service(
             PlaywrightService(
                 "chromium",
                 proxy={"server": self.config.proxy} if self.config.proxy != "proxy" else None
             )
         )
+        Ariadne.launch_manager.add_service(RenderPagePool())
         if self.config.web_manager_api:
             Ariadne.launch_manager.add_service(
                 UvicornService(
@@ -134,9 +145,22 @@ class Umaru(object):
         Ariadne.launch_manager.add_service(AlembicService())
         Ariadne.launch_manager.add_service(UpdaterService())
         Ariadne.launch_manager.add_service(LaunchTimeService())
+        Ariadne.launch_manager.add_service(LoopWatchdogService())
+        # 插件可能在此之前已经使用过连接池,因此注册已有的实例
+        Ariadne.launch_manager.add_service(get_http_pool())
         self.config_check()
         self.initialized_app_list: list[int] = []
         self.initialized_group_list: list[int] = []
+        # 初始化时并发请求mirai的数量
+        self.init_concurrency = 10
+        self.bot_profiles: dict[int, tuple[str, float]] = {}
+        """
+        bot_profiles = {
+            bot_account: (nickname, 获取时间)
+        }
+        """
+        self.bot_profile_ttl = 3600
+        self.deferred_task: asyncio.Task | None = None
 
     async def initialize(self):
         if self.initialized:
@@ -144,14 +168,20 @@ class Umaru(object):
         self.initialized = True
         self.set_logger()
         logger.debug(f"等待账号初始化")
-        await asyncio.sleep(len(self.apps) if len(self.apps) <= 5 else 5)
+        phase_start = time.time()
+        await self.wait_apps_available(len(self.apps) if len(self.apps) <= 5 else 5)
+        add_phase_time("等待账号连接", time.time() - phase_start)
         logger.debug("BOT初始化开始...")
         logger.debug(f"预计初始化{len(self.apps)}个账号")
         bcc = create(Broadcast)
         saya = create(Saya)
         saya.install_behaviours(BroadcastBehaviour(bcc))
+        phase_start = time.time()
         # 检查活动群组:
         await orm.update(GroupPerm, {"active": False}, [])
+        group_model.get_group_setting_controller().invalidate()
+        # 预热权限缓存
+        await perm_model.get_perm_cache().load()
         admin_list = []
         if result := await orm.fetch_all(
                 select(MemberPerm.qq).where(
@@ -161,26 +191,41 @@ class Umaru(object):
             for item in result:
                 if item[0] not in admin_list:
                     admin_list.append(item[0])
+        add_phase_time("加载权限数据", time.time() - phase_start)
+        phase_start = time.time()
         time_start = int(time.mktime(self.launch_time.timetuple()))
         Timeout = 60
+        semaphore = asyncio.Semaphore(self.init_concurrency)
         while ((time.time() - time_start) < Timeout) and (len(self.initialized_app_list) != len(self.apps)):
             tasks = []
             for app in self.apps:
-                tasks.append(self.init_app(app))
+                tasks.append(self.init_app(app, semaphore))
             await asyncio.gather(*tasks)
             logger.debug(f"已初始化账号{len(self.initialized_app_list)}/{len(self.config.bot_accounts)}")
             if len(self.initialized_app_list) != len(self.apps):
                 await asyncio.sleep(3)
+        add_phase_time("初始化账号群组", time.time() - phase_start)
+        # 加载群设置快照,供多账户响应初始化及之后的消息处理读取
+        phase_start = time.time()
+        await group_model.get_group_setting_controller().load()
+        add_phase_time("加载群设置", time.time() - phase_start)
         # 更新多账户响应
-        await response_model.get_acc_controller().init_all_group()
+        phase_start = time.time()
+        await response_model.get_acc_controller().init_all_group(self.init_concurrency)
         logger.success("成功初始化多账户响应!")
+        add_phase_time("初始化多账户响应", time.time() - phase_start)
         # 更新权限
+        phase_start = time.time()
         await self.update_master_permission()
         logger.success("成功更新master权限!")
         await self.update_admins_permission(admin_list)
         logger.success("成功更新admins权限!")
+        add_phase_time("更新成员权限", time.time() - phase_start)
+        log_phase_time()
         from core.control import Distribute
         Distribute.distribute_initialize()
+        if Umaru.deferred_modules:
+            self.deferred_task = asyncio.create_task(self.load_deferred_modules())
         if self.initialized_app_list:
             logger.info("本次启动活动群组如下：")
             for account, group_list in self.total_groups.items():
@@ -206,34 +251,64 @@ class Umaru(object):
                 f"初始化了{len(self.initialized_app_list)}/{len(self.apps)}个账户、{len(self.initialized_group_list)}个群组"
             )
 
-    async def init_app(self, app):
+    async def wait_apps_available(self, timeout: float):
+        """等待所有账号连接可用,超时后继续"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if all(app.connection.status.available for app in self.apps):
+                return
+            await asyncio.sleep(0.1)
+
+    async def init_app(self, app, semaphore: asyncio.Semaphore | None = None):
         if not app.connection.status.available:
             logger.warning(f"{app.account}失去连接,已跳过初始化")
             return
         if app.account in self.initialized_app_list:
             return
         logger.debug(f"账号{app.account}初始化ing")
-        group_list = [group for group in await app.get_group_list() if group.id not in self.initialized_group_list]
+        async with semaphore or asyncio.Semaphore(self.init_concurrency):
+            group_list = await app.get_group_list()
+        group_list = [group for group in group_list if group.id not in self.initialized_group_list]
         self.total_groups[app.account] = group_list
         # 更新群组权限
-        group_init_counter = 0
+        await self.init_group_perm(group_list)
+        if app.account not in self.initialized_app_list:
+            self.initialized_app_list.append(app.account)
+            logger.debug(f"账号{app.account}初始化完成,初始化群组{len(group_list)}个")
+
+    async def init_group_perm(self, group_list: list[Group]):
+        """批量更新群组权限和活动状态,规则与get_init_group_perm/get_init_group_active相同"""
+        group_list = list({group.id: group for group in group_list}.values())
+        if not group_list:
+            return
+        exist = {
+            group_id: (perm, active)
+            for group_id, perm, active in await orm.fetch_all(
+                select(GroupPerm.group_id, GroupPerm.perm, GroupPerm.active).where(
+                    GroupPerm.group_id.in_([group.id for group in group_list])
+                )
+            )
+        }
+        data_list = []
         for group in group_list:
+            if group.id == self.config.test_group:
+                perm = 3
+            elif group.id in exist and exist[group.id][0] == 2:
+                perm = 2
+            else:
+                perm = 1
+            active = exist[group.id][1] if group.id in exist else True
+            data_list.append({"group_id": group.id, "group_name": group.name, "active": active, "perm": perm})
+        await orm.insert_or_update_batch(
+            table=GroupPerm,
+            data_list=data_list,
+            conditions_list=[[GroupPerm.group_id == data["group_id"]] for data in data_list]
+        )
+        group_setting_controller = group_model.get_group_setting_controller()
+        for group in group_list:
+            group_setting_controller.invalidate(group.id)
             if group.id not in self.initialized_group_list:
-                # 更新Group权限和活动状态
-                perm = await self.get_init_group_perm(group)
-                active = await self.get_init_group_active(group)
-                await orm.insert_or_update(
-                    GroupPerm,
-                    {"group_id": group.id, "group_name": group.name, "active": active, "perm": perm},
-                    [
-                        GroupPerm.group_id == group.id
-                    ]
-                )
                 self.initialized_group_list.append(group.id)
-                group_init_counter += 1
-        if app.account not in self.initialized_app_list:
-            self.initialized_app_list.append(app.account)
-            logger.debug(f"账号{app.account}初始化完成,初始化群组{group_init_counter}个")
 
     async def get_init_group_perm(self, group: Group) -> int:
         # 更新群组权限
@@ -266,6 +341,7 @@ class Umaru(object):
                     GroupPerm.group_id == group.id
                 ]
             )
+            group_model.get_group_setting_controller().invalidate(group.id)
             return True
 
     async def init_group(self, app: Ariadne, group: Group):
@@ -283,9 +359,11 @@ class Umaru(object):
                 GroupPerm.group_id == group.id
             ]
         )
+        group_model.get_group_setting_controller().invalidate(group.id)
         self.initialized_app_list.append(app.account)
         # 更新成员权限
         member_list = await app.get_member_list(group)
+        perm_cache = perm_model.get_perm_cache()
         if self.config.Master in [member.id for member in member_list]:
             await orm.insert_or_update(
                 table=MemberPerm,
@@ -295,21 +373,26 @@ class Umaru(object):
                     MemberPerm.group_id == group.id
                 ]
             )
+            perm_cache.set(group.id, self.config.Master, 256)
         if result := await orm.fetch_all(
                 select(MemberPerm.qq).where(
                     MemberPerm.perm == 128,
                 )
         ):
-            admin_list = [item[0] for item in result]
-            for admin in admin_list:
-                await orm.insert_or_update(
-                    table=MemberPerm,
-                    data={"qq": admin, "group_id": group.id, "perm": 128},
-                    condition=[
+            admin_list = list({item[0] for item in result})
+            await orm.insert_or_update_batch(
+                table=MemberPerm,
+                data_list=[{"qq": admin, "group_id": group.id, "perm": 128} for admin in admin_list],
+                conditions_list=[
+                    [
                         MemberPerm.qq == admin,
                         MemberPerm.group_id == group.id,
                     ]
-                )
+                    for admin in admin_list
+                ]
+            )
+            for admin in admin_list:
+                perm_cache.set(group.id, admin, 128)
         await response_model.get_acc_controller().init_group(group.id, member_list, app.account)
         if group.id not in self.initialized_group_list:
             self.initialized_group_list.append(group.id)
@@ -338,6 +421,9 @@ class Umaru(object):
                 for group_id in group_id_list
             ]
         )
+        perm_cache = perm_model.get_perm_cache()
+        for group_id in group_id_list:
+            perm_cache.set(group_id, self.config.Master, 256)
 
     # 更新admins权限
     async def update_admins_permission(self, admin_list: list[int] = None):
@@ -370,17 +456,42 @@ class Umaru(object):
                 for admin in admin_list
             ]
         )
+        perm_cache = perm_model.get_perm_cache()
+        for group_id in group_id_list:
+            for admin in admin_list:
+                perm_cache.set(group_id, admin, 128)
+
+    async def refresh_bot_profile(self, app: Ariadne) -> str:
+        """重新获取并缓存bot的资料"""
+        try:
+            nickname = (await app.get_bot_profile()).nickname
+        except Exception as e:
+            logger.warning(f"获取bot{app.account}资料失败: {e}")
+            nickname = self.bot_profiles.get(app.account, (str(app.account), 0))[0]
+        self.bot_profiles[app.account] = (nickname, time.time())
+        return nickname
+
+    async def get_bot_nickname(self, app: Ariadne) -> str:
+        """获取bot昵称,使用缓存避免每条消息都请求mirai"""
+        if (profile := self.bot_profiles.get(app.account)) and time.time() - profile[1] < self.bot_profile_ttl:
+            return profile[0]
+        return await self.refresh_bot_profile(app)
 
     def set_log(self, log_str: str):
         self.logs.append(log_str.strip())
 
     def set_logger(self):
+        # 所有sink使用enqueue: 日志仍在调用处格式化,只有写入文件/终端等sink的操作交给后台线程,避免磁盘IO阻塞事件循环
+        with contextlib.suppress(ValueError):
+            logger.remove(0)
+            logger.add(sys.stderr, enqueue=True)
         logger.add(
             Path.cwd() / "log" / "{time:YYYY-MM-DD}" / "common.log",
             level="INFO",
             retention=f"{self.config.log_related['common_retention']} days",
             encoding="utf-8",
             rotation=datetime.time(),
+            enqueue=True,
         )
         logger.add(
             Path.cwd() / "log" / "{time:YYYY-MM-DD}" / "error.log",
@@ -388,8 +499,9 @@ class Umaru(object):
             retention=f"{self.config.log_related['error_retention']} days",
             encoding="utf-8",
             rotation=datetime.time(),
+            enqueue=True,
         )
-        logger.add(self.set_log)
+        logger.add(self.set_log, enqueue=True)
 
     def config_check(self) -> None:
         """配置检查"""
@@ -427,12 +539,15 @@ class Umaru(object):
                 logger.success(f"{' ' * indent}{key} - {dictionary[key]}")
 
     @staticmethod
-    def install_modules(base_path: str | Path, recursion_install: bool = False) -> Dict[str, Exception]:
+    def install_modules(
+            base_path: str | Path, recursion_install: bool = False, lazy: bool = False
+    ) -> Dict[str, Exception]:
         """加载 base_path 中的模块
 
         Args:
             base_path(str pr Path): 要进行加载的文件夹路径，只支持bot文件夹下的文件夹，使用相对路径（从main.py所在文件夹开始）, 如 Path("module") / "saya"
             recursion_install(bool): 是否加载 base_path 内的所有 installable 的模块（包括所有单文件模块、包模块以及base_path下属所有文件夹内的单文件模块、包模块）
+            lazy(bool): 是否延迟加载，为 True 时只立即加载监听了启动事件的模块，其余模块在bot初始化完成后于后台加载
 
         Returns:
             一个包含模块路径和加载时产生的错误的字典, example: {"module.test", ImportError}
@@ -440,38 +555,79 @@ class Umaru(object):
         """
         if isinstance(base_path, str):
             base_path = Path(base_path)
-        saya = create(Saya)
+        # 推后导入，避免循环导入
+        from core.models import saya_model
+        module_controller = saya_model.get_module_controller()
+        infos = [inspect_module(module) for module in Umaru.get_modules(base_path, recursion_install)]
+        eager = [info for info in infos if not lazy or info.eager]
+        Umaru.deferred_modules.extend(info.name for info in infos if lazy and not info.eager)
+        # 先在线程池中并行导入第三方依赖
+        add_launch_time(
+            f"{base_path.as_posix()}(依赖预加载)",
+            preload_dependencies(set().union(*(info.dependencies for info in eager))),
+            0,
+        )
+        exceptions = Umaru.require_modules([info.name for info in eager])
+        add_launch_time("插件元数据", module_controller.metadata_load_time, 0)
+        return exceptions
+
+    @staticmethod
+    def get_modules(base_path: Path, recursion_install: bool = False) -> list[str]:
+        """获取 base_path 中可加载的模块名"""
         module_base_path = base_path.as_posix().replace("/", ".")
-        exceptions = {}
+        modules = []
         ignore = {"__pycache__", "__init__.py"}
+        for module in os.listdir(str(base_path)):
+            if module in ignore:
+                continue
+            if (base_path / module).is_dir():
+                if (base_path / module / "__init__.py").exists():
+                    modules.append(f"{module_base_path}.{module}")
+                elif recursion_install:
+                    modules.extend(Umaru.get_modules(base_path / module, recursion_install))
+            elif (base_path / module).is_file():
+                modules.append(f"{module_base_path}.{module.split('.')[0]}")
+        return modules
+
+    @staticmethod
+    def require_modules(modules: list[str]) -> Dict[str, Exception]:
+        """依次加载模块并记录每个模块的加载耗时"""
+        saya = create(Saya)
+        from core.models import saya_model
+        module_controller = saya_model.get_module_controller()
+        exceptions = {}
         with saya.module_context():
-            for module in os.listdir(str(base_path)):
-                if module in ignore:
-                    continue
+            for module in modules:
+                start = time.perf_counter()
                 try:
-                    start = datetime.datetime.now()
-                    if (base_path / module).is_dir():
-                        if (base_path / module / "__init__.py").exists():
-                            saya.require(f"{module_base_path}.{module}")
-                        elif recursion_install:
-                            Umaru.install_modules(base_path / module, recursion_install)
-                    elif (base_path / module).is_file():
-                        saya.require(f"{module_base_path}.{module.split('.')[0]}")
-                    add_launch_time(
-                        f"{module_base_path}.{module}",
-                        (datetime.datetime.now() - start).total_seconds(),
-                        0,
-                    )
+                    saya.require(module)
+                    module_controller.refresh_metadata(module)
+                    add_launch_time(module, time.perf_counter() - start, 0)
                 except Exception as e:
                     logger.exception("")
-                    exceptions[str(base_path / module.split('.')[0])] = e
-                    add_launch_time(
-                        f"{module_base_path}.{module}",
-                        (datetime.datetime.now() - start).total_seconds(),
-                        1,
-                    )
+                    exceptions[str(Path(*module.split(".")))] = e
+                    add_launch_time(module, time.perf_counter() - start, 1)
         return exceptions
 
+    async def load_deferred_modules(self):
+        """在后台加载延迟加载的模块,依赖在线程池中预加载,模块之间让出事件循环"""
+        if not Umaru.deferred_modules:
+            return
+        modules, Umaru.deferred_modules = Umaru.deferred_modules, []
+        start = time.perf_counter()
+        infos = await asyncio.to_thread(lambda: [inspect_module(module) for module in modules])
+        preload_time = await asyncio.to_thread(
+            preload_dependencies, set().union(*(info.dependencies for info in infos))
+        )
+        exceptions = {}
+        for module in modules:
+            exceptions |= self.require_modules([module])
+            await asyncio.sleep(0)
+        logger.success(
+            f"延迟加载插件{len(modules) - len(exceptions)}/{len(modules)}个,"
+            f"耗时{time.perf_counter() - start:.2f}秒(依赖预加载{preload_time:.2f}秒)"
+        )
+
     async def alembic(self):
         alembic_path = Path.cwd() / "alembic"
 
@@ -18,9 +18,16 @@ class GlobalConfig(BaseModel):
     proxy: str
     api_port: int = 8080
     api_expose: bool = False
+    api_token: str = ""
     web_manager_api: bool = True
     web_manager_auto_boot: bool = False
     db_link: str = "sqlite+aiosqlite:///data.db"
+    frequency_backend: str = "memory"
+    frequency_db_path: str = "frequency.db"
+    frequency_module_config: dict = {}
+    lazy_load_modules: bool = False
+    http_limit: int = 0
+    http_limit_per_host: int = 0
     log_related: dict = {"error_retention": 14, "common_retention": 7}
     auto_upgrade: bool = False
     functions: dict = {
@@ -17,10 +17,13 @@ from core.config import GlobalConfig
 from core.models import (
     saya_model,
     frequency_model,
-    response_model
+    response_model,
+    perm_model,
+    group_model,
+    metrics_model
 )
 from core.orm import orm
-from core.orm.tables import MemberPerm, GroupPerm, GroupSetting
+from core.orm.tables import MemberPerm, GroupPerm
 
 global_config = create(GlobalConfig)
 
@@ -85,13 +88,38 @@ class Permission(object):
 
     @staticmethod
     async def get_user_perm_byID(group_id: int, member_id: int) -> int:
-        if result := await orm.fetch_one(
-                select(MemberPerm.perm).where(MemberPerm.group_id == group_id, MemberPerm.qq == member_id)
-        ):
-            return result[0]
+        if (perm := await perm_model.get_perm_cache().get(group_id, member_id)) is not None:
+            return perm
         else:
             return Permission.User
 
+    @staticmethod
+    async def set_user_perm(group_id: int, member_id: int, perm: int):
+        """
+        写入成员权限并同步权限缓存
+        """
+        await orm.insert_or_update(
+            table=MemberPerm,
+            data={"group_id": group_id, "qq": member_id, "perm": perm},
+            condition=[
+                MemberPerm.qq == member_id,
+                MemberPerm.group_id == group_id
+            ]
+        )
+        perm_model.get_perm_cache().set(group_id, member_id, perm)
+
+    @staticmethod
+    async def del_user_perm(group_id: int | None, member_id: int):
+        """
+        删除成员权限并同步权限缓存
+        :param group_id: 群号,为None时删除该成员在所有群的权限
+        """
+        condition = [MemberPerm.qq == member_id]
+        if group_id is not None:
+            condition.append(MemberPerm.group_id == group_id)
+        await orm.delete(table=MemberPerm, condition=condition)
+        perm_model.get_perm_cache().remove(group_id, member_id)
+
     @staticmethod
     async def get_users_perm_byID(group_id: int) -> list[int]:
         return await orm.fetch_all(
@@ -127,27 +155,16 @@ class Permission(object):
 
     @staticmethod
     async def get_group_perm_type(group_id: int) -> str:
-        if result := await orm.fetch_one(
-                select(GroupSetting.permission_type).where(GroupSetting.group_id == group_id)
-        ):
-            return result[0]
-        else:
-            return "default"
+        return (await group_model.get_group_setting_controller().get(group_id)).permission_type
 
     @staticmethod
     async def require_user_perm(group_id: int, member_id: int, perm: int) -> bool:
-        if result := await orm.fetch_one(
-                select(MemberPerm.perm).where(MemberPerm.group_id == group_id, MemberPerm.qq == member_id)
-        ):
-            return result[0] >= perm
-        else:
-            return Permission.User >= perm
+        return await Permission.get_user_perm_byID(group_id, member_id) >= perm
 
     @staticmethod
     async def require_group_perm(group_id: int, perm: int) -> bool:
-        if result := await orm.fetch_one(select(GroupPerm.perm).where(
-                GroupPerm.group_id == group_id)):
-            return result[0] >= perm
+        if (group_perm := (await group_model.get_group_setting_controller().get(group_id)).perm) is not None:
+            return group_perm >= perm
         else:
             return Permission.ActiveGroup >= perm
 
@@ -158,35 +175,30 @@ class Permission(object):
         :return: 查询到的权限
         """
         sender = event.sender
+        perm_cache = perm_model.get_perm_cache()
         # 判断是群还是好友
         group_id = event.sender.group.id if isinstance(event, GroupMessage) else None
         if not group_id:
             # 查询是否在全局黑当中
             # 如果有查询到数据，则返回用户的权限等级
-            if result := await orm.fetch_one(
-                    select(MemberPerm.perm).where(
-                        MemberPerm.qq == sender.id,
-                        MemberPerm.group_id == 0
-                    )
-            ):
-                return result[0]
+            if (perm := await perm_cache.get(0, sender.id)) is not None:
+                return perm
             else:
                 if sender.id == global_config.Master:
                     return Permission.Master
-                elif sender.id in cls.get_BotAdminsList():
+                elif sender.id in await cls.get_BotAdminsList():
                     return Permission.BotAdmin
                 else:
                     return Permission.User
         # 如果有查询到数据，则返回用户的权限等级
-        if result := await orm.fetch_one(
-                select(MemberPerm.perm).where(MemberPerm.group_id == group_id, MemberPerm.qq == sender.id)
-        ):
-            return result[0]
+        if (perm := await perm_cache.get(group_id, sender.id)) is not None:
+            return perm
         # 如果没有查询到数据，则写入初始权限
         else:
             perm = cls.member_permStr_dict[event.sender.permission.name]
+            inserted = False
             with contextlib.suppress(sqlalchemy.exc.IntegrityError):
-                await orm.insert_or_ignore(
+                inserted = await orm.insert_or_ignore(
                     table=MemberPerm,
                     condition=[
                         MemberPerm.qq == sender.id,
@@ -197,7 +209,15 @@ class Permission(object):
                         "qq": sender.id,
                         "perm": perm
                     }
-                )
+                ) is not None
+            if not inserted:
+                # 记录已被其他写入方插入,以数据库中的权限为准,查不到时不写入缓存
+                if not (result := await orm.fetch_one(
+                        select(MemberPerm.perm).where(MemberPerm.group_id == group_id, MemberPerm.qq == sender.id)
+                )):
+                    return perm
+                perm = result[0]
+            perm_cache.set(group_id, sender.id, perm)
             return perm
 
     @classmethod
@@ -234,11 +254,11 @@ class Permission(object):
         根据传入的群实例获取群权限
         :return: 查询到的权限
         """
-        # 查询数据库
+        # 查询群设置快照
         # 如果有查询到数据，则返回群的权限等级
-        if result := await orm.fetch_one(select(GroupPerm.perm).where(
-                GroupPerm.group_id == group.id)):
-            return result[0]
+        group_setting_controller = group_model.get_group_setting_controller()
+        if (group_perm := (await group_setting_controller.get(group.id)).perm) is not None:
+            return group_perm
         # 如果没有查询到数据，则返回1（活跃群）,并写入初始权限1
         else:
             if group.id == global_config.test_group:
@@ -253,6 +273,7 @@ class Permission(object):
                         GroupPerm.group_id == group.id
                     ]
                 )
+                group_setting_controller.invalidate(group.id)
                 return Permission.ActiveGroup
 
     @classmethod
@@ -286,33 +307,40 @@ class Function(object):
     @classmethod
     def require(cls, module_name: str, notice: bool = True):
         async def judge(app: Ariadne, group: Union[Group, Friend], source: Source or None = None):
+            metrics_model.current_module.set(module_name)
             if isinstance(group, Friend):
                 return Depend(judge)
-            # 如果module_name不在modules_list里面就添加
             module_controller = saya_model.get_module_controller()
-            if module_name not in module_controller.modules:
-                module_controller.add_module(module_name)
             if not group:
+                if module_name not in module_controller.modules:
+                    module_controller.add_module(module_name)
                 return
-            # 如果group不在modules里面就添加
-            if str(group.id) not in module_controller.modules[module_name]:
-                module_controller.add_group(group)
-            module_meta = module_controller.get_metadata_from_module_name(module_name)
+            # 从位图读取状态,插件或群未初始化时先添加
+            if not (state := module_controller.get_module_state(module_name, group.id)):
+                # 如果module_name不在modules_list里面就添加
+                if module_name not in module_controller.modules:
+                    module_controller.add_module(module_name)
+                # 如果group不在modules里面就添加
+                if str(group.id) not in module_controller.modules[module_name]:
+                    module_controller.add_group(group)
+                state = module_controller.get_module_state(module_name, group.id)
+            available, switch_on, notice_on = state
             # 如果在维护就停止
-            if not module_controller.if_module_available(module_name):
-                if notice and module_controller.if_module_notice_on(module_name, group):
+            if not available:
+                if notice and notice_on:
+                    module_meta = module_controller.get_metadata_from_module_name(module_name)
                     await app.send_message(group, MessageChain(
                         f"{module_meta.display_name or module_name}插件正在维护~"
                     ), quote=source)
                 raise ExecutionStop
-            else:
-                # 如果群未打开开关就停止
-                if not module_controller.if_module_switch_on(module_name, group):
-                    if notice and module_controller.if_module_notice_on(module_name, group):
-                        await app.send_message(group, MessageChain(
-                            f"{module_meta.display_name or module_name}插件已关闭\n请使用‘-开启 插件编号’来打开插件\n插件编号请使用‘帮助’获取"
-                        ), quote=source)
-                    raise ExecutionStop
+            # 如果群未打开开关就停止
+            if not switch_on:
+                if notice and notice_on:
+                    module_meta = module_controller.get_metadata_from_module_name(module_name)
+                    await app.send_message(group, MessageChain(
+                        f"{module_meta.display_name or module_name}插件已关闭\n请使用‘-开启 插件编号’来打开插件\n插件编号请使用‘帮助’获取"
+                    ), quote=source)
+                raise ExecutionStop
             return
 
         return Depend(judge)
@@ -388,29 +416,27 @@ class FrequencyLimitation(object):
             group_id = event.sender.group.id
             sender_id = event.sender.id
             # 是否开启频率限制
-            if frequency_limitation_switch := await orm.fetch_one(
-                    select(GroupSetting.frequency_limitation).where(GroupSetting.group_id == group_id)
-            ):
-                frequency_limitation_switch = frequency_limitation_switch[0]
-            if not frequency_limitation_switch:
+            if not (await group_model.get_group_setting_controller().get(group_id)).frequency_limitation:
                 return
             # 是否越权
             if await Permission.get_user_perm(event) >= override_perm:
                 return
 
             frequency_controller = frequency_model.get_frequency_controller()
-            frequency_controller.add_weight(module_name, group_id, sender_id, weight)
-            # 如果已经在黑名单则返回
-            if frequency_controller.blacklist_judge(group_id, sender_id):
-                if not frequency_controller.blacklist_noticed_judge(group_id, sender_id):
+            state = await frequency_controller.hit(module_name, group_id, sender_id, weight)
+            # 如果已经在黑名单则返回,多个进程共享黑名单时只由第一个标记成功的进程通知
+            if state.blacklisted:
+                if not state.noticed and await frequency_controller.notice(group_id, sender_id):
                     await app.send_message(
                         event.sender.group,
-                        MessageChain("检测到大量请求,加入黑名单5分钟!"),
+                        MessageChain(
+                            f"检测到大量请求,加入黑名单"
+                            f"{frequency_controller.get_config(module_name).ban_time / 60:g}分钟!"
+                        ),
                         quote=src
                     )
-                    frequency_controller.blacklist_notice(group_id, sender_id)
                 raise ExecutionStop
-            current_weight = frequency_controller.get_weight(module_name, group_id, sender_id)
+            current_weight = state.total
             if (current_weight + weight) >= total_weights:
                 await app.send_message(
                     event.sender.group,
@@ -1,132 +1,344 @@
+import asyncio
+import sqlite3
+import threading
 import time
-from abc import ABC
-from collections import deque
+from abc import ABC, abstractmethod
+from collections import deque, OrderedDict
 from typing import Type
 
 from creart import create, AbstractCreator, CreateTargetInfo, exists_module, add_creator
 
+from core.config import GlobalConfig
+
 frequency_controller_instance = None
 
 
-class FrequencyController(object):
-    """频率控制器
-    frequency_dict = {
-        module_name: {
-            group_id: {
-                sender_id: deque([(时间戳1, 权重1), (时间戳2, 权重2)])
-                ...
-            },
-        },
-    }
+class FrequencyConfig(object):
+    """单个模块的频率限制配置"""
+    __slots__ = ("window", "blacklist_weights", "ban_time")
+
+    def __init__(self, window: float = 15, blacklist_weights: int = 12, ban_time: float = 300):
+        """
+        :param window: 滑动窗口长度(秒)
+        :param blacklist_weights: 窗口内权重达到该值时加入黑名单
+        :param ban_time: 黑名单时长(秒)
+        """
+        self.window = window
+        self.blacklist_weights = blacklist_weights
+        self.ban_time = ban_time
+
+
+class FrequencyState(object):
+    """一次计数后的状态"""
+    __slots__ = ("total", "blacklisted", "noticed")
+
+    def __init__(self, total: int, blacklisted: bool, noticed: bool):
+        """
+        :param total: 计入本次权重后窗口内的总权重
+        :param blacklisted: 是否在黑名单中
+        :param noticed: 是否已发送过黑名单通知
+        """
+        self.total = total
+        self.blacklisted = blacklisted
+        self.noticed = noticed
+
+
+class FrequencyBackend(ABC):
+    """频率限制后端
+
+    memory: 进程内计数(FrequencyController)
+    sqlite: 多个bot进程通过同一个SQLite文件共享计数(SqliteFrequencyBackend)
+    """
+
+    def __init__(self):
+        self.default_config = FrequencyConfig()
+        self.module_config: dict[str, FrequencyConfig] = {}
+
+    def get_config(self, module_name: str) -> FrequencyConfig:
+        return self.module_config.get(module_name, self.default_config)
+
+    def set_module_config(
+            self,
+            module_name: str,
+            window: float | None = None,
+            blacklist_weights: int | None = None,
+            ban_time: float | None = None
+    ):
+        """设置模块的窗口长度、黑名单阈值和黑名单时长,未传入的项使用默认值"""
+        self.module_config[module_name] = FrequencyConfig(
+            window=window if window is not None else self.default_config.window,
+            blacklist_weights=(
+                blacklist_weights if blacklist_weights is not None else self.default_config.blacklist_weights
+            ),
+            ban_time=ban_time if ban_time is not None else self.default_config.ban_time
+        )
+
+    @abstractmethod
+    async def hit(self, module_name: str, group_id: int, sender_id: int, weight: int) -> FrequencyState:
+        """原子地计入权重、判断并在超过阈值时加入黑名单"""
+
+    @abstractmethod
+    async def notice(self, group_id: int, sender_id: int) -> bool:
+        """标记黑名单已通知,返回本次是否为首次标记"""
+
+
+class WeightWindow(object):
+    """滑动窗口,维护窗口内的权重总和,每条记录只会入队出队各一次"""
+    __slots__ = ("records", "total", "last_time")
+
+    def __init__(self):
+        self.records: deque[tuple[float, int]] = deque()
+        self.total = 0
+        self.last_time = 0.0
+
+    def expire(self, current_time: float, window: float):
+        records = self.records
+        while records and records[0][0] < current_time - window:
+            self.total -= records.popleft()[1]
+
+    def add(self, current_time: float, weight: int):
+        self.records.append((current_time, weight))
+        self.total += weight
+        self.last_time = current_time
+
+
+class FrequencyController(FrequencyBackend):
+    """频率控制器(进程内)
+    frequency_dict = OrderedDict({
+        (module_name, group_id, sender_id): WeightWindow
+    })
 
     blacklist = {
-        group_id: {
-            sender_id: {
-                time: xxx,
-                noticed: True/False
-            }
+        (group_id, sender_id): {
+            time: xxx,
+            noticed: True/False
         }
     }
     """
 
-    def __init__(self):
-        # 格式：{模块名: {群组ID: {发送者ID: deque([时间戳])}}}
-        # 使用双端队列（deque）来存储每个用户在过去15秒内的触发时间。
-        self.frequency_dict = {}
+    def __init__(self, max_keys: int = 100000, cleanup_interval: float = 60):
+        """
+        :param max_keys: 最多同时记录的(模块, 群, 用户)数量,超出时淘汰最久未使用的
+        :param cleanup_interval: 清理空闲记录的间隔(秒)
+        """
+        super().__init__()
+        # 按最近使用顺序排列,用于在超出max_keys时淘汰最久未使用的记录
+        self.frequency_dict: OrderedDict[tuple, WeightWindow] = OrderedDict()
 
-        # 格式：{群组ID: {发送者ID: {时间: xxx, 通知: True/False}}}
         # 黑名单数据结构，用于存储被限制的用户及其限制信息。
-        self.blacklist = {}
+        self.blacklist: dict[tuple[int, int], dict] = {}
+
+        self.max_keys = max_keys
+        self.cleanup_interval = cleanup_interval
+        self.last_cleanup = time.time()
 
-    def init_blacklist(self, group_id, sender_id):
-        if group_id not in self.blacklist:
-            self.blacklist[group_id] = {}
-        if sender_id not in self.blacklist[group_id]:
-            self.blacklist[group_id][sender_id] = {}
+    def cleanup(self, current_time: float):
+        """移除窗口内已没有记录的key和已过期的黑名单"""
+        for key in [
+            key for key, window in self.frequency_dict.items()
+            if window.last_time < current_time - self.get_config(key[0]).window
+        ]:
+            del self.frequency_dict[key]
+        for key in [key for key, value in self.blacklist.items() if value["time"] <= current_time]:
+            del self.blacklist[key]
+        self.last_cleanup = current_time
 
     def add_weight(self, module_name, group_id, sender_id, weight):
         current_time = time.time()
-        if module_name not in self.frequency_dict:
-            self.frequency_dict[module_name] = {}
-        if group_id not in self.frequency_dict[module_name]:
-            self.frequency_dict[module_name][group_id] = {}
-        if sender_id not in self.frequency_dict[module_name][group_id]:
-            self.frequency_dict[module_name][group_id][sender_id] = deque()
-
-        # 移除早于（当前时间 - 15秒）的元组
-        while (len(self.frequency_dict[module_name][group_id][sender_id]) > 0) and \
-                (self.frequency_dict[module_name][group_id][sender_id][0][0] < current_time - 15):
-            self.frequency_dict[module_name][group_id][sender_id].popleft()
-
-        # 添加新的权重和时间戳
-        self.frequency_dict[module_name][group_id][sender_id].append((current_time, weight))
+        if current_time - self.last_cleanup > self.cleanup_interval:
+            self.cleanup(current_time)
+        config = self.get_config(module_name)
+        key = (module_name, group_id, sender_id)
+        if window := self.frequency_dict.get(key):
+            self.frequency_dict.move_to_end(key)
+        else:
+            window = self.frequency_dict[key] = WeightWindow()
+            if len(self.frequency_dict) > self.max_keys:
+                self.frequency_dict.popitem(last=False)
 
-        # 计算总权重
-        total_weight = sum(w for _, w in self.frequency_dict[module_name][group_id][sender_id])
+        # 移除早于（当前时间 - 窗口长度）的记录并添加新的权重
+        window.expire(current_time, config.window)
+        window.add(current_time, weight)
 
-        if total_weight >= 12:
+        if window.total >= config.blacklist_weights:
             if self.blacklist_judge(group_id, sender_id):
                 return
-            self.add_blacklist(group_id, sender_id)
+            self.add_blacklist(group_id, sender_id, config.ban_time)
 
     def get_weight(self, module_name, group_id, sender_id) -> int:
-        current_time = time.time()
-        if module_name not in self.frequency_dict:
-            return 0
-        if group_id not in self.frequency_dict[module_name]:
+        if not (window := self.frequency_dict.get((module_name, group_id, sender_id))):
             return 0
-        if sender_id not in self.frequency_dict[module_name][group_id]:
-            return 0
-
-        # 移除早于（当前时间 - 15秒）的元组
-        while (len(self.frequency_dict[module_name][group_id][sender_id]) > 0) and \
-                (self.frequency_dict[module_name][group_id][sender_id][0][0] < current_time - 15):
-            self.frequency_dict[module_name][group_id][sender_id].popleft()
-
-        # 计算并返回总权重
-        return sum(w for _, w in self.frequency_dict[module_name][group_id][sender_id])
+        window.expire(time.time(), self.get_config(module_name).window)
+        return window.total
 
     def blacklist_judge(self, group_id, sender_id):
         """判断是否在黑名单中, 如果在黑名单中则返回True, 否则返回False"""
-        self.init_blacklist(group_id, sender_id)
-        if self.blacklist[group_id][sender_id].get("time", time.time()) > time.time():
-            return True
-        else:
-            self.blacklist[group_id][sender_id] = {}
+        if not (item := self.blacklist.get((group_id, sender_id))):
             return False
+        if item["time"] > time.time():
+            return True
+        del self.blacklist[(group_id, sender_id)]
+        return False
 
     def blacklist_notice(self, group_id, sender_id):
-        self.blacklist[group_id][sender_id]["noticed"] = True
+        if item := self.blacklist.get((group_id, sender_id)):
+            item["noticed"] = True
 
     def blacklist_noticed_judge(self, group_id, sender_id):
-        if sender_id in self.blacklist[group_id]:
-            return self.blacklist[group_id][sender_id].get("noticed", False)
+        if item := self.blacklist.get((group_id, sender_id)):
+            return item["noticed"]
+        return False
 
-    def add_blacklist(self, group_id, sender_id):
-        self.init_blacklist(group_id, sender_id)
-        self.blacklist[group_id][sender_id] = {
-            "time": time.time() + 300,  # 5分钟
+    def add_blacklist(self, group_id, sender_id, ban_time: float = 300):
+        self.blacklist[(group_id, sender_id)] = {
+            "time": time.time() + ban_time,  # 默认5分钟
             "noticed": False
         }
 
+    async def hit(self, module_name: str, group_id: int, sender_id: int, weight: int) -> FrequencyState:
+        self.add_weight(module_name, group_id, sender_id, weight)
+        total = self.get_weight(module_name, group_id, sender_id)
+        if self.blacklist_judge(group_id, sender_id):
+            return FrequencyState(total, True, self.blacklist_noticed_judge(group_id, sender_id))
+        return FrequencyState(total, False, False)
+
+    async def notice(self, group_id: int, sender_id: int) -> bool:
+        if self.blacklist_noticed_judge(group_id, sender_id):
+            return False
+        self.blacklist_notice(group_id, sender_id)
+        return True
+
+    def get_stats(self) -> dict:
+        return {
+            "keys": len(self.frequency_dict),
+            "max_keys": self.max_keys,
+            "blacklist": len(self.blacklist)
+        }
+
 
-def get_frequency_controller() -> FrequencyController:
+class SqliteFrequencyBackend(FrequencyBackend):
+    """基于本地SQLite文件的共享频率限制后端
+
+    同一台机器上的多个bot进程指向同一个文件即可共享计数与黑名单,
+    每次计数在一个BEGIN IMMEDIATE事务内完成,保证跨进程的原子性。
+    """
+
+    def __init__(self, db_path: str, cleanup_interval: float = 60):
+        super().__init__()
+        self.db_path = db_path
+        self.cleanup_interval = cleanup_interval
+        self.last_cleanup = time.time()
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, timeout=5, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute("PRAGMA synchronous = normal;")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS frequency_record ("
+            "module_name TEXT NOT NULL, group_id INTEGER NOT NULL, sender_id INTEGER NOT NULL, "
+            "time REAL NOT NULL, weight INTEGER NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS frequency_record_key "
+            "ON frequency_record (module_name, group_id, sender_id, time)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS frequency_blacklist ("
+            "group_id INTEGER NOT NULL, sender_id INTEGER NOT NULL, expire REAL NOT NULL, "
+            "noticed INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (group_id, sender_id))"
+        )
+
+    def _hit(self, module_name: str, group_id: int, sender_id: int, weight: int) -> FrequencyState:
+        config = self.get_config(module_name)
+        current_time = time.time()
+        key = (module_name, group_id, sender_id)
+        with self.lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                if current_time - self.last_cleanup > self.cleanup_interval:
+                    max_window = max(
+                        [self.default_config.window] + [item.window for item in self.module_config.values()]
+                    )
+                    cursor.execute("DELETE FROM frequency_record WHERE time < ?", (current_time - max_window,))
+                    cursor.execute("DELETE FROM frequency_blacklist WHERE expire <= ?", (current_time,))
+                    self.last_cleanup = current_time
+                cursor.execute(
+                    "DELETE FROM frequency_record WHERE module_name = ? AND group_id = ? AND sender_id = ? "
+                    "AND time < ?",
+                    (*key, current_time - config.window)
+                )
+                cursor.execute("INSERT INTO frequency_record VALUES (?, ?, ?, ?, ?)", (*key, current_time, weight))
+                total = cursor.execute(
+                    "SELECT COALESCE(SUM(weight), 0) FROM frequency_record "
+                    "WHERE module_name = ? AND group_id = ? AND sender_id = ?",
+                    key
+                ).fetchone()[0]
+                row = cursor.execute(
+                    "SELECT expire, noticed FROM frequency_blacklist WHERE group_id = ? AND sender_id = ?",
+                    (group_id, sender_id)
+                ).fetchone()
+                if row and row[0] > current_time:
+                    state = FrequencyState(total, True, bool(row[1]))
+                elif total >= config.blacklist_weights:
+                    cursor.execute(
+                        "INSERT OR REPLACE INTO frequency_blacklist VALUES (?, ?, ?, 0)",
+                        (group_id, sender_id, current_time + config.ban_time)
+                    )
+                    state = FrequencyState(total, True, False)
+                else:
+                    state = FrequencyState(total, False, False)
+                cursor.execute("COMMIT")
+                return state
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+            finally:
+                cursor.close()
+
+    def _notice(self, group_id: int, sender_id: int) -> bool:
+        with self.lock:
+            cursor = self.conn.execute(
+                "UPDATE frequency_blacklist SET noticed = 1 WHERE group_id = ? AND sender_id = ? AND noticed = 0",
+                (group_id, sender_id)
+            )
+            return cursor.rowcount == 1
+
+    async def hit(self, module_name: str, group_id: int, sender_id: int, weight: int) -> FrequencyState:
+        return await asyncio.to_thread(self._hit, module_name, group_id, sender_id, weight)
+
+    async def notice(self, group_id: int, sender_id: int) -> bool:
+        return await asyncio.to_thread(self._notice, group_id, sender_id)
+
+
+def get_frequency_controller() -> FrequencyBackend:
     global frequency_controller_instance
     if not frequency_controller_instance:
-        frequency_controller_instance = create(FrequencyController)
+        frequency_controller_instance = create(FrequencyBackend)
     return frequency_controller_instance
 
 
 class FrequencyControllerClassCreator(AbstractCreator, ABC):
-    targets = (CreateTargetInfo("core.models.frequency_model", "FrequencyController"),)
+    targets = (CreateTargetInfo("core.models.frequency_model", "FrequencyBackend"),)
 
     @staticmethod
     def available() -> bool:
         return exists_module("core.models.frequency_model")
 
     @staticmethod
-    def create(create_type: Type[FrequencyController]) -> FrequencyController:
-        return FrequencyController()
+    def create(create_type: Type[FrequencyBackend]) -> FrequencyBackend:
+        config = create(GlobalConfig)
+        if config.frequency_backend == "sqlite":
+            backend = SqliteFrequencyBackend(config.frequency_db_path)
+        else:
+            backend = FrequencyController()
+        for module_name, module_config in config.frequency_module_config.items():
+            backend.set_module_config(
+                module_name,
+                window=module_config.get("window"),
+                blacklist_weights=module_config.get("blacklist_weights"),
+                ban_time=module_config.get("ban_time")
+            )
+        return backend
 
 
 add_creator(FrequencyControllerClassCreator)
@@ -0,0 +1,176 @@
+import asyncio
+from abc import ABC
+from typing import Type
+
+from creart import create, AbstractCreator, CreateTargetInfo, exists_module, add_creator
+from loguru import logger
+from sqlalchemy import select
+
+from core.orm import orm
+from core.orm.tables import GroupPerm, GroupSetting
+
+group_setting_controller_instance = None
+
+
+class GroupSettings(object):
+    """群设置快照(只读)
+    合并GroupPerm与GroupSetting中同一个群的数据,供消息处理链共享
+    """
+    __slots__ = ("group_id", "perm", "active", "frequency_limitation", "response_type", "permission_type")
+
+    def __init__(
+            self,
+            group_id: int,
+            perm: int | None = None,
+            active: bool = True,
+            frequency_limitation: bool = False,
+            response_type: str = "random",
+            permission_type: str = "default"
+    ):
+        """
+        :param perm: 群权限,为None时表示GroupPerm中没有该群的记录
+        :param frequency_limitation: 是否开启频率限制,GroupSetting中没有记录时视为不开启
+        """
+        object.__setattr__(self, "group_id", group_id)
+        object.__setattr__(self, "perm", perm)
+        object.__setattr__(self, "active", active)
+        object.__setattr__(self, "frequency_limitation", bool(frequency_limitation))
+        object.__setattr__(self, "response_type", response_type or "random")
+        object.__setattr__(self, "permission_type", permission_type or "default")
+
+    def __setattr__(self, key, value):
+        raise AttributeError("GroupSettings是只读快照,请通过写入数据库后invalidate来更新")
+
+    def __repr__(self):
+        return (
+            f"GroupSettings(group_id={self.group_id}, perm={self.perm}, active={self.active}, "
+            f"frequency_limitation={self.frequency_limitation}, response_type={self.response_type}, "
+            f"permission_type={self.permission_type})"
+        )
+
+
+class GroupSettingsController(object):
+    """群设置控制器
+    settings_dict = {
+        group_id: GroupSettings
+    }
+
+    同一个群的并发查询会合并为一次加载,GroupPerm/GroupSetting被写入后需调用invalidate
+    """
+
+    def __init__(self):
+        self.settings_dict: dict[int, GroupSettings] = {}
+        self.loading: dict[int, asyncio.Future] = {}
+        # 每次失效自增,用于丢弃失效前发起的加载结果
+        self.version: dict[int, int] = {}
+        self.global_version = 0
+
+    async def load(self):
+        """全量加载所有群的设置"""
+        global_version = self.global_version
+        versions = dict(self.version)
+        perm_rows = await orm.fetch_all(select(GroupPerm.group_id, GroupPerm.perm, GroupPerm.active))
+        setting_rows = await orm.fetch_all(
+            select(
+                GroupSetting.group_id,
+                GroupSetting.frequency_limitation,
+                GroupSetting.response_type,
+                GroupSetting.permission_type
+            )
+        )
+        if global_version != self.global_version:
+            return
+        data = {}
+        for group_id, perm, active in perm_rows:
+            data[group_id] = {"perm": perm, "active": active}
+        for group_id, frequency_limitation, response_type, permission_type in setting_rows:
+            data.setdefault(group_id, {}).update({
+                "frequency_limitation": frequency_limitation,
+                "response_type": response_type,
+                "permission_type": permission_type
+            })
+        settings_dict = {}
+        for group_id, item in data.items():
+            if self.version.get(group_id, 0) != versions.get(group_id, 0):
+                # 加载期间被失效的群不使用本次读取的数据,保留失效后重新加载的结果(如有)
+                if settings := self.settings_dict.get(group_id):
+                    settings_dict[group_id] = settings
+                continue
+            settings_dict[group_id] = GroupSettings(group_id, **item)
+        self.settings_dict = settings_dict
+        logger.success(f"成功加载群设置,共{len(self.settings_dict)}个群")
+
+    async def get(self, group_id: int) -> GroupSettings:
+        """获取群设置快照"""
+        if settings := self.settings_dict.get(group_id):
+            return settings
+        if group_id not in self.loading:
+            self.loading[group_id] = asyncio.ensure_future(self._load_group(group_id))
+        try:
+            return await asyncio.shield(self.loading[group_id])
+        finally:
+            if group_id in self.loading and self.loading[group_id].done():
+                del self.loading[group_id]
+
+    async def _load_group(self, group_id: int) -> GroupSettings:
+        version = (self.global_version, self.version.get(group_id, 0))
+        settings = GroupSettings(group_id)
+        if result := await orm.fetch_one(
+                select(GroupPerm.perm, GroupPerm.active).where(GroupPerm.group_id == group_id)
+        ):
+            settings = GroupSettings(group_id, perm=result[0], active=result[1])
+        if result := await orm.fetch_one(
+                select(
+                    GroupSetting.frequency_limitation,
+                    GroupSetting.response_type,
+                    GroupSetting.permission_type
+                ).where(GroupSetting.group_id == group_id)
+        ):
+            settings = GroupSettings(
+                group_id,
+                perm=settings.perm,
+                active=settings.active,
+                frequency_limitation=result[0],
+                response_type=result[1],
+                permission_type=result[2]
+            )
+        # 加载期间被失效过则不写入缓存
+        if version == (self.global_version, self.version.get(group_id, 0)):
+            self.settings_dict[group_id] = settings
+        return settings
+
+    def invalidate(self, group_id: int | None = None):
+        """
+        使群设置快照失效
+        :param group_id: 群号,为None时使所有群失效
+        """
+        if group_id is None:
+            self.global_version += 1
+            self.settings_dict = {}
+            self.loading = {}
+            return
+        self.version[group_id] = self.version.get(group_id, 0) + 1
+        self.settings_dict.pop(group_id, None)
+        self.loading.pop(group_id, None)
+
+
+def get_group_setting_controller() -> GroupSettingsController:
+    global group_setting_controller_instance
+    if not group_setting_controller_instance:
+        group_setting_controller_instance = create(GroupSettingsController)
+    return group_setting_controller_instance
+
+
+class GroupSettingsControllerClassCreator(AbstractCreator, ABC):
+    targets = (CreateTargetInfo("core.models.group_model", "GroupSettingsController"),)
+
+    @staticmethod
+    def available() -> bool:
+        return exists_module("core.models.group_model")
+
+    @staticmethod
+    def create(create_type: Type[GroupSettingsController]) -> GroupSettingsController:
+        return GroupSettingsController()
+
+
+add_creator(GroupSettingsControllerClassCreator)
@@ -0,0 +1,220 @@
+import time
+from abc import ABC
+from array import array
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Type
+
+from creart import create, AbstractCreator, CreateTargetInfo, exists_module, add_creator
+from graia.broadcast.entities.dispatcher import BaseDispatcher
+from graia.broadcast.interfaces.dispatcher import DispatcherInterface
+
+metrics_controller_instance = None
+# 当前执行的监听器所属插件,由Function.require设置,MetricsDispatcher在监听器执行结束后恢复
+current_module: ContextVar[str | None] = ContextVar("current_module", default=None)
+
+
+class RingCounter(object):
+    """固定大小的环形计数器,每个槽位对应resolution秒,只保留最近size个槽位"""
+    __slots__ = ("size", "resolution", "counts", "stamps")
+
+    def __init__(self, size: int, resolution: int = 1):
+        self.size = size
+        self.resolution = resolution
+        self.counts = array("Q", [0]) * size
+        self.stamps = array("q", [-1]) * size
+
+    def add(self, n: int = 1, current_time: float | None = None):
+        slot = int(current_time if current_time is not None else time.time()) // self.resolution
+        index = slot % self.size
+        if self.stamps[index] != slot:
+            self.stamps[index] = slot
+            self.counts[index] = 0
+        self.counts[index] += n
+
+    def sum(self, seconds: float, current_time: float | None = None) -> int:
+        """最近seconds秒内的计数"""
+        slot = int(current_time if current_time is not None else time.time()) // self.resolution
+        slots = min(max(int(seconds // self.resolution), 1), self.size)
+        total = 0
+        for item in range(slot - slots + 1, slot + 1):
+            index = item % self.size
+            if self.stamps[index] == item:
+                total += self.counts[index]
+        return total
+
+
+class TrafficCounter(object):
+    """消息计数,1小时内按秒统计,24小时内按分钟统计"""
+    __slots__ = ("total", "seconds", "minutes")
+
+    def __init__(self):
+        self.total = 0
+        self.seconds = RingCounter(3600)
+        self.minutes = RingCounter(1440, 60)
+
+    def add(self, n: int = 1):
+        current_time = time.time()
+        self.total += n
+        self.seconds.add(n, current_time)
+        self.minutes.add(n, current_time)
+
+    def count(self, seconds: float = 60) -> int:
+        if seconds <= self.seconds.size:
+            return self.seconds.sum(seconds)
+        return self.minutes.sum(seconds)
+
+
+class LatencyHistogram(object):
+    """按对数分桶的耗时直方图,桶上界从1ms到约2分钟"""
+    __slots__ = ("counts", "count", "total", "max")
+    bounds = [0.001 * 1.25 ** i for i in range(53)]
+
+    def __init__(self):
+        self.counts = array("Q", [0]) * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p: float) -> float:
+        """
+        :param p: 0~100
+        :return: 所在桶的上界(秒),没有数据时返回0
+        """
+        if not self.count:
+            return 0.0
+        target = self.count * p / 100
+        cumulative = 0
+        for index, item in enumerate(self.counts):
+            cumulative += item
+            if cumulative >= target:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max
+
+    def get_stats(self) -> dict:
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+class MetricsController(object):
+    """运行指标
+    received/sent: 收发消息计数
+    latency: 所有插件监听器的执行耗时
+    modules = {
+        module_name: LatencyHistogram
+    }
+    """
+
+    def __init__(self):
+        self.received = TrafficCounter()
+        self.sent = TrafficCounter()
+        self.latency = LatencyHistogram()
+        self.modules: dict[str, LatencyHistogram] = {}
+
+    def add_received(self):
+        self.received.add()
+
+    def add_sent(self):
+        self.sent.add()
+
+    def record(self, module_name: str | None, seconds: float):
+        """记录一次监听器执行"""
+        self.latency.observe(seconds)
+        if module_name is None:
+            return
+        if not (histogram := self.modules.get(module_name)):
+            histogram = self.modules[module_name] = LatencyHistogram()
+        histogram.observe(seconds)
+
+    def get_module_top(self, limit: int = 5) -> list[tuple[str, int]]:
+        """调用次数最多的插件"""
+        return sorted(
+            ((module_name, histogram.count) for module_name, histogram in self.modules.items()),
+            key=lambda x: x[1],
+            reverse=True
+        )[:limit]
+
+    def get_stats(self) -> dict:
+        return {
+            "received": {
+                "total": self.received.total,
+                "1m": self.received.count(60),
+                "1h": self.received.count(3600),
+                "24h": self.received.count(86400),
+            },
+            "sent": {
+                "total": self.sent.total,
+                "1m": self.sent.count(60),
+                "1h": self.sent.count(3600),
+                "24h": self.sent.count(86400),
+            },
+            "latency": self.latency.get_stats(),
+            "modules": {
+                module_name: histogram.get_stats()
+                for module_name, histogram in self.modules.items()
+            },
+        }
+
+
+class MetricsDispatcher(BaseDispatcher):
+    """全局Dispatcher,统计通过了所有Depend检查的监听器的执行耗时"""
+
+    @staticmethod
+    async def beforeExecution(interface: DispatcherInterface):
+        if interface.depth == 0:
+            # 每个监听器从None开始,执行结束后恢复,避免插件名残留到之后在同一上下文中执行的监听器
+            interface.local_storage["_metrics_module_token"] = current_module.set(None)
+
+    @staticmethod
+    async def catch(interface: DispatcherInterface):
+        return
+
+    @staticmethod
+    async def afterDispatch(interface: DispatcherInterface, exception, tb):
+        if interface.depth == 0:
+            interface.local_storage["_metrics_start"] = time.perf_counter()
+
+    @staticmethod
+    async def afterExecution(interface: DispatcherInterface, exception, tb):
+        if interface.depth != 0:
+            return
+        module_name = current_module.get()
+        if (token := interface.local_storage.get("_metrics_module_token")) is not None:
+            current_module.reset(token)
+        if (start := interface.local_storage.get("_metrics_start")) is not None:
+            get_metrics_controller().record(module_name, time.perf_counter() - start)
+
+
+def get_metrics_controller() -> MetricsController:
+    global metrics_controller_instance
+    if not metrics_controller_instance:
+        metrics_controller_instance = create(MetricsController)
+    return metrics_controller_instance
+
+
+class MetricsControllerClassCreator(AbstractCreator, ABC):
+    targets = (CreateTargetInfo("core.models.metrics_model", "MetricsController"),)
+
+    @staticmethod
+    def available() -> bool:
+        return exists_module("core.models.metrics_model")
+
+    @staticmethod
+    def create(create_type: Type[MetricsController]) -> MetricsController:
+        return MetricsController()
+
+
+add_creator(MetricsControllerClassCreator)
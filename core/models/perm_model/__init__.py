@@ -0,0 +1,101 @@
+from abc import ABC
+from typing import Type
+
+from creart import create, AbstractCreator, CreateTargetInfo, exists_module, add_creator
+from loguru import logger
+from sqlalchemy import select
+
+from core.orm import orm
+from core.orm.tables import MemberPerm
+
+perm_cache_instance = None
+
+
+class PermissionCache(object):
+    """成员权限缓存(写穿透)
+    perm_dict = {
+        (group_id, qq): perm
+    }
+
+    启动时从MemberPerm全量预热,之后所有对MemberPerm的写操作都要同步调用set/remove,
+    预热完成后未命中即视为数据库中不存在该记录,不再访问数据库
+    """
+
+    def __init__(self):
+        self.perm_dict: dict[tuple[int, int], int] = {}
+        self.loaded = False
+        self.hits = 0
+        self.misses = 0
+
+    async def load(self):
+        """从MemberPerm表全量加载"""
+        result = await orm.fetch_all(select(MemberPerm.group_id, MemberPerm.qq, MemberPerm.perm))
+        self.perm_dict = {(group_id, qq): perm for group_id, qq, perm in result}
+        self.loaded = True
+        logger.success(f"成功预热权限缓存,共{len(self.perm_dict)}条记录")
+
+    async def get(self, group_id: int, qq: int) -> int | None:
+        """
+        获取成员权限
+        :return: 权限,不存在记录时返回None
+        """
+        key = (group_id, qq)
+        if key in self.perm_dict:
+            self.hits += 1
+            return self.perm_dict[key]
+        self.misses += 1
+        if self.loaded:
+            return None
+        # 未预热时回源查询
+        if result := await orm.fetch_one(
+                select(MemberPerm.perm).where(MemberPerm.group_id == group_id, MemberPerm.qq == qq)
+        ):
+            self.perm_dict[key] = result[0]
+            return result[0]
+        return None
+
+    def set(self, group_id: int, qq: int, perm: int):
+        self.perm_dict[(group_id, qq)] = perm
+
+    def remove(self, group_id: int | None, qq: int):
+        """
+        移除缓存
+        :param group_id: 群号,为None时移除该qq在所有群的记录
+        :param qq: qq号
+        """
+        if group_id is not None:
+            self.perm_dict.pop((group_id, qq), None)
+            return
+        for key in [key for key in self.perm_dict if key[1] == qq]:
+            del self.perm_dict[key]
+
+    def get_stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self.perm_dict),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0
+        }
+
+
+def get_perm_cache() -> PermissionCache:
+    global perm_cache_instance
+    if not perm_cache_instance:
+        perm_cache_instance = create(PermissionCache)
+    return perm_cache_instance
+
+
+class PermissionCacheClassCreator(AbstractCreator, ABC):
+    targets = (CreateTargetInfo("core.models.perm_model", "PermissionCache"),)
+
+    @staticmethod
+    def available() -> bool:
+        return exists_module("core.models.perm_model")
+
+    @staticmethod
+    def create(create_type: Type[PermissionCache]) -> PermissionCache:
+        return PermissionCache()
+
+
+add_creator(PermissionCacheClassCreator)
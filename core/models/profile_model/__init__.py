@@ -0,0 +1,209 @@
+import inspect
+import time
+from abc import ABC
+from typing import Type
+
+from creart import create, AbstractCreator, CreateTargetInfo, exists_module, add_creator
+from graia.broadcast import Broadcast
+from graia.broadcast.builtin.decorators import Depend
+from loguru import logger
+
+from core.models.metrics_model import LatencyHistogram
+
+handler_profiler_instance = None
+
+
+class StageStats(object):
+    """单个(插件, 阶段)的耗时统计"""
+    __slots__ = ("latency", "max_step", "blocked")
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        # 单次同步执行(两次await之间)的最长耗时,即阻塞事件循环的时间
+        self.max_step = 0.0
+        self.blocked = 0
+
+    def get_stats(self) -> dict:
+        return {
+            **self.latency.get_stats(),
+            "max_step": self.max_step,
+            "blocked": self.blocked,
+        }
+
+
+class StepTimer(object):
+    """代理协程的执行,记录总耗时以及每一步同步执行的耗时"""
+    __slots__ = ("coro", "profiler", "key")
+
+    def __init__(self, coro, profiler: "HandlerProfiler", key: tuple[str, str]):
+        self.coro = coro
+        self.profiler = profiler
+        self.key = key
+
+    def __await__(self):
+        coro = self.coro
+        send_value, throw_exc = None, None
+        max_step = 0.0
+        start = time.perf_counter()
+        try:
+            while True:
+                step_start = time.perf_counter()
+                try:
+                    if throw_exc is not None:
+                        yielded = coro.throw(throw_exc)
+                    else:
+                        yielded = coro.send(send_value)
+                except StopIteration as e:
+                    return e.value
+                finally:
+                    max_step = max(max_step, time.perf_counter() - step_start)
+                send_value, throw_exc = None, None
+                try:
+                    send_value = yield yielded
+                except GeneratorExit:
+                    coro.close()
+                    raise
+                except BaseException as e:
+                    throw_exc = e
+        finally:
+            self.profiler.record(self.key, time.perf_counter() - start, max_step)
+
+
+class ProfiledCallable(object):
+    """包装监听器/Depend的可调用对象
+
+    与被包装对象相等且哈希相同,签名与注解沿用被包装对象,
+    因此Broadcast的参数解析与Saya卸载时的getListener不受影响
+    """
+
+    def __init__(self, target, profiler: "HandlerProfiler", key: tuple[str, str]):
+        self.__wrapped__ = target
+        self.profiler = profiler
+        self.key = key
+
+    @property
+    def __annotations__(self):
+        return self.__wrapped__.__annotations__
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        result = self.__wrapped__(*args, **kwargs)
+        if inspect.iscoroutine(result):
+            return StepTimer(result, self.profiler, self.key)
+        elapsed = time.perf_counter() - start
+        self.profiler.record(self.key, elapsed, elapsed)
+        return result
+
+    def __getattr__(self, item):
+        return getattr(self.__wrapped__, item)
+
+    def __eq__(self, other):
+        return self.__wrapped__ == (other.__wrapped__ if isinstance(other, ProfiledCallable) else other)
+
+    def __hash__(self):
+        return hash(self.__wrapped__)
+
+
+class HandlerProfiler(object):
+    """监听器分阶段耗时分析(默认关闭)
+    开启时包装已注册监听器的各个Depend与监听器本体,关闭时还原
+
+    stats = {
+        (channel, stage): StageStats
+    }
+    """
+
+    def __init__(self, block_threshold: float = 0.1):
+        """
+        :param block_threshold: 单步同步执行超过该时长(秒)视为阻塞事件循环
+        """
+        self.enabled = False
+        self.block_threshold = block_threshold
+        self.stats: dict[tuple[str, str], StageStats] = {}
+        self.wrapped: list[tuple[object, ProfiledCallable]] = []
+        self.start_time: float | None = None
+
+    @staticmethod
+    def get_stage_name(target) -> str:
+        """Permission.user_require.<locals>.wrapper -> Permission.user_require"""
+        qualname = getattr(target, "__qualname__", None) or repr(target)
+        return qualname.split(".<locals>")[0]
+
+    def wrap(self, owner, channel: str, stage: str):
+        if isinstance(owner.callable, ProfiledCallable):
+            return
+        wrapper = ProfiledCallable(owner.callable, self, (channel, stage))
+        owner.callable = wrapper
+        self.wrapped.append((owner, wrapper))
+
+    def enable(self) -> int:
+        """包装当前已注册的所有监听器,返回本次新包装的数量"""
+        count = len(self.wrapped)
+        for listener in create(Broadcast).listeners:
+            channel = getattr(listener.callable, "__module__", None) or "unknown"
+            for decorator in listener.decorators:
+                if isinstance(decorator, Depend):
+                    self.wrap(decorator.exec_target, channel, self.get_stage_name(decorator.raw))
+            self.wrap(listener, channel, "handler")
+        if not self.enabled:
+            self.start_time = time.time()
+        self.enabled = True
+        return len(self.wrapped) - count
+
+    def disable(self):
+        for owner, wrapper in self.wrapped:
+            if owner.callable is wrapper:
+                owner.callable = wrapper.__wrapped__
+        self.wrapped = []
+        self.enabled = False
+
+    def reset(self):
+        self.stats = {}
+        self.start_time = time.time() if self.enabled else None
+
+    def record(self, key: tuple[str, str], seconds: float, max_step: float):
+        if not (stats := self.stats.get(key)):
+            stats = self.stats[key] = StageStats()
+        stats.latency.observe(seconds)
+        if max_step > stats.max_step:
+            stats.max_step = max_step
+        if max_step >= self.block_threshold:
+            stats.blocked += 1
+            logger.warning(f"[性能分析] {key[0]}的{key[1]}阻塞事件循环{max_step * 1000:.0f}ms")
+
+    def get_top(self, limit: int = 10) -> list[tuple[tuple[str, str], StageStats]]:
+        """按总耗时排序"""
+        return sorted(self.stats.items(), key=lambda x: x[1].latency.total, reverse=True)[:limit]
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "start_time": self.start_time,
+            "block_threshold": self.block_threshold,
+            "stages": [
+                {"channel": channel, "stage": stage, **stats.get_stats()}
+                for (channel, stage), stats in self.get_top(len(self.stats))
+            ],
+        }
+
+
+def get_handler_profiler() -> HandlerProfiler:
+    global handler_profiler_instance
+    if not handler_profiler_instance:
+        handler_profiler_instance = create(HandlerProfiler)
+    return handler_profiler_instance
+
+
+class HandlerProfilerClassCreator(AbstractCreator, ABC):
+    targets = (CreateTargetInfo("core.models.profile_model", "HandlerProfiler"),)
+
+    @staticmethod
+    def available() -> bool:
+        return exists_module("core.models.profile_model")
+
+    @staticmethod
+    def create(create_type: Type[HandlerProfiler]) -> HandlerProfiler:
+        return HandlerProfiler()
+
+
+add_creator(HandlerProfilerClassCreator)
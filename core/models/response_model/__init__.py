@@ -1,3 +1,4 @@
+import asyncio
 import random
 import time
 from abc import ABC
@@ -7,9 +8,9 @@ from creart import create, CreateTargetInfo, AbstractCreator, exists_module, add
 from graia.ariadne import Ariadne
 from graia.ariadne.model import Member, Group
 from loguru import logger
-from sqlalchemy import select
 
 from core.config import GlobalConfig
+from core.models import group_model
 from core.orm import orm
 from core.orm.tables import GroupSetting
 
@@ -64,27 +65,39 @@ class AccountController:
             }
         }
         """
+        self.bot_roles: dict[int, dict[int, str]] = {}
+        """
+        bot_roles = {
+            group.id: {
+                bot_account: Member/Administrator/Owner
+            }
+        }
+        """
+        self.group_dict: dict[int, Group] = {}
+        """
+        group_dict = {
+            group.id: Group
+        }
+        """
         self.initialized_bot_list = []
         self.all_initialized = False
 
     @staticmethod
     async def get_response_type(group_id: int) -> str:
-        if result := await orm.fetch_one(select(GroupSetting.response_type).where(
-                GroupSetting.group_id == group_id)):
-            return result[0]
-        else:
-            return "random"
+        return (await group_model.get_group_setting_controller().get(group_id)).response_type
 
     @staticmethod
     async def change_response_type(group_id: int, response_type: str):
         if response_type in {"random", "deterministic"}:
-            return await orm.insert_or_update(
+            result = await orm.insert_or_update(
                 table=GroupSetting,
                 data={"group_id": group_id, "response_type": response_type},
                 condition=[
                     GroupSetting.group_id == group_id
                 ]
             )
+            group_model.get_group_setting_controller().invalidate(group_id)
+            return result
         else:
             return
 
@@ -105,31 +118,102 @@ class AccountController:
         @param bot_id: bot账号
         @return: (Ariadne, Group) 或者(None, None)
         """
-        if group_id not in self.total_groups:
+        if not self.total_groups.get(group_id):
             return None, None
         if bot_id:
             if bot_id not in self.total_groups[group_id]:
                 return None, None
-            app: Ariadne = self.total_groups[group_id][bot_id]
-            group = await app.get_group(group_id)
+            account = bot_id
         else:
-            app: Ariadne = self.total_groups[group_id][random.choice(list(self.total_groups[group_id].keys()))]
-            group = await app.get_group(group_id)
-        if group_id not in self.total_groups:
-            return None, None
+            account = random.choice(list(self.total_groups[group_id].keys()))
         if require_perm:
-            member_list = await app.get_member_list(group_id)
-            bot_member = await app.get_member(group_id, app.account)
-            if bot_member.permission.name in require_perm:
-                return self.total_groups[group_id][app.account], group
-            for member in member_list:
-                member: Member
-                if member.id in self.total_groups[group_id] and member.permission.name in require_perm:
-                    group = await Ariadne.current(member.id).get_group(group_id)
-                    return self.total_groups[group_id][member.id], group
-            return None, None
+            # 优先使用选中的bot,否则使用群内其他满足权限的bot
+            for bot_account in [account] + [k for k in self.total_groups[group_id] if k != account]:
+                if await self.get_bot_role(group_id, bot_account) in require_perm:
+                    account = bot_account
+                    break
+            else:
+                return None, None
+        app: Ariadne = self.total_groups[group_id][account]
+        if not (group := self.group_dict.get(group_id)):
+            if not (group := await app.get_group(group_id)):
+                return None, None
+            self.group_dict[group_id] = group
         return app, group
 
+    async def get_bot_role(self, group_id: int, bot_account: int) -> str | None:
+        """获取bot在群内的权限名字,索引中没有时查询一次并记录"""
+        if role := self.bot_roles.get(group_id, {}).get(bot_account):
+            return role
+        try:
+            bot_member = await self.total_groups[group_id][bot_account].get_member(group_id, bot_account)
+        except Exception as e:
+            logger.error(f"获取bot{bot_account}在群{group_id}的权限失败: {e}")
+            return None
+        if not bot_member:
+            return None
+        self.update_bot_role(group_id, bot_account, bot_member.permission.name)
+        return bot_member.permission.name
+
+    def update_bot_group(self, bot_account: int, group: Group):
+        """记录bot所在的群以及bot在群内的权限"""
+        if group.id not in self.total_groups:
+            self.total_groups[group.id] = {}
+        self.total_groups[group.id][bot_account] = Ariadne.current(bot_account)
+        if len(self.total_groups[group.id].keys()) > 1:
+            self.public_groups[group.id] = self.total_groups[group.id]
+        self.group_dict[group.id] = group
+        self.bot_roles.setdefault(group.id, {})[bot_account] = group.account_perm.name
+        # 启动后新加入的群没有经过init_account,需要保证get_response_account能找到响应账号
+        if group.id not in self.account_dict:
+            self.account_dict[group.id] = {0: bot_account}
+            self.deterministic_account[group.id] = 0
+        else:
+            self.add_account(group.id, bot_account)
+
+    def update_bot_role(self, group_id: int, bot_account: int, role: str):
+        """bot在群内的权限变动时更新索引"""
+        if bot_account in self.total_groups.get(group_id, {}):
+            self.bot_roles.setdefault(group_id, {})[bot_account] = role
+
+    def remove_bot_group(self, group_id: int, bot_account: int):
+        """bot退出/被踢出群或群解散时移除索引"""
+        if group_id not in self.total_groups:
+            return
+        self.total_groups[group_id].pop(bot_account, None)
+        self.bot_roles.get(group_id, {}).pop(bot_account, None)
+        if group_id in self.account_dict:
+            self.remove_account(group_id, bot_account)
+        if len(self.total_groups[group_id].keys()) <= 1:
+            self.public_groups.pop(group_id, None)
+        if not self.total_groups[group_id]:
+            del self.total_groups[group_id]
+            self.bot_roles.pop(group_id, None)
+            self.group_dict.pop(group_id, None)
+            self.account_dict.pop(group_id, None)
+            self.deterministic_account.pop(group_id, None)
+
+    async def reconcile_account(self, bot_account: int):
+        """以bot当前的群列表为准校正索引"""
+        if not self.check_account_available(bot_account):
+            return
+        group_list = await Ariadne.current(bot_account).get_group_list()
+        for group in group_list:
+            self.update_bot_group(bot_account, group)
+        group_ids = {group.id for group in group_list}
+        for group_id in [
+            group_id for group_id, bots in self.total_groups.items()
+            if bot_account in bots and group_id not in group_ids
+        ]:
+            self.remove_bot_group(group_id, bot_account)
+
+    async def reconcile(self):
+        for bot_account in config.bot_accounts:
+            try:
+                await self.reconcile_account(bot_account)
+            except Exception as e:
+                logger.error(f"校正bot{bot_account}的群索引失败: {e}")
+
     def check_initialization(self, group_id: int, bot_account: int):
         """检查群、对应账号是否初始化
         如果已初始化则返回True否则返回False
@@ -150,6 +234,7 @@ class AccountController:
         for member in member_list:
             if self.check_account_available(member.id):
                 self.account_dict[group_id][len(self.account_dict[group_id])] = member.id
+            self.update_bot_role(group_id, member.id, member.permission.name)
         if await self.get_response_type(group_id) != "random":
             return
         await orm.insert_or_update(
@@ -159,46 +244,70 @@ class AccountController:
                 GroupSetting.group_id == group_id,
             ]
         )
+        group_model.get_group_setting_controller().invalidate(group_id)
 
-    async def init_all_group(self):
+    async def init_all_group(self, concurrency: int = 10):
         if self.all_initialized:
             return
-        for bot_account in config.bot_accounts:
-            await self.init_account(bot_account)
+        semaphore = asyncio.Semaphore(concurrency)
+        # 并发获取所有账号的群和成员列表,再按配置顺序依次写入,保证共享群的响应账号顺序与配置一致
+        fetched = await asyncio.gather(
+            *[self.fetch_account(bot_account, semaphore) for bot_account in config.bot_accounts]
+        )
+        for bot_account, result in zip(config.bot_accounts, fetched):
+            if result is not None:
+                await self.apply_account(bot_account, *result)
         self.all_initialized = True
 
-    async def init_account(self, bot_account: int):
+    async def fetch_account(
+            self, bot_account: int, semaphore: asyncio.Semaphore | None = None
+    ) -> tuple[list[Group], list[List[Member] | None]] | None:
+        """获取账号的群列表和各群成员列表,账号不可用时返回None"""
         if not self.check_account_available(bot_account):
-            return
+            return None
         app = Ariadne.current(bot_account)
         group_list = await app.get_group_list()
+        semaphore = semaphore or asyncio.Semaphore(10)
+
+        async def fetch_member_list(group: Group) -> List[Member] | None:
+            async with semaphore:
+                try:
+                    return await app.get_member_list(group.id)
+                except Exception as e:
+                    logger.error(f"获取群成员列表失败: {e}")
+
+        member_lists = await asyncio.gather(*[fetch_member_list(group) for group in group_list])
+        return group_list, member_lists
+
+    async def apply_account(self, bot_account: int, group_list: list[Group], member_lists: list[List[Member] | None]):
         for group in group_list:
-            if group.id not in self.total_groups:
-                self.total_groups[group.id] = {}
-            self.total_groups[group.id][bot_account] = Ariadne.current(bot_account)
-            if len(self.total_groups[group.id].keys()) > 1:
-                self.public_groups[group.id] = self.total_groups[group.id]
-            try:
-                member_list = await app.get_member_list(group.id)
-            except Exception as e:
-                logger.error(f"获取群成员列表失败: {e}")
+            self.update_bot_group(bot_account, group)
+        random_groups = []
+        for group, member_list in zip(group_list, member_lists):
+            if member_list is None:
                 continue
             self.account_dict[group.id] = {0: bot_account}
             self.deterministic_account[group.id] = 0
             for member in member_list:
                 if self.check_account_available(member.id):
                     self.add_account(group.id, member.id)
-            if await self.get_response_type(group.id) != "random":
-                continue
-            await orm.insert_or_update(
+                self.update_bot_role(group.id, member.id, member.permission.name)
+            if await self.get_response_type(group.id) == "random":
+                random_groups.append(group.id)
+        if random_groups:
+            await orm.insert_or_update_batch(
                 GroupSetting,
-                {"group_id": group.id, "response_type": "random"},
-                [
-                    GroupSetting.group_id == group.id,
-                ]
+                [{"group_id": group_id, "response_type": "random"} for group_id in random_groups],
+                [[GroupSetting.group_id == group_id] for group_id in random_groups]
             )
+            for group_id in random_groups:
+                group_model.get_group_setting_controller().invalidate(group_id)
         self.initialized_bot_list.append(bot_account)
 
+    async def init_account(self, bot_account: int, semaphore: asyncio.Semaphore | None = None):
+        if (result := await self.fetch_account(bot_account, semaphore)) is not None:
+            await self.apply_account(bot_account, *result)
+
     @staticmethod
     def check_account_available(bot_account: int):
         return bool(
@@ -213,12 +322,15 @@ class AccountController:
         self.account_dict[group_id][len(self.account_dict[group_id])] = bot_account
 
     def remove_account(self, group_id: int, bot_account: int):
-        if self.deterministic_account.get(group_id) and \
-                self.account_dict[self.deterministic_account[group_id]] == bot_account:
-            del self.deterministic_account[group_id]
+        if group_id in self.deterministic_account and \
+                self.account_dict[group_id].get(self.deterministic_account[group_id]) == bot_account:
+            self.deterministic_account[group_id] = 0
         temp: dict = self.account_dict[group_id]
         self.account_dict[group_id] = {}
         bots_list = [temp[k] for k in temp if temp[k] != bot_account]
+        if not bots_list:
+            del self.account_dict[group_id]
+            return
         for index in range(len(bots_list)):
             self.account_dict[group_id][index] = bots_list[index]
 
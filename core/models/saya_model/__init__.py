@@ -1,5 +1,10 @@
+import asyncio
+import atexit
 import contextlib
 import json
+import os
+import threading
+import time
 from abc import ABC
 from enum import Enum
 from json.decoder import JSONDecodeError
@@ -9,6 +14,7 @@ from typing import Type, List
 from creart import create, AbstractCreator, CreateTargetInfo, exists_module, add_creator
 from graia.ariadne.model import Group
 from graia.saya import Saya
+from loguru import logger
 from pydantic import BaseModel
 
 from core.bot import Umaru
@@ -16,6 +22,7 @@ from core.bot import Umaru
 saya = create(Saya)
 core = create(Umaru)
 module_controller_instance = None
+MODULES_DATA_PATH = str(Path(__file__).parent.joinpath("modules_data.json"))
 
 
 class Metadata(BaseModel):
@@ -30,6 +37,9 @@ class Metadata(BaseModel):
     default_switch: bool = True
     default_notice: bool = False
 
+    class Config:
+        allow_mutation = False
+
 
 class ModuleOperationType(Enum):
     INSTALL = "install"
@@ -87,6 +97,34 @@ class ModulesController:
         }
         """
         self.groups = {}
+        self.metadata: dict[str, Metadata] = {}
+        """
+        插件元数据注册表,加载插件时解析一次
+        {
+            "module_name": Metadata
+        }
+        """
+        self.metadata_load_time = 0.0
+        # 插件开关位图,由modules生成,每个插件占一位
+        self.module_index: dict[str, int] = {}
+        self.available_bits = 0
+        self.group_bits: dict[int, list[int]] = {}
+        """
+        group_bits = {
+            group_id: [开关位, 通知位, 已初始化位]
+        }
+        """
+        # 状态版本号,插件列表/元数据变化时增加version,群内插件状态变化时增加该群的版本号
+        self.version = 0
+        self.group_versions: dict[int, int] = {}
+        # 数据变更后延迟save_interval秒合并写入
+        self.save_interval = 1.0
+        # 写入失败后重试间隔的上限
+        self.max_save_interval = 60.0
+        self.dirty = False
+        self.flush_task: asyncio.Task | None = None
+        self.write_lock = threading.Lock()
+        atexit.register(self.flush)
 
     @staticmethod
     def get_metadata_from_path(module_path: Path) -> Metadata:
@@ -118,16 +156,77 @@ class ModulesController:
         return Metadata(**data)
 
     @staticmethod
-    def get_metadata_from_module_name(module_name: str) -> Metadata:
-        """
-        传入插件名
-        """
+    def get_module_path(module_name: str) -> Path:
         paths = module_name.split('.')
         base_path = Path().cwd()
         for path in paths:
             base_path = base_path / path
-        module_path = Path(base_path)
-        return ModulesController.get_metadata_from_path(module_path)
+        return Path(base_path)
+
+    def get_metadata_from_module_name(self, module_name: str) -> Metadata:
+        """
+        传入插件名,从注册表读取,不在注册表内时从文件读取并注册
+        """
+        if metadata := self.metadata.get(module_name):
+            return metadata
+        return self.refresh_metadata(module_name)
+
+    def refresh_metadata(self, module_name: str) -> Metadata:
+        """从文件重新读取插件元数据并注册"""
+        start = time.perf_counter()
+        metadata = self.get_metadata_from_path(self.get_module_path(module_name))
+        self.metadata[module_name] = metadata
+        self.metadata_load_time += time.perf_counter() - start
+        self.version += 1
+        return metadata
+
+    def rebuild_bits(self):
+        """根据modules重建整个位图"""
+        self.module_index = {}
+        self.available_bits = 0
+        self.group_bits = {}
+        for module_name in self.modules:
+            self.index_module(module_name)
+        self.version += 1
+
+    def index_module(self, module_name: str):
+        """更新某个插件在位图中的可用状态及所有群的开关"""
+        index = self.module_index.setdefault(module_name, len(self.module_index))
+        flag = 1 << index
+        if self.modules[module_name].get("available"):
+            self.available_bits |= flag
+        else:
+            self.available_bits &= ~flag
+        for key, value in self.modules[module_name].items():
+            if isinstance(value, dict) and key.isdigit():
+                self.set_group_bits(index, int(key), value)
+        self.version += 1
+
+    def set_group_bits(self, index: int, group_id: int, value: dict):
+        flag = 1 << index
+        bits = self.group_bits.setdefault(group_id, [0, 0, 0])
+        bits[0] = bits[0] | flag if value.get("switch") else bits[0] & ~flag
+        bits[1] = bits[1] | flag if value.get("notice") else bits[1] & ~flag
+        bits[2] |= flag
+        self.group_versions[group_id] = self.group_versions.get(group_id, 0) + 1
+
+    def get_version(self, group_id: int) -> tuple[int, int]:
+        """插件状态版本号,用于判断缓存是否失效"""
+        return self.version, self.group_versions.get(group_id, 0)
+
+    def get_module_state(self, module_name: str, group_id: int) -> tuple[bool, bool, bool] | None:
+        """
+        通过位图读取插件在群内的状态
+        :return: (是否可用, 开关是否开启, 通知是否开启),插件或群未初始化时返回None
+        """
+        if (index := self.module_index.get(module_name)) is None or not (bits := self.group_bits.get(group_id)):
+            return None
+        flag = 1 << index
+        if not bits[2] & flag:
+            return None
+        # 与if_module_switch_on/if_module_notice_on一致,不可用时开关与通知均视为关闭
+        available = bool(self.available_bits & flag) and module_name in saya.channels
+        return available, available and bool(bits[0] & flag), available and bool(bits[1] & flag)
 
     def add_group(self, group: Group or int or str):
         """如果module默认为开，且群不在module数据内则添加"""
@@ -143,6 +242,8 @@ class ModulesController:
                     "switch": module.default_switch,
                     "notice": module.default_notice
                 }
+                if group_id.isdigit():
+                    self.set_group_bits(self.module_index[key], int(group_id), self.modules[key][group_id])
         self.save()
 
     def remove_group(self, group: Group or int or str):
@@ -155,6 +256,9 @@ class ModulesController:
         for key in self.modules:
             if group_id in self.modules[key]:
                 del self.modules[key][group_id]
+        if group_id.isdigit():
+            self.group_bits.pop(int(group_id), None)
+            self.group_versions[int(group_id)] = self.group_versions.get(int(group_id), 0) + 1
         self.save()
 
     def add_module(self, module_name: str):
@@ -168,12 +272,14 @@ class ModulesController:
                 } for group in self.groups
             }
             self.modules[module_name]["available"] = True
+            self.index_module(module_name)
         self.save()
 
     def remove_module(self, module_name):
         """如果插件在modules字典内就删除"""
         if module_name in self.modules:
             del self.modules[module_name]
+            self.rebuild_bits()
         self.save()
 
     def change_group_module(self, module_name: str, group: Group or int or str, key: str, value: bool):
@@ -189,6 +295,8 @@ class ModulesController:
             if not self.modules[module_name].get(group_id):
                 self.add_group(group_id)
         self.modules[module_name][group_id][key] = value
+        if group_id.isdigit():
+            self.set_group_bits(self.module_index[module_name], int(group_id), self.modules[module_name][group_id])
         self.save()
 
     def turn_on_module(self, module_name: str, group: Group or int or str):
@@ -252,6 +360,7 @@ class ModulesController:
         if not self.modules.get(module_name):
             self.add_module(module_name)
         self.modules[module_name]["available"] = status
+        self.index_module(module_name)
         self.save()
 
     def enable_module(self, module_name: str):
@@ -275,24 +384,66 @@ class ModulesController:
             else:
                 return False
 
-    def save(self, path: str = str(Path(__file__).parent.joinpath("modules_data.json"))):
-        with open(path, "w") as w:
-            w.write(
-                json.dumps(
-                    {"modules": self.modules, "groups": self.groups}, indent=4
-                )
-            )
-
-    def load(self, path: str = str(Path(__file__).parent.joinpath("modules_data.json"))) -> "ModulesController":
+    def save(self, path: str = MODULES_DATA_PATH):
+        """标记数据已变更,在事件循环内时合并为一次延迟写入,否则立即写入"""
+        self.dirty = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return self.flush(path)
+        if not self.flush_task or self.flush_task.done():
+            self.flush_task = loop.create_task(self.delayed_flush(path))
+
+    async def delayed_flush(self, path: str = MODULES_DATA_PATH, delay: float | None = None):
+        """
+        延迟写入,失败时以翻倍的间隔重新安排写入
+        :param delay: 等待时间(秒),为None时使用save_interval
+        """
+        delay = self.save_interval if delay is None else delay
+        await asyncio.sleep(delay)
+        if not self.dirty:
+            return
+        data = self.dumps()
+        self.dirty = False
+        try:
+            await asyncio.to_thread(self.write_file, path, data)
+        except Exception as e:
+            self.dirty = True
+            retry_delay = min(delay * 2, self.max_save_interval)
+            logger.error(f"保存插件数据失败, {retry_delay}秒后重试: {e}")
+            self.flush_task = asyncio.create_task(self.delayed_flush(path, retry_delay))
+
+    def flush(self, path: str = MODULES_DATA_PATH):
+        """立即写入未保存的变更"""
+        if not self.dirty:
+            return
+        data = self.dumps()
+        self.dirty = False
+        self.write_file(path, data)
+
+    def dumps(self) -> str:
+        return json.dumps({"modules": self.modules, "groups": self.groups}, separators=(",", ":"))
+
+    def write_file(self, path: str, data: str):
+        """先写入临时文件再替换,避免写入中断导致文件损坏"""
+        temp_path = f"{path}.tmp"
+        with self.write_lock:
+            with open(temp_path, "w") as w:
+                w.write(data)
+                w.flush()
+                os.fsync(w.fileno())
+            os.replace(temp_path, path)
+
+    def load(self, path: str = MODULES_DATA_PATH) -> "ModulesController":
         with contextlib.suppress(FileNotFoundError, JSONDecodeError):
             with open(path, "r") as r:
                 data = json.load(r)
                 self.modules = data.get("modules", {})
                 self.groups = data.get("groups", {})
+        self.rebuild_bits()
         return self
 
-    @staticmethod
-    def module_operation(modules: str or list[str], operation_type: ModuleOperationType) -> dict[str, Exception]:
+    def module_operation(self, modules: str or list[str], operation_type: ModuleOperationType) -> dict[str, Exception]:
         exceptions = {}
         if isinstance(modules, str):
             modules = [modules]
@@ -319,6 +470,12 @@ class ModulesController:
                         saya.reload_channel(value)
                 except Exception as e:
                     exceptions[c] = e
+                    continue
+                # 加载/重载后刷新元数据
+                if operation_type != ModuleOperationType.UNINSTALL:
+                    self.refresh_metadata(c)
+        # 已安装的插件发生变化
+        self.version += 1
         return exceptions
 
     @staticmethod
@@ -1,9 +1,14 @@
 from asyncio import Lock
+from contextlib import asynccontextmanager
 
 from creart import create
 from loguru import logger
-from sqlalchemy import MetaData, inspect, delete, update, select, insert, text, event
+from sqlalchemy import MetaData, inspect, delete, update, select, insert, text, event, bindparam
+from sqlalchemy import Column, PrimaryKeyConstraint, UniqueConstraint
+from sqlalchemy.dialects import mysql, postgresql, sqlite
 from sqlalchemy.engine import Engine
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import declarative_base, sessionmaker
 
@@ -20,15 +25,31 @@ def set_sqlite_pragma(dbapi_connection, connection_record):
     cursor.close()
 
 
+def set_sqlite_query_only(dbapi_connection, connection_record):
+    """只读连接池中的连接禁止写入"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only = 1;")
+    cursor.close()
+
+
 class AsyncORM:
     """对象关系映射（Object Relational Mapping）"""
 
-    def __init__(self, db_link: str, db_mutex: Lock or None = None):
+    def __init__(
+            self,
+            db_link: str,
+            db_mutex: Lock or None = None,
+            read_pool_size: int = 5,
+            chunk_size: int = 500
+    ):
         """
         AsyncORM类可以支持多种数据库，只需要将不同的数据库链接字符串传入db_link函数即可。
         :param db_link: 数据库链接
+        :param read_pool_size: SQLite只读连接池大小
+        :param chunk_size: 批量操作时每次executemany发送的默认条数
         """
         self.db_link = db_link
+        self.chunk_size = chunk_size
         """
         创建异步数据库引擎
         echo参数是SQLAlchemy引擎的一个布尔值选项，表示是否在引擎创建时打印所有SQL语句。
@@ -62,6 +83,20 @@ class AsyncORM:
         Lock
         """
         self.db_mutex = db_mutex or Lock() if self.db_link.startswith("sqlite") else None
+        """
+        只读引擎
+        SQLite在WAL模式下允许多个读连接与写连接并发,因此读操作使用独立的只读连接池且不获取db_mutex,
+        只有写操作仍然通过db_mutex串行化。其他数据库直接复用主引擎。
+        只读连接池只用于单纯的查询,先查询再写入的操作(insert_or_update等)在write_session中完成。
+        """
+        if self.db_mutex and ":memory:" not in self.db_link:
+            self.read_engine = create_async_engine(
+                db_link, echo=False, pool_size=read_pool_size, max_overflow=0
+            )
+            event.listen(self.read_engine.sync_engine, "connect", set_sqlite_query_only)
+        else:
+            self.read_engine = self.engine
+        self.read_session = sessionmaker(bind=self.read_engine, class_=AsyncSession)
 
     async def close(self):
         """关闭数据库连接"""
@@ -73,6 +108,8 @@ class AsyncORM:
                 async with orm.async_session() as session:
                     await session.close()
                     self.async_session = None
+            if self.read_engine is not self.engine:
+                await self.read_engine.dispose()
             logger.success("成功关闭数据库连接")
         except Exception as e:
             logger.error(f"关闭数据库时出错!{e}")
@@ -124,14 +161,67 @@ class AsyncORM:
                 if self.db_mutex:
                     self.db_mutex.release()
 
+    @asynccontextmanager
+    async def write_session(self):
+        """
+        持有db_mutex的写连接会话,退出时提交,出错时回滚
+        先查询再写入的操作需要在同一个会话内完成,避免并发调用都判断为不存在而重复插入
+        """
+        async with self.async_session() as session:
+            try:
+                if self.db_mutex:
+                    await self.db_mutex.acquire()
+                yield session
+                await session.commit()
+            except Exception as e:
+                await session.rollback()
+                raise e
+            finally:
+                if self.db_mutex:
+                    self.db_mutex.release()
+
+    async def execute_many(self, sql, parameters_list: list[dict], chunk_size: int = None):
+        """
+        以executemany方式分块执行同一条参数化语句,所有分块在同一个事务内提交
+        :param sql: 语句
+        :param parameters_list: 参数列表,每个元素是一个dict
+        :param chunk_size: 每次发送给驱动的参数条数,默认为self.chunk_size
+        """
+        if not parameters_list:
+            return
+        chunk_size = chunk_size or self.chunk_size
+        async with self.async_session() as session:
+            try:
+                if self.db_mutex:
+                    await self.db_mutex.acquire()
+                for i in range(0, len(parameters_list), chunk_size):
+                    await session.execute(sql, parameters_list[i: i + chunk_size])
+                await session.commit()
+            except Exception as e:
+                await session.rollback()
+                raise e
+            finally:
+                if self.db_mutex:
+                    self.db_mutex.release()
+
+    async def execute_read(self, sql, parameters=None) -> list:
+        """
+        在只读连接上执行查询语句,不获取db_mutex
+        :return: 查询到的所有记录
+        """
+        async with self.read_session() as session:
+            result = await session.execute(sql, parameters)
+            return result.fetchall()
+
     async def fetch_one(self, sql, parameters=None):
         """获取单条记录"""
-        result = await self.execute(sql, parameters)
-        return one if (one := result.fetchone()) else None
+        async with self.read_session() as session:
+            result = await session.execute(sql, parameters)
+            return one if (one := result.fetchone()) else None
 
     async def fetch_all(self, sql, parameters=None):
         """获取多条记录"""
-        return (await self.execute(sql, parameters)).fetchall()
+        return await self.execute_read(sql, parameters)
 
     async def rowcount(self, sql, parameters=None):
         """获取记录条数"""
@@ -147,16 +237,20 @@ class AsyncORM:
         """
         await self.execute(insert(table).values(**data))
 
-    async def add_batch(self, table, data_list):
+    async def add_batch(self, table, data_list, chunk_size: int = None):
         """
         批量插入数据
         :param table: 表
         :param data_list: 数据列表，每个元素是一个dict，表示一条记录
+        :param chunk_size: 分块大小
         """
-        # 构造所有的insert语句
-        insert_stmts = [insert(table).values(**data) for data in data_list]
-        # 执行批量插入操作
-        await self.execute_all(insert_stmts)
+        # 按键分组,每组使用同一条insert语句executemany
+        sa_table = getattr(table, "__table__", table)
+        groups: dict[tuple, list[dict]] = {}
+        for data in data_list:
+            groups.setdefault(tuple(sorted(data.keys())), []).append(data)
+        for group_data in groups.values():
+            await self.execute_many(insert(sa_table), group_data, chunk_size)
 
     async def delete(self, table, condition):
         """
@@ -166,16 +260,29 @@ class AsyncORM:
         """
         return await self.execute(delete(table).where(*condition))
 
-    async def delete_batch(self, table, conditions_list):
+    async def delete_batch(self, table, conditions_list, chunk_size: int = None):
         """
         批量删除数据
         :param table: 表
         :param conditions_list: 条件列表，每个元素是一个tuple或list，表示该记录的条件
-        """
-        # 构造所有的delete语句
-        delete_stmts = [delete(table).where(*condition) for condition in conditions_list]
-        # 执行批量删除操作
-        await self.execute_all(delete_stmts)
+        :param chunk_size: 分块大小
+        """
+        # 等值条件按列分组后使用同一条参数化delete语句executemany
+        sa_table = getattr(table, "__table__", table)
+        groups: dict[tuple, list[dict]] = {}
+        fallback = []
+        for condition in conditions_list:
+            if columns := self.get_eq_condition(table, condition):
+                groups.setdefault(tuple(sorted(columns)), []).append(
+                    {f"b_{key}": value for key, value in columns.items()}
+                )
+            else:
+                fallback.append(delete(table).where(*condition))
+        for keys, parameters_list in groups.items():
+            stmt = delete(sa_table).where(*[sa_table.c[key] == bindparam(f"b_{key}") for key in keys])
+            await self.execute_many(stmt, parameters_list, chunk_size)
+        if fallback:
+            await self.execute_all(fallback)
 
     async def update(self, table, data, condition):
         """
@@ -186,36 +293,153 @@ class AsyncORM:
         """
         await self.execute(update(table).where(*condition).values(**data))
 
-    async def update_batch(self, table, data_list, conditions_list):
+    async def update_batch(self, table, data_list, conditions_list, chunk_size: int = None):
         """
         批量更新数据
         :param table: 表
         :param data_list: 更新的数据列表，每个元素是一个dict，表示一条记录的数据
         :param conditions_list: 条件列表，每个元素是一个tuple或list，表示该记录的条件
+        :param chunk_size: 分块大小
+        """
+        # 等值条件按(条件列,更新列)分组后使用同一条参数化update语句executemany
+        sa_table = getattr(table, "__table__", table)
+        groups: dict[tuple, list[dict]] = {}
+        fallback = []
+        for data, condition in zip(data_list, conditions_list):
+            if columns := self.get_eq_condition(table, condition):
+                groups.setdefault((tuple(sorted(columns)), tuple(sorted(data.keys()))), []).append(
+                    {**data, **{f"b_{key}": value for key, value in columns.items()}}
+                )
+            else:
+                fallback.append(update(table).where(*condition).values(**data))
+        for (keys, _), parameters_list in groups.items():
+            stmt = update(sa_table).where(*[sa_table.c[key] == bindparam(f"b_{key}") for key in keys])
+            await self.execute_many(stmt, parameters_list, chunk_size)
+        if fallback:
+            await self.execute_all(fallback)
+
+    @property
+    def upsert_available(self) -> bool:
+        """当前数据库是否支持原生upsert"""
+        return self.engine.dialect.name in {"sqlite", "postgresql", "mysql", "mariadb"}
+
+    def build_upsert(self, table, index_elements: list[str], update_columns: list[str]):
+        """
+        构造数据库原生的插入或更新语句
+        SQLite/PostgreSQL: INSERT ... ON CONFLICT DO UPDATE
+        MySQL: INSERT ... ON DUPLICATE KEY UPDATE
+        :param table: 表
+        :param index_elements: 冲突判断的列名,必须是主键或唯一约束
+        :param update_columns: 冲突时需要更新的列名
+        :return: 语句,不支持的数据库返回None
+        """
+        dialect_name = self.engine.dialect.name
+        table = getattr(table, "__table__", table)
+        if dialect_name in {"sqlite", "postgresql"}:
+            dialect_insert = sqlite.insert if dialect_name == "sqlite" else postgresql.insert
+            stmt = dialect_insert(table)
+            if not update_columns:
+                return stmt.on_conflict_do_nothing(index_elements=index_elements)
+            return stmt.on_conflict_do_update(
+                index_elements=index_elements,
+                set_={column: stmt.excluded[column] for column in update_columns}
+            )
+        if dialect_name in {"mysql", "mariadb"}:
+            stmt = mysql.insert(table)
+            # 没有需要更新的列时用主键列自赋值,等价于忽略
+            return stmt.on_duplicate_key_update(
+                {column: stmt.inserted[column] for column in update_columns or index_elements}
+            )
+        return None
+
+    async def upsert(self, table, data_list: list[dict], index_elements: list[str], chunk_size: int = None):
+        """
+        批量插入或更新数据,每个分块只发送一次executemany
+        :param table: 表
+        :param data_list: 数据列表，每个元素是一个dict，表示一条记录的数据
+        :param index_elements: 冲突判断的列名,必须是主键或唯一约束
+        :param chunk_size: 分块大小
+        """
+        # executemany要求每条参数的键相同,按键分组
+        groups: dict[tuple, list[dict]] = {}
+        for data in data_list:
+            groups.setdefault(tuple(sorted(data.keys())), []).append(data)
+        for keys, group_data in groups.items():
+            update_columns = [key for key in keys if key not in index_elements]
+            stmt = self.build_upsert(table, index_elements, update_columns)
+            if stmt is None:
+                raise NotImplementedError(f"当前数据库不支持原生upsert: {self.engine.dialect.name}")
+            await self.execute_many(stmt, group_data, chunk_size)
+
+    @staticmethod
+    def get_eq_condition(table, condition) -> dict | None:
+        """
+        解析由`列 == 值`组成的条件
+        :return: {列名: 值},条件中含有其他表达式时返回None
+        """
+        sa_table = getattr(table, "__table__", table)
+        columns = {}
+        for expr in condition:
+            if not (
+                    isinstance(expr, BinaryExpression)
+                    and expr.operator is operators.eq
+                    and isinstance(expr.left, Column)
+                    and sa_table.c.get(expr.left.key) is not None
+                    and hasattr(expr.right, "value")
+            ):
+                return None
+            columns[expr.left.key] = expr.right.value
+        return columns or None
+
+    @staticmethod
+    def get_conflict_columns(table, data: dict, condition) -> list[str] | None:
         """
-        # 构造所有的update语句
-        update_stmts = [update(table).where(*condition).values(**data) for data, condition in
-                        zip(data_list, conditions_list)]
-        # 执行批量更新操作
-        await self.execute_all(update_stmts)
+        判断条件是否为主键/唯一约束上的等值匹配且与数据一致,是则返回可用于upsert的冲突列
+        upsert即使最终执行更新也会先构造插入的行,因此数据必须包含所有没有默认值的非空列,
+        只更新部分列时使用先查询再更新的方式
+        :return: 冲突列名列表,无法使用upsert时返回None
+        """
+        sa_table = getattr(table, "__table__", table)
+        columns = AsyncORM.get_eq_condition(table, condition)
+        if not columns or any(data.get(key) != value for key, value in columns.items()):
+            return None
+        for column in sa_table.columns:
+            if (
+                    column.key not in data
+                    and not column.nullable
+                    and column.default is None
+                    and column.server_default is None
+                    and column is not sa_table.autoincrement_column
+            ):
+                return None
+        for constraint in sa_table.constraints:
+            if not isinstance(constraint, (PrimaryKeyConstraint, UniqueConstraint)):
+                continue
+            if {column.key for column in constraint.columns} == set(columns):
+                return list(columns)
+        return None
 
     async def insert_or_update(self, table, data, condition):
         """
         如果满足条件则更新，否则插入
+        条件为主键/唯一约束上的等值匹配时使用数据库原生upsert
         :param table: 表
         :param data: 数据
         :param condition: 条件
         """
-        # 判断是否存在符合条件的数据
-        exist = (await self.execute(select(table).where(*condition))).all()
-        if exist:
-            # 如果存在，则执行更新操作
-            stmt = update(table).where(*condition).values(**data)
-            stmt = stmt.execution_options(synchronize_session='fetch')
-            await self.execute(stmt)
-        else:
-            # 否则执行插入操作
-            await self.execute(insert(table).values(**data))
+        if self.upsert_available and (index_elements := self.get_conflict_columns(table, data, condition)):
+            return await self.upsert(table, [data], index_elements)
+        async with self.write_session() as session:
+            # 判断是否存在符合条件的数据
+            exist = (await session.execute(select(table).where(*condition))).first()
+            if exist:
+                # 如果存在，则执行更新操作
+                stmt = update(table).where(*condition).values(**data)
+                stmt = stmt.execution_options(synchronize_session='fetch')
+                await session.execute(stmt)
+            else:
+                # 否则执行插入操作
+                await session.execute(insert(table).values(**data))
 
     async def insert_or_update_batch(self, table, data_list, conditions_list):
         """
@@ -224,17 +448,26 @@ class AsyncORM:
         :param data_list: 数据列表，每个元素是一个dict，表示一条记录的数据
         :param conditions_list: 条件列表，每个元素是一个tuple或list，表示该记录的条件，与data_list中的元素一一对应
         """
-        stmts = []
+        # 条件均为主键/唯一约束上的等值匹配时使用数据库原生upsert
+        upsert_data = {}
+        fallback = []
         for data, condition in zip(data_list, conditions_list):
-            exist = (await self.execute(select(table).where(*condition))).all()
-            if exist:
-                # 如果存在符合条件的数据，则更新
-                stmts.append(update(table).where(*condition).values(**data))
+            if self.upsert_available and (index_elements := self.get_conflict_columns(table, data, condition)):
+                upsert_data.setdefault(tuple(index_elements), []).append(data)
             else:
-                # 否则插入
-                stmts.append(insert(table).values(**data))
-        # 执行批量插入或更新操作
-        await self.execute_all(stmts)
+                fallback.append((data, condition))
+        for index_elements, group_data in upsert_data.items():
+            await self.upsert(table, group_data, list(index_elements))
+        if not fallback:
+            return
+        async with self.write_session() as session:
+            for data, condition in fallback:
+                if (await session.execute(select(table).where(*condition))).first():
+                    # 如果存在符合条件的数据，则更新
+                    await session.execute(update(table).where(*condition).values(**data))
+                else:
+                    # 否则插入
+                    await session.execute(insert(table).values(**data))
 
     async def insert_or_ignore(self, table, data, condition):
         """
@@ -243,8 +476,9 @@ class AsyncORM:
         :param data: 数据
         :param condition: 条件
         """
-        if not (await self.execute(select(table).where(*condition))).all():
-            return await self.execute(insert(table).values(**data))
+        async with self.write_session() as session:
+            if not (await session.execute(select(table).where(*condition))).first():
+                return await session.execute(insert(table).values(**data))
 
     async def select(self, el, condition=None):
         """
@@ -254,13 +488,9 @@ class AsyncORM:
         :return: result.fetchall() / None
         """
         if condition is None:
-            result = await self.execute(select([el]))
-        else:
-            result = await self.execute(select([el]).where(*condition))
-        if result:
-            return result.fetchall()
+            return await self.execute_read(select(el))
         else:
-            return None
+            return await self.execute_read(select(el).where(*condition))
 
     async def init_check(self):
         for table in self.Base.__subclasses__():
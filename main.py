@@ -41,16 +41,19 @@ from graia.ariadne.event.message import (
     FriendMessage
 )
 from graia.ariadne.event.message import Member, MessageChain, Stranger
-from graia.ariadne.event.mirai import NudgeEvent, BotJoinGroupEvent
+from graia.ariadne.event.mirai import NudgeEvent, BotJoinGroupEvent, BotOnlineEvent, BotReloginEvent
 from graia.ariadne.model import Friend, Group
 from graia.broadcast import Broadcast
 from graia.saya import Saya
 
 from core.bot import Umaru
 from core.config import GlobalConfig
+from core.models import metrics_model
+from utils.launch_time import record_first_response
 
 config = create(GlobalConfig)
 core = create(Umaru)
+metrics_controller = metrics_model.get_metrics_controller()
 bcc = create(Broadcast)
 saya = create(Saya)
 
@@ -58,47 +61,56 @@ saya = create(Saya)
 @bcc.receiver(GroupMessage)
 async def group_message_listener(app: Ariadne, message: MessageChain, group: Group, member: Member):
     core.received_count += 1
+    metrics_controller.add_received()
     if core.config.GroupMsg_log:
-        bot_member = await app.get_bot_profile()
+        bot_nickname = await core.get_bot_nickname(app)
         message_text_log = message.display.replace("\n", "\\n").strip()
         logger.info(
-            f"【{bot_member.nickname}({app.account})】成功收到群【{group.name.strip()}({group.id})】"
+            f"【{bot_nickname}({app.account})】成功收到群【{group.name.strip()}({group.id})】"
             f"成员【{member.name.strip()}({member.id})】的消息：{message_text_log}")
 
 
 @bcc.receiver(FriendMessage)
 async def friend_message_listener(app: Ariadne, friend: Friend, message: MessageChain):
     core.received_count += 1
+    metrics_controller.add_received()
     message_text_log = message.display.replace("\n", "\\n").strip()
-    bot_member = await app.get_bot_profile()
+    bot_nickname = await core.get_bot_nickname(app)
     logger.info(
-        f"【{bot_member.nickname}({app.account})】成功收到"
+        f"【{bot_nickname}({app.account})】成功收到"
         f"好友【{friend.nickname.strip()}({friend.id})】的消息：{message_text_log}")
 
 
 @bcc.receiver(ActiveGroupMessage)
 async def group_message_speaker(app: Ariadne, event: ActiveGroupMessage):
     core.sent_count += 1
+    metrics_controller.add_sent()
+    # 启动通知等主动消息不算作响应
+    if core.received_count:
+        record_first_response()
     message_text_log = event.message_chain.display.replace("\n", "\\n").strip()
-    bot_member = await app.get_bot_profile()
+    bot_nickname = await core.get_bot_nickname(app)
     logger.info(
-        f"【{bot_member.nickname}({app.account})】成功向群"
+        f"【{bot_nickname}({app.account})】成功向群"
         f"【{event.subject.name.strip()}({event.subject.id})】发送消息：{message_text_log}")
 
 
 @bcc.receiver(ActiveFriendMessage)
 async def friend_message_speaker(app: Ariadne, event: ActiveFriendMessage):
     core.sent_count += 1
-    bot_member = await app.get_bot_profile()
+    metrics_controller.add_sent()
+    if core.received_count:
+        record_first_response()
+    bot_nickname = await core.get_bot_nickname(app)
     message_text_log = event.message_chain.display.replace("\n", "\\n").strip()
     logger.info(
-        f"【{bot_member.nickname}({app.account})】成功向"
+        f"【{bot_nickname}({app.account})】成功向"
         f"好友【{event.subject.nickname.strip()}({event.subject.id})】发送消息：{message_text_log}")
 
 
 @bcc.receiver(NudgeEvent)
 async def nudged_listener(app: Ariadne, event: NudgeEvent):
-    bot_member = await app.get_bot_profile()
+    bot_nickname = await core.get_bot_nickname(app)
     if event.target != app.account or event.supplicant == app.account:
         return
     if event.subject.id is None:
@@ -106,27 +118,29 @@ async def nudged_listener(app: Ariadne, event: NudgeEvent):
     if not (member := await app.get_member(event.subject.id, event.supplicant)):
         return
     logger.info(
-        f"【{bot_member.nickname}({app.account})】被群【{member.group.name}】中"
+        f"【{bot_nickname}({app.account})】被群【{member.group.name}】中"
         f"成员【{member.name}】({member.id})戳了戳。")
 
 
 @bcc.receiver(TempMessage)
 async def temp_message_listener(app: Ariadne, member: Member, message: MessageChain):
     core.received_count += 1
-    bot_member = await app.get_bot_profile()
+    metrics_controller.add_received()
+    bot_nickname = await core.get_bot_nickname(app)
     message_text_log = message.display.replace("\n", "\\n").strip()
     logger.info(
-        f"【{bot_member.nickname}({app.account})】收到群【{member.group.name.strip()}({member.group.id})】"
+        f"【{bot_nickname}({app.account})】收到群【{member.group.name.strip()}({member.group.id})】"
         f"成员【{member.name.strip()}({member.id})】的临时消息：{message_text_log}")
 
 
 @bcc.receiver(StrangerMessage)
 async def stranger_message_listener(app: Ariadne, stranger: Stranger, message: MessageChain):
     core.received_count += 1
-    bot_member = await app.get_bot_profile()
+    metrics_controller.add_received()
+    bot_nickname = await core.get_bot_nickname(app)
     message_text_log = message.display.replace("\n", "\\n").strip()
     logger.info(
-        f"【{bot_member.nickname}({app.account})】收到来自"
+        f"【{bot_nickname}({app.account})】收到来自"
         f"陌生人【{stranger.nickname.strip()}({stranger.id})】的消息：{message_text_log})")
 
 
@@ -135,6 +149,14 @@ async def init():
     await core.initialize()
 
 
+# 账号启动/重新登录时刷新bot资料缓存
+@bcc.receiver(AccountLaunch)
+@bcc.receiver(BotOnlineEvent)
+@bcc.receiver(BotReloginEvent)
+async def refresh_bot_profile(app: Ariadne):
+    await core.refresh_bot_profile(app)
+
+
 # BOT加入新群时,进行初始化
 @bcc.receiver(BotJoinGroupEvent)
 async def init_join_group(app: Ariadne, event: BotJoinGroupEvent):
@@ -154,7 +176,7 @@ if __name__ == "__main__":
     except httpx.HTTPError:
         logger.critical("未检测到 Mirai ! 请检查: mirai是否正常启动 / mah-v2是否正常安装 / mah配置端口是否被占用 / mah配置是否与bot配置一致 ")
     core.install_modules(Path("modules") / "required")
-    core.install_modules(Path("modules") / "self_contained")
-    core.install_modules(Path("modules") / "third_party")
+    core.install_modules(Path("modules") / "self_contained", lazy=config.lazy_load_modules)
+    core.install_modules(Path("modules") / "third_party", lazy=config.lazy_load_modules)
     core.launch()
     logger.debug("UmaruBot 已关闭")
@@ -1,8 +1,8 @@
-import jieba
 import datetime
 
 from pathlib import Path
 
+from graia.ariadne.event.lifecycle import ApplicationShutdown
 from graia.ariadne.util.saya import listen, decorate
 from graia.saya import Saya, Channel
 from graia.ariadne.message.element import Plain
@@ -11,11 +11,8 @@ from graia.ariadne.event.message import Group, Member, GroupMessage
 
 from core.control import Distribute
 from core.models import saya_model
-from core.orm import orm
-from core.orm.tables import ChatRecord
+from utils.chat_record_writer import get_chat_record_writer
 
-# 关闭 jieba 的 Debug log
-jieba.setLogLevel(jieba.logging.INFO)
 module_controller = saya_model.get_module_controller()
 saya = Saya.current()
 channel = Channel.current()
@@ -25,18 +22,23 @@ channel.meta["description"] = ("一个记录聊天记录的插件，可配合词
 channel.metadata = module_controller.get_metadata_from_path(Path(__file__))
 
 
+chat_record_writer = get_chat_record_writer()
+
+
 @listen(GroupMessage)
 @decorate(Distribute.require())
 async def chat_record(message: MessageChain, group: Group, member: Member):
-    content = "".join(plain.text for plain in message.get(Plain)).strip()
-    seg_result = jieba.lcut(content) if content else ""
-    await orm.add(
-        table=ChatRecord,
-        data={
+    await chat_record_writer.put(
+        {
             "time": datetime.datetime.now(),
             "group_id": group.id,
             "member_id": member.id,
             "persistent_string": message.as_persistent_string(),
-            "seg": "|".join(seg_result) if seg_result else "",
+            "content": "".join(plain.text for plain in message.get(Plain)).strip(),
         }
     )
+
+
+@listen(ApplicationShutdown)
+async def flush_chat_record():
+    await chat_record_writer.stop()
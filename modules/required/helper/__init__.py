@@ -1,4 +1,5 @@
 import random
+from functools import lru_cache
 from pathlib import Path
 
 from creart import create
@@ -28,6 +29,7 @@ from core.models import (
 )
 from utils.UI import *
 from utils.image import get_img_base64_str
+from utils.render_cache import RenderCache
 
 config = create(GlobalConfig)
 core = create(Umaru)
@@ -42,6 +44,29 @@ channel.meta["description"] = ("生成帮助菜单信息(必须插件)")
 channel.meta["author"] = ("13")
 channel.metadata = module_controller.get_metadata_from_path(Path(__file__))
 
+# 帮助菜单只随群插件开关、已安装插件和头像变化,缓存渲染结果
+render_cache = RenderCache(cache_dir=Path(__file__).parent / "cache")
+
+
+@lru_cache(maxsize=None)
+def get_avatar(path: Path) -> str:
+    return get_img_base64_str(path.read_bytes())
+
+
+async def gen_menu(form: GenForm, group_id: int | None = None) -> bytes:
+    """
+    渲染菜单,相同内容直接返回缓存
+    :param form: 菜单内容
+    :param group_id: 传入时该群插件状态变化后丢弃该群的缓存
+    """
+    key = RenderCache.make_key("OneMockUI", OneMockUI.TEMPLATE_PATH.stat().st_mtime_ns, form.json())
+    return await render_cache.get_or_render(
+        key,
+        lambda: OneMockUI.gen(form),
+        tag=group_id,
+        version=module_controller.get_version(group_id) if group_id is not None else None
+    )
+
 
 @listen(GroupMessage)
 @decorate(
@@ -82,7 +107,7 @@ async def helper(app: Ariadne, group: Group, source: Source):
         ColumnTitle(title="小埋BOT帮助菜单"),
         ColumnUserInfo(
             name="どま うまる",
-            avatar=get_img_base64_str(Path.read_bytes(random.choice(dirs))),
+            avatar=get_avatar(random.choice(dirs)),
             description="如有疑问可加群749094683咨询",
         ),
         ColumnTitle(title="用法"),
@@ -137,8 +162,9 @@ async def helper(app: Ariadne, group: Group, source: Source):
     )
     module_columns = [Column(elements=module_columns[i: i + 20]) for i in range(0, len(module_columns), 20)]
     return await app.send_message(group, MessageChain(
-        Image(data_bytes=await OneMockUI.gen(
-            GenForm(columns=required_columns + module_columns, color_type=get_color_type_follow_time())
+        Image(data_bytes=await gen_menu(
+            GenForm(columns=required_columns + module_columns, color_type=get_color_type_follow_time()),
+            group.id
         ))
     ), quote=source)
 
@@ -233,7 +259,7 @@ async def module_helper(app: Ariadne, group: Group, source: Source, index: Regex
     )]
 
     return await app.send_message(group, MessageChain(
-        Image(data_bytes=await OneMockUI.gen(
+        Image(data_bytes=await gen_menu(
             GenForm(columns=module_column, color_type=get_color_type_follow_time())
         ))
     ), quote=source)
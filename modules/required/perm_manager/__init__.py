@@ -29,10 +29,11 @@ from core.control import (
 )
 from core.models import (
     saya_model,
-    response_model
+    response_model,
+    group_model
 )
 from core.orm import orm
-from core.orm.tables import MemberPerm, GroupPerm, GroupSetting
+from core.orm.tables import GroupPerm, GroupSetting
 from utils.UI import *
 from utils.image import get_user_avatar_url, get_img_base64_str
 from utils.parse_messagechain import get_targets
@@ -112,18 +113,7 @@ async def change_user_perm(
         elif await Permission.get_user_perm_byID(target_group.id, target) == Permission.BotAdmin:
             error_targets.append((target, "无法直接通过该指令修改BOT管理权限"))
         else:
-            await orm.insert_or_update(
-                table=MemberPerm,
-                condition=[
-                    MemberPerm.qq == target,
-                    MemberPerm.group_id == target_group.id
-                ],
-                data={
-                    "group_id": target_group.id,
-                    "qq": target,
-                    "perm": perm
-                }
-            )
+            await Permission.set_user_perm(target_group.id, target, perm)
     response_text = f"共解析{len(targets)}个目标\n其中{len(targets) - len(error_targets)}个执行成功,{len(error_targets)}个失败"
     if error_targets:
         response_text += "\n\n失败目标:"
@@ -179,6 +169,7 @@ async def change_group_perm(
             GroupPerm.group_id == target_group.id
         ]
     )
+    group_model.get_group_setting_controller().invalidate(target_group.id)
     return await app.send_message(group, MessageChain(
         f"已修改群{target_group.name}({target_group.id})权限为{perm}"
     ), quote=source)
@@ -217,22 +208,16 @@ async def change_group_perm(
         ), quote=source)
     await orm.insert_or_update(
         table=GroupSetting,
-        data={"permission_type": permission_type},
+        data={"group_id": target_group.id, "permission_type": permission_type},
         condition=[
             GroupSetting.group_id == target_group.id
         ]
     )
+    group_model.get_group_setting_controller().invalidate(target_group.id)
     if permission_type == "admin":
         for member in await target_app.get_member_list(target_group):
             if await Permission.get_user_perm_byID(target_group.id, member.id) < Permission.GroupAdmin:
-                await orm.insert_or_update(
-                    table=MemberPerm,
-                    data={"qq": member.id, "group_id": group.id, "perm": Permission.GroupAdmin},
-                    condition=[
-                        MemberPerm.qq == member.id,
-                        MemberPerm.group_id == group.id
-                    ]
-                )
+                await Permission.set_user_perm(group.id, member.id, Permission.GroupAdmin)
     else:
         for member in await target_app.get_member_list(group):
             target_perm = Permission.member_permStr_dict[member.permission.name]
@@ -240,16 +225,7 @@ async def change_group_perm(
             if now_perm >= Permission.GroupOwner:
                 continue
             if now_perm != target_perm:
-                await orm.insert_or_update(
-                    table=MemberPerm,
-                    data={"qq": member.id,
-                          "group_id": group.id,
-                          "perm": target_perm},
-                    condition=[
-                        MemberPerm.qq == member.id,
-                        MemberPerm.group_id == group.id
-                    ]
-                )
+                await Permission.set_user_perm(group.id, member.id, target_perm)
     return await app.send_message(group, MessageChain(
         f"已修改群{target_group.name}({target_group.id})权限类型为{permission_type}"
     ), quote=source)
@@ -423,29 +399,12 @@ async def change_globalBlack(app: Ariadne, group: Group, action: RegexResult, me
             if target in global_black_list:
                 error_targets.append((target, f"{target}已经在全局黑名单内!"))
             else:
-                await orm.insert_or_update(
-                    table=MemberPerm,
-                    data={
-                        "qq": target,
-                        "group_id": 0,
-                        "perm": -1
-                    },
-                    condition=[
-                        MemberPerm.qq == target,
-                        MemberPerm.group_id == 0
-                    ]
-                )
+                await Permission.set_user_perm(0, target, Permission.GlobalBlack)
         else:
             if target not in global_black_list:
                 error_targets.append((target, f"{target}不在全局黑名单内!"))
             else:
-                await orm.delete(
-                    table=MemberPerm,
-                    condition=[
-                        MemberPerm.qq == target,
-                        MemberPerm.group_id == 0
-                    ]
-                )
+                await Permission.del_user_perm(0, target)
     response_text = f"共解析{len(targets)}个目标\n其中{len(targets) - len(error_targets)}个执行成功,{len(error_targets)}个失败"
     if error_targets:
         response_text += "\n\n失败目标:"
@@ -519,12 +478,7 @@ async def change_botAdmin(app: Ariadne, group: Group, action: RegexResult, membe
             else:
                 await core.update_admins_permission([target])
         elif target in admin_list:
-            await orm.delete(
-                table=MemberPerm,
-                condition=[
-                    MemberPerm.qq == target,
-                ]
-            )
+            await Permission.del_user_perm(None, target)
             await core.update_admins_permission()
         else:
             error_targets.append((target, f"{target}还不是BOT管理哦!"))
@@ -578,13 +532,7 @@ async def auto_del_perm(app: Ariadne, group: Group, member: Member):
     if app.account != await account_controller.get_response_account(group.id):
         return
     target_perm = await Permission.get_user_perm_byID(group.id, member.id)
-    await orm.delete(
-        table=MemberPerm,
-        condition=[
-            MemberPerm.qq == member.id,
-            MemberPerm.group_id == group.id
-        ]
-    )
+    await Permission.del_user_perm(group.id, member.id)
     if Permission.GroupOwner >= target_perm >= Permission.GroupAdmin:
         return await app.send_message(group, f"已自动删除退群成员{member.name}({member.id})的权限")
 
@@ -594,39 +542,14 @@ async def auto_del_perm(app: Ariadne, group: Group, member: Member):
 async def auto_add_perm(app: Ariadne, group: Group, member: Member, event: MemberJoinEvent):
     if app.account != await account_controller.get_response_account(group.id):
         return
-    permission_type = "default"
-    if result := await orm.fetch_one(
-            select(GroupSetting.permission_type).where(GroupSetting.group_id == group.id)
-    ):
-        permission_type = result[0]
+    permission_type = await Permission.get_group_perm_type(group.id)
     if permission_type == "admin":
-        await orm.insert_or_update(
-            table=MemberPerm,
-            data={"qq": member.id, "group_id": group.id, "perm": 32},
-            condition=[
-                MemberPerm.qq == member.id,
-                MemberPerm.group_id == group.id
-            ]
-        )
+        await Permission.set_user_perm(group.id, member.id, Permission.GroupAdmin)
         await app.send_message(group, f"已自动修改成员{member.name}({member.id})的权限为32")
     if event.member.id == config.Master:
-        return await orm.insert_or_update(
-            table=MemberPerm,
-            data={"qq": event.member.id, "group_id": event.member.group.id, "perm": Permission.Master},
-            condition=[
-                MemberPerm.qq == event.member.id,
-                MemberPerm.group_id == event.member.group.id
-            ]
-        )
+        return await Permission.set_user_perm(event.member.group.id, event.member.id, Permission.Master)
     elif event.member.id in await Permission.get_BotAdminsList():
-        await orm.insert_or_update(
-            table=MemberPerm,
-            data={"qq": event.member.id, "group_id": event.member.group.id, "perm": Permission.BotAdmin},
-            condition=[
-                MemberPerm.qq == event.member.id,
-                MemberPerm.group_id == event.member.group.id,
-            ]
-        )
+        await Permission.set_user_perm(event.member.group.id, event.member.id, Permission.BotAdmin)
 
 
 # 自动修改群管理权限
@@ -641,11 +564,7 @@ async def auto_change_admin_perm(app: Ariadne, event: MemberPermissionChangeEven
     if (target_member.id in admin_list) or target_member.id == config.Master:
         return
     # 跳过管理组
-    permission_type = "default"
-    if result := await orm.fetch_one(
-            select(GroupSetting.permission_type).where(GroupSetting.group_id == target_group.id)
-    ):
-        permission_type = result[0]
+    permission_type = await Permission.get_group_perm_type(target_group.id)
     if permission_type == "admin":
         return
     if event.current.name == "Owner":
@@ -662,14 +581,7 @@ async def auto_change_admin_perm(app: Ariadne, event: MemberPermissionChangeEven
                 f"如需修改权限请使用指令 ’修改权限16 {target_member.id}‘"
             )
         )
-    await orm.insert_or_update(
-        table=MemberPerm,
-        data={"qq": event.member.id, "group_id": event.member.group.id, "perm": target_perm},
-        condition=[
-            MemberPerm.qq == event.member.id,
-            MemberPerm.group_id == event.member.group.id
-        ]
-    )
+    await Permission.set_user_perm(event.member.group.id, event.member.id, target_perm)
     return await app.send_message(
         target_group,
         MessageChain(
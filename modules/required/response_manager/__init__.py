@@ -3,6 +3,14 @@ from pathlib import Path
 from creart import create
 from graia.ariadne.app import Ariadne
 from graia.ariadne.event.message import GroupMessage
+from graia.ariadne.event.mirai import (
+    BotJoinGroupEvent,
+    BotLeaveEventActive,
+    BotLeaveEventKick,
+    BotLeaveEventDisband,
+    BotGroupPermissionChangeEvent,
+    MemberPermissionChangeEvent
+)
 from graia.ariadne.message.chain import MessageChain
 from graia.ariadne.message.element import Image, Source
 from graia.ariadne.message.parser.twilight import (
@@ -14,6 +22,8 @@ from graia.ariadne.message.parser.twilight import (
 from graia.ariadne.model import Group, Member
 from graia.ariadne.util.saya import listen, dispatch, decorate
 from graia.saya import Channel, Saya
+from graia.scheduler import timers
+from graia.scheduler.saya import SchedulerSchema
 
 from core.bot import Umaru
 from core.config import GlobalConfig
@@ -345,3 +355,31 @@ async def choose_response_bot(
             account_controller.deterministic_account[target_group.id] = index
             return await app.send_message(group, MessageChain(f"已成功设定群指定响应BOT为{bot_account}"), quote=source)
     return await app.send_message(group, MessageChain("设定失败,没有找到对应信息!"), quote=source)
+
+
+# 维护bot所在群及bot权限的索引
+@listen(BotJoinGroupEvent)
+async def index_bot_join(app: Ariadne, event: BotJoinGroupEvent):
+    account_controller.update_bot_group(app.account, event.group)
+
+
+@listen(BotLeaveEventActive, BotLeaveEventKick, BotLeaveEventDisband)
+async def index_bot_leave(app: Ariadne, group: Group):
+    account_controller.remove_bot_group(group.id, app.account)
+
+
+@listen(BotGroupPermissionChangeEvent)
+async def index_bot_perm_change(app: Ariadne, event: BotGroupPermissionChangeEvent):
+    account_controller.update_bot_role(event.group.id, app.account, event.current.name)
+
+
+@listen(MemberPermissionChangeEvent)
+async def index_member_perm_change(event: MemberPermissionChangeEvent):
+    if event.member.id in config.bot_accounts:
+        account_controller.update_bot_role(event.member.group.id, event.member.id, event.current.name)
+
+
+# 定期以群列表为准校正索引,弥补漏掉的事件
+@channel.use(SchedulerSchema(timers.every_custom_minutes(30)))
+async def reconcile_bot_groups():
+    await account_controller.reconcile()
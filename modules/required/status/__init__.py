@@ -1,21 +1,21 @@
+import secrets
 import time
 from datetime import datetime
 from pathlib import Path
-from typing import Union, Deque, Tuple
-from collections import deque
+from typing import Union
 
 import psutil
 from creart import create
+from fastapi import Depends, HTTPException, Request
 from graia.ariadne.app import Ariadne
 from graia.ariadne.event.message import GroupMessage, FriendMessage
 from graia.ariadne.message.chain import MessageChain
 from graia.ariadne.message.element import Source
-from graia.ariadne.message.parser.twilight import Twilight, SpacePolicy, FullMatch
+from graia.ariadne.message.parser.twilight import Twilight, SpacePolicy, FullMatch, UnionMatch, RegexResult
 from graia.ariadne.model import Group, Friend
 from graia.ariadne.util.saya import listen, dispatch, decorate
 from graia.saya import Channel, Saya
-from graia.scheduler import timers
-from graia.scheduler.saya import SchedulerSchema
+from graiax.fastapi import RouteSchema
 
 from core.bot import Umaru
 from core.config import GlobalConfig
@@ -27,13 +27,21 @@ from core.control import (
 )
 from core.models import (
     saya_model,
-    response_model
+    response_model,
+    perm_model,
+    metrics_model,
+    profile_model
 )
+from utils.chat_record_writer import get_chat_record_writer
+from utils.http_pool import get_http_pool
+from utils.loop_watchdog import get_loop_watchdog
 
 config = create(GlobalConfig)
 core = create(Umaru)
 module_controller = saya_model.get_module_controller()
 account_controller = response_model.get_acc_controller()
+metrics_controller = metrics_model.get_metrics_controller()
+handler_profiler = profile_model.get_handler_profiler()
 
 saya = Saya.current()
 channel = Channel.current()
@@ -43,76 +51,6 @@ channel.meta["author"] = ("13")
 channel.metadata = module_controller.get_metadata_from_path(Path(__file__))
 
 
-class MessageCount:
-    """
-    用于管理和检索消息计数统计信息的类。
-    """
-
-    def __init__(self):
-        """
-        初始化 MessageCount 实例。
-        """
-        self.receive_queue: Deque[Tuple[int, float]] = deque()
-        self.send_queue: Deque[Tuple[int, float]] = deque()
-
-    async def update_message_counts(self) -> None:
-        """
-        更新消息计数。
-
-        参数:
-        - core: 包含消息计数数据的对象。
-
-        注意:
-        - 为更新消息计数日志，应定期调用此方法。
-        """
-        self.receive_queue.append((core.received_count, time.time()))
-        self.send_queue.append((core.sent_count, time.time()))
-
-    def get_receive_count(self, time_limit: Union[int, float] = 60) -> int:
-        """
-        获取过去指定时间内接收到的消息数量。
-
-        参数:
-        - time_limit: Union[int, float], 指定的时间范围，单位为秒，默认为60秒。
-
-        返回:
-        - int: 过去指定时间内接收到的消息数量。
-        """
-        current_time = time.time()
-        # 从队列前端移除超过60秒的条目
-        while self.receive_queue and current_time - self.receive_queue[0][1] > time_limit:
-            self.receive_queue.popleft()
-
-        # 计算并返回过去一分钟内消息计数的差值
-        return self.receive_queue[-1][0] - self.receive_queue[0][0] if self.receive_queue else 0
-
-    def get_send_count(self, time_limit: Union[int, float] = 60) -> int:
-        """
-        获取过去指定时间内发送的消息数量。
-
-        参数:
-        - time_limit: Union[int, float], 指定的时间范围，单位为秒，默认为60秒。
-
-        返回:
-        - int: 过去指定时间内发送的消息数量。
-        """
-        current_time = time.time()
-        # 从队列前端移除超过60秒的条目
-        while self.send_queue and current_time - self.send_queue[0][1] > time_limit:
-            self.send_queue.popleft()
-
-        # 计算并返回过去一分钟内消息计数的差值
-        return self.send_queue[-1][0] - self.send_queue[0][0] if self.send_queue else 0
-
-
-message_count = MessageCount()
-
-
-@channel.use(SchedulerSchema(timers.every_custom_seconds(3)))
-async def message_counter():
-    await message_count.update_message_counts()
-
-
 # 接收事件
 @listen(GroupMessage, FriendMessage)
 @decorate(
@@ -146,8 +84,16 @@ async def bot(app: Ariadne, src_place: Union[Group, Friend], source: Source):
     # 磁盘
     cp = str(psutil.disk_usage('/').percent) + "%"
     launch_time = datetime.fromtimestamp(core.launch_time.timestamp()).strftime('%Y年%m月%d日%H时%M分%S秒')
-    real_time_received_message_count = message_count.get_receive_count()
-    real_time_sent_message_count = message_count.get_send_count()
+    real_time_received_message_count = metrics_controller.received.count(60)
+    real_time_sent_message_count = metrics_controller.sent.count(60)
+    latency_stats = metrics_controller.latency.get_stats()
+    module_top = "、".join(
+        f"{module_name.split('.')[-1]}({count})" for module_name, count in metrics_controller.get_module_top(3)
+    )
+    perm_cache_stats = perm_model.get_perm_cache().get_stats()
+    loop_watchdog = get_loop_watchdog()
+    http_stats = get_http_pool().get_stats()
+    chat_record_stats = get_chat_record_writer().get_stats()
     await app.send_message(
         src_place,
         MessageChain(
@@ -155,8 +101,21 @@ async def bot(app: Ariadne, src_place: Union[Group, Friend], source: Source):
             f"运行时长：{work_time}\n",
             f"接收消息：{core.received_count}条 (实时:{real_time_received_message_count}条/m)\n"
             f"发送消息：{core.sent_count + 1}条 (实时:{real_time_sent_message_count}条/m)\n"
+            f"24h收发：{metrics_controller.received.count(86400)}/{metrics_controller.sent.count(86400)}条\n"
+            f"处理耗时：p50 {latency_stats['p50'] * 1000:.0f}ms/p95 {latency_stats['p95'] * 1000:.0f}ms/"
+            f"p99 {latency_stats['p99'] * 1000:.0f}ms\n"
+            f"调用最多：{module_top or '无'}\n"
             f"内存使用：{ysy / 1024 / 1024:.0f}MB ({zb:.0f}%)\n",
             f"CPU占比：{zb2}\n",
+            f"事件循环延迟：{loop_watchdog.lag * 1000:.0f}ms (最大:{loop_watchdog.max_lag * 1000:.0f}ms,"
+            f"卡顿:{loop_watchdog.stall_count}次)\n" if loop_watchdog else "",
+            f"权限缓存：{perm_cache_stats['size']}条 (命中率:{perm_cache_stats['hit_rate']:.2%})\n",
+            f"HTTP请求：{http_stats['requests']}次 (新建连接:{http_stats['connections']}个,"
+            f"复用率:{http_stats['reuse_rate']:.2%})\n" if http_stats['requests'] else "",
+            f"聊天记录：已写入{chat_record_stats['written']}条 (队列:{chat_record_stats['queue_size']}/"
+            f"{chat_record_stats['max_queue_size']},峰值:{chat_record_stats['high_watermark']},"
+            f"阻塞:{chat_record_stats['blocked']}次,失败:{chat_record_stats['failed']}条)\n"
+            if chat_record_stats['enqueued'] else "",
             f"磁盘占比：{cp}\n",
             f"在线bot数量：{len([app_item for app_item in core.apps if Ariadne.current(app_item.account).connection.status.available])}/"
             f"{len(core.apps)}\n",
@@ -166,3 +125,111 @@ async def bot(app: Ariadne, src_place: Union[Group, Friend], source: Source):
         ),
         quote=source,
     )
+
+
+# 监听器分阶段耗时分析
+@listen(GroupMessage, FriendMessage)
+@decorate(
+    Distribute.require(),
+    Function.require(channel.module),
+    FrequencyLimitation.require(channel.module),
+    Permission.group_require(channel.metadata.level, if_noticed=True),
+    Permission.user_require(Permission.BotAdmin, if_noticed=True),
+)
+@dispatch(Twilight([
+    FullMatch("-bot"),
+    FullMatch("分析"),
+    UnionMatch("开启", "关闭", "重置", optional=True) @ "action"
+]))
+async def profile(app: Ariadne, src_place: Union[Group, Friend], source: Source, action: RegexResult):
+    action = action.result.display if action.matched else None
+    if action == "开启":
+        count = handler_profiler.enable()
+        return await app.send_message(src_place, MessageChain(f"已开启耗时分析,新包装{count}个监听器/Depend"), quote=source)
+    if action == "关闭":
+        handler_profiler.disable()
+        return await app.send_message(src_place, MessageChain("已关闭耗时分析"), quote=source)
+    if action == "重置":
+        handler_profiler.reset()
+        return await app.send_message(src_place, MessageChain("已重置耗时分析数据"), quote=source)
+    if not handler_profiler.stats:
+        return await app.send_message(
+            src_place,
+            MessageChain(f"耗时分析{'已开启' if handler_profiler.enabled else '未开启'},暂无数据"),
+            quote=source
+        )
+    lines = [f"耗时分析({'开启' if handler_profiler.enabled else '关闭'},阻塞阈值{handler_profiler.block_threshold * 1000:.0f}ms)"]
+    for (channel_name, stage), stats in handler_profiler.get_top(10):
+        latency = stats.latency.get_stats()
+        lines.append(
+            f"{channel_name.split('.')[-1]}.{stage}: {latency['count']}次 "
+            f"avg {latency['avg'] * 1000:.1f}ms/p95 {latency['p95'] * 1000:.1f}ms "
+            f"最长单步{stats.max_step * 1000:.1f}ms" + (f" 阻塞{stats.blocked}次" if stats.blocked else "")
+        )
+    await app.send_message(src_place, MessageChain("\n".join(lines)), quote=source)
+
+
+# 事件循环卡顿记录
+@listen(GroupMessage, FriendMessage)
+@decorate(
+    Distribute.require(),
+    Function.require(channel.module),
+    FrequencyLimitation.require(channel.module),
+    Permission.group_require(channel.metadata.level, if_noticed=True),
+    Permission.user_require(Permission.BotAdmin, if_noticed=True),
+)
+@dispatch(Twilight([
+    FullMatch("-bot"),
+    FullMatch("卡顿")
+]))
+async def loop_stall(app: Ariadne, src_place: Union[Group, Friend], source: Source):
+    if not (loop_watchdog := get_loop_watchdog()) or not loop_watchdog.stall_count:
+        return await app.send_message(src_place, MessageChain("暂无事件循环卡顿记录"), quote=source)
+    lines = [f"事件循环卡顿{loop_watchdog.stall_count}次(阈值{loop_watchdog.threshold * 1000:.0f}ms),最严重的记录:"]
+    for index, record in enumerate(loop_watchdog.get_worst(5)):
+        lines.append(
+            f"{index + 1}.{datetime.fromtimestamp(record['time']).strftime('%m-%d %H:%M:%S')} "
+            f"{record['duration'] * 1000:.0f}ms 任务:{record['coro'] or record['task']}"
+        )
+        if record["stack"]:
+            lines.append("  " + record["stack"][-1].splitlines()[0].strip())
+    await app.send_message(src_place, MessageChain("\n".join(lines)), quote=source)
+
+
+async def get_metrics():
+    """运行指标,供web管理接口使用"""
+    return {
+        "launch_time": core.launch_time.timestamp(),
+        "received_count": core.received_count,
+        "sent_count": core.sent_count,
+        **metrics_controller.get_stats(),
+    }
+
+
+async def get_loop_stall():
+    """事件循环卡顿记录,供web管理接口使用,不包含调用栈(调用栈见日志或-bot 卡顿)"""
+    if not (loop_watchdog := get_loop_watchdog()):
+        return {}
+    return loop_watchdog.get_stats()
+
+
+async def get_profile():
+    """监听器分阶段耗时,供web管理接口使用"""
+    return handler_profiler.get_stats()
+
+
+async def verify_api_token(request: Request):
+    """状态接口的鉴权,设置了api_token时校验请求头,未设置时只允许本机访问"""
+    if config.api_token:
+        authorization = request.headers.get("Authorization", "")
+        if not secrets.compare_digest(authorization.encode(), f"Bearer {config.api_token}".encode()):
+            raise HTTPException(status_code=401, detail="Unauthorized")
+    elif not request.client or request.client.host not in ("127.0.0.1", "::1"):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+if config.web_manager_api:
+    api_dependencies = [Depends(verify_api_token)]
+    channel.use(RouteSchema("/status/metrics", methods=["GET"], dependencies=api_dependencies))(get_metrics)
+    channel.use(RouteSchema("/status/profile", methods=["GET"], dependencies=api_dependencies))(get_profile)
+    channel.use(RouteSchema("/status/loop_stall", methods=["GET"], dependencies=api_dependencies))(get_loop_stall)
@@ -9,7 +9,6 @@ import time
 from pathlib import Path
 from typing import List, Tuple
 
-import httpx
 from creart import create
 from graia.ariadne.app import Ariadne
 from graia.ariadne.event.lifecycle import ApplicationLaunched
@@ -49,6 +48,7 @@ from utils.bf1.default_account import BF1DA
 from utils.bf1.draw import PlayerStatPic, PlayerVehiclePic, PlayerWeaponPic, Exchange
 from utils.bf1.gateway_api import api_instance
 from utils.bf1.map_team_info import MapData
+from utils.http_pool import get_http_pool
 
 config = create(GlobalConfig)
 core = create(Umaru)
@@ -2008,9 +2008,9 @@ async def report(
     }
     # noinspection PyBroadException
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(check_eacInfo_url, headers=header, timeout=10)
-            response = response.json()
+        client = get_http_pool().get_client()
+        response = await client.get(check_eacInfo_url, headers=header, timeout=10)
+        response = response.json()
     except Exception as e:
         logger.error(e)
         await app.send_message(group, MessageChain(
@@ -2165,9 +2165,9 @@ async def report(
                     }
                     # noinspection PyBroadException
                     try:
-                        async with httpx.AsyncClient() as client:
-                            response = await client.get(img_url, headers=headers, timeout=5)
-                            r = response
+                        client = get_http_pool().get_client()
+                        response = await client.get(img_url, headers=headers, timeout=5)
+                        r = response
                     except Exception as e:
                         logger.error(e)
                         await app.send_message(group, MessageChain(
@@ -2193,8 +2193,8 @@ async def report(
                             "Authorization": image_apikey
                         }
                         try:
-                            async with httpx.AsyncClient() as client:
-                                response = await client.post(tc_url, files=tc_files, headers=tc_headers)
+                            client = get_http_pool().get_client()
+                            response = await client.post(tc_url, files=tc_files, headers=tc_headers)
                         except Exception as e:
                             logger.error(e)
                             await app.send_message(group, MessageChain(
@@ -2220,8 +2220,8 @@ async def report(
                             "apikey": apikey
                         }
                         try:
-                            async with httpx.AsyncClient() as client:
-                                response = await client.post(tc_url, files=tc_files, headers=tc_headers)
+                            client = get_http_pool().get_client()
+                            response = await client.post(tc_url, files=tc_files, headers=tc_headers)
                         except Exception as e:
                             logger.error(e)
                             await app.send_message(group, MessageChain(
@@ -9,7 +9,6 @@ from math import ceil
 from pathlib import Path
 from typing import Union
 
-import httpx
 import zhconv
 from creart import create
 from graia.ariadne.app import Ariadne
@@ -47,6 +46,7 @@ from utils.bf1.database import BF1DB
 from utils.bf1.default_account import BF1DA
 from utils.bf1.draw import PlayerListPic, PlayerStatPic, PlayerWeaponPic, PlayerVehiclePic
 from utils.bf1.map_team_info import MapData
+from utils.http_pool import get_http_pool
 from utils.parse_messagechain import get_targets
 from utils.string import generate_random_str
 from utils.timeutils import DateTimeUtils
@@ -4778,11 +4778,11 @@ async def add_vban(
         'time': 0
     }
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post('https://manager-api.gametools.network/api/addautoban', headers=headers,
-                                         json=json_data)
-            response.raise_for_status()
-            response = response.json()
+        client = get_http_pool().get_client()
+        response = await client.post('https://manager-api.gametools.network/api/addautoban', headers=headers,
+                                     json=json_data)
+        response.raise_for_status()
+        response = response.json()
     except:
         await app.send_message(group, MessageChain(
             f"网络出错,请稍后再试!"
@@ -4931,11 +4931,11 @@ async def del_vban(
         'time': 0
     }
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post('https://manager-api.gametools.network/api/delautoban', headers=headers,
-                                         json=json_data)
-            response.raise_for_status()
-            response = response.json()
+        client = get_http_pool().get_client()
+        response = await client.post('https://manager-api.gametools.network/api/delautoban', headers=headers,
+                                     json=json_data)
+        response.raise_for_status()
+        response = response.json()
     except:
         await app.send_message(group, MessageChain(
             f"网络出错,请稍后再试!"
@@ -5063,11 +5063,11 @@ async def get_vban_list(app: Ariadne, group: Group, sender: Member, vban_rank: R
         ('groupid', group_id),
     )
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get('https://manager-api.gametools.network/api/autoban', headers=headers,
-                                        params=params)
-            response.raise_for_status()
-            response = response.json()
+        client = get_http_pool().get_client()
+        response = await client.get('https://manager-api.gametools.network/api/autoban', headers=headers,
+                                    params=params)
+        response.raise_for_status()
+        response = response.json()
     except:
         await app.send_message(group, MessageChain(
             "网络出错请稍后再试!"
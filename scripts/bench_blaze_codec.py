@@ -0,0 +1,73 @@
+"""Blaze TDF编解码基准
+
+用法(在项目根目录运行):
+    python scripts/bench_blaze_codec.py [--file 抓取的响应帧] [-n 次数]
+
+--file为抓取的getGameDataFromId响应帧(含16字节头部的原始字节),
+不指定时使用按实际响应结构生成的数据包(4个服务器、每个64名玩家)。
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.bf1.blaze.Blaze import Blaze  # noqa: E402
+from utils.bf1.data_handle import BlazeData  # noqa: E402
+
+
+def make_player(index: int) -> dict:
+    return {
+        "EXID 0": 10 ** 12 + index,
+        "JGTS 0": 1700000000000000 + index,
+        "LOC  0": 0x7a68434e,
+        "NAME 1": f"player_{index}_name",
+        "PATT 511": {"rank": str(index % 150), "latency": str(30 + index % 100), "squad": "1"},
+        "PID  0": 10 ** 12 + index * 7,
+        "ROLE 1": "soldier",
+        "SLOT 0": index,
+        "TIDX 0": index % 2,
+        "UGID 3": {"GID  0": 1, "NAME 1": "x"},
+        "PGRP 7": [1, 2, 3],
+    }
+
+
+def make_response() -> bytes:
+    server = {
+        "GID  0": 8622724970463,
+        "GNAM 1": "[BF1]benchmark server",
+        "ATTR 511": {f"key{i}": f"value{i}" for i in range(30)},
+        "CAP  40": [64, 0, 4, 0],
+        "ROST 43": [make_player(i) for i in range(64)],
+        "GSET 0": 1234,
+    }
+    packet = {"method": "GameManager.getGameDataFromId", "type": "Result", "id": 7, "data": {"GDAT 43": [server] * 4}}
+    return Blaze(packet).encode()
+
+
+def bench(func, number: int) -> float:
+    """:return: 单次耗时(毫秒)"""
+    func()
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+    return (time.perf_counter() - start) / number * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file", type=Path, help="抓取的响应帧")
+    parser.add_argument("-n", type=int, default=50, help="每项测试的次数")
+    args = parser.parse_args()
+    data = args.file.read_bytes() if args.file else make_response()
+    packet = Blaze(data).decode()
+    print(f"数据包: {packet['method']} {len(data)}字节")
+    print(f"decode(raw):      {bench(lambda: Blaze(data).decode(), args.n):.2f} ms")
+    print(f"decode(readable): {bench(lambda: Blaze(data).decode(True), args.n):.2f} ms")
+    print(f"decode(fields):   {bench(lambda: Blaze(data).decode(True, BlazeData.player_list_fields), args.n):.2f} ms")
+    print(f"encode:           {bench(lambda: Blaze(packet).encode(), args.n):.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
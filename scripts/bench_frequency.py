@@ -0,0 +1,50 @@
+"""频率限制基准
+
+用法(在项目根目录运行):
+    python scripts/bench_frequency.py [--backend memory|sqlite] [--users 用户数] [-n 次数]
+
+模拟FrequencyLimitation.require中每条指令的一次hit调用,
+用户在若干群、若干插件中随机发送指令,输出单次调用耗时及计数记录数量。
+"""
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.models.frequency_model import FrequencyController, SqliteFrequencyBackend  # noqa: E402
+
+
+async def bench(backend, users: int, number: int) -> float:
+    """:return: 单次hit耗时(微秒)"""
+    rng = random.Random(0)
+    modules = [f"modules.self_contained.module_{i}" for i in range(20)]
+    keys = [(rng.choice(modules), rng.randint(1, 500), rng.randint(1, users)) for _ in range(number)]
+    start = time.perf_counter()
+    for module_name, group_id, sender_id in keys:
+        await backend.hit(module_name, group_id, sender_id, 1)
+    return (time.perf_counter() - start) / number * 1000000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=["memory", "sqlite"], default="memory")
+    parser.add_argument("--users", type=int, default=10000, help="发送指令的用户数")
+    parser.add_argument("-n", type=int, default=200000, help="hit调用次数")
+    args = parser.parse_args()
+    if args.backend == "sqlite":
+        backend = SqliteFrequencyBackend(str(Path(tempfile.mkdtemp()) / "frequency.db"))
+    else:
+        backend = FrequencyController()
+    cost = asyncio.run(bench(backend, args.users, args.n))
+    print(f"{args.backend}: {args.n}次hit, 单次 {cost:.2f} us")
+    if isinstance(backend, FrequencyController):
+        print(f"记录数量: {backend.get_stats()}")
+
+
+if __name__ == "__main__":
+    main()
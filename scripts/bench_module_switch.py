@@ -0,0 +1,74 @@
+"""插件开关查询基准
+
+用法(在项目根目录运行,需要config/config.yaml):
+    python scripts/bench_module_switch.py [--modules 插件数] [--groups 群数] [-n 次数]
+
+构造modules×groups的插件数据,随机查询插件在群内的状态,输出单次耗时:
+    dict:   if_module_available/if_module_switch_on/if_module_notice_on三次字典查询(改动前Function.require的路径)
+    bitmap: get_module_state位图查询
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.models.saya_model import ModulesController, saya  # noqa: E402
+
+
+def build_controller(modules: int, groups: int) -> tuple[ModulesController, list[str], list[int]]:
+    rng = random.Random(0)
+    module_names = [f"modules.self_contained.bench_module_{i}" for i in range(modules)]
+    group_ids = [100000000 + i for i in range(groups)]
+    controller = ModulesController()
+    controller.groups = {str(group_id): {} for group_id in group_ids}
+    for module_name in module_names:
+        controller.modules[module_name] = {
+            str(group_id): {"switch": rng.random() < 0.8, "notice": rng.random() < 0.2} for group_id in group_ids
+        }
+        controller.modules[module_name]["available"] = rng.random() < 0.95
+        # get_module_state/if_module_available要求插件已安装
+        saya.channels.setdefault(module_name, None)
+    controller.rebuild_bits()
+    return controller, module_names, group_ids
+
+
+def bench(func, keys: list[tuple[str, int]]) -> float:
+    """:return: 单次耗时(微秒)"""
+    start = time.perf_counter()
+    for module_name, group_id in keys:
+        func(module_name, group_id)
+    return (time.perf_counter() - start) / len(keys) * 1000000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modules", type=int, default=60)
+    parser.add_argument("--groups", type=int, default=2000)
+    parser.add_argument("-n", type=int, default=200000, help="查询次数")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    controller, module_names, group_ids = build_controller(args.modules, args.groups)
+    print(f"{args.modules}个插件×{args.groups}个群, 构建位图 {(time.perf_counter() - start) * 1000:.1f} ms")
+    rng = random.Random(1)
+    keys = [(rng.choice(module_names), rng.choice(group_ids)) for _ in range(args.n)]
+
+    def dict_lookup(module_name: str, group_id: int):
+        # Function.require原先需要将群号转为字符串后依次查询
+        group = str(group_id)
+        return (
+            controller.if_module_available(module_name),
+            controller.if_module_switch_on(module_name, group),
+            controller.if_module_notice_on(module_name, group),
+        )
+
+    for module_name, group_id in keys[:1000]:
+        assert controller.get_module_state(module_name, group_id) == dict_lookup(module_name, group_id)
+    print(f"dict:   {bench(dict_lookup, keys):.3f} us")
+    print(f"bitmap: {bench(controller.get_module_state, keys):.3f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""AsyncORM批量写入基准
+
+用法(在项目根目录运行,需要config/config.yaml):
+    python scripts/bench_orm_batch.py [--rows 行数] [--chunk-size 分块大小]
+
+在临时SQLite文件上依次测试add_batch、update_batch、delete_batch的行/秒,
+per_row为每行构造一条语句后经execute_all执行(改动前的行为),executemany为当前的实现。
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import BIGINT, Column, DateTime, Integer, MetaData, Table, delete, insert, update  # noqa: E402
+
+from core.orm import AsyncORM  # noqa: E402
+
+metadata = MetaData()
+# 与Bf1ServerPlayerCount结构相同
+bench_player_count = Table(
+    "bench_player_count", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("serverId", BIGINT),
+    Column("time", DateTime),
+    Column("playerCurrent", Integer),
+    Column("playerMax", Integer),
+    Column("playerQueue", Integer),
+    Column("playerSpectator", Integer),
+)
+
+
+def make_rows(count: int) -> list[dict]:
+    now = datetime.now()
+    return [
+        {
+            "id": index + 1, "serverId": 10000000 + index, "time": now,
+            "playerCurrent": 64, "playerMax": 64, "playerQueue": 5, "playerSpectator": 0
+        }
+        for index in range(count)
+    ]
+
+
+async def bench(orm: AsyncORM, rows: list[dict], chunk_size: int, per_row: bool) -> dict[str, float]:
+    """:return: {方法名: 行/秒}"""
+    table = bench_player_count
+    results = {}
+    conditions_list = [[table.c.id == row["id"]] for row in rows]
+    data_list = [{"playerCurrent": 32, "playerQueue": 0} for _ in rows]
+
+    start = time.perf_counter()
+    if per_row:
+        await orm.execute_all([insert(table).values(**row) for row in rows])
+    else:
+        await orm.add_batch(table, rows, chunk_size)
+    results["add_batch"] = len(rows) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    if per_row:
+        await orm.execute_all([
+            update(table).where(*condition).values(**data) for data, condition in zip(data_list, conditions_list)
+        ])
+    else:
+        await orm.update_batch(table, data_list, conditions_list, chunk_size)
+    results["update_batch"] = len(rows) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    if per_row:
+        await orm.execute_all([delete(table).where(*condition) for condition in conditions_list])
+    else:
+        await orm.delete_batch(table, conditions_list, chunk_size)
+    results["delete_batch"] = len(rows) / (time.perf_counter() - start)
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000, help="每项测试的行数")
+    parser.add_argument("--chunk-size", type=int, default=500, help="executemany的分块大小")
+    args = parser.parse_args()
+    db_path = Path(tempfile.mkdtemp()) / "bench.db"
+    orm = AsyncORM(f"sqlite+aiosqlite:///{db_path}", chunk_size=args.chunk_size)
+    async with orm.engine.begin() as conn:
+        await conn.run_sync(metadata.create_all)
+    rows = make_rows(args.rows)
+    print(f"数据库: {db_path}, {args.rows}行, 分块{args.chunk_size}")
+    for name, per_row in (("per_row", True), ("executemany", False)):
+        results = await bench(orm, rows, args.chunk_size, per_row)
+        print(f"{name:>12}: " + ", ".join(f"{method} {rate:.0f}行/s" for method, rate in results.items()))
+    await orm.read_engine.dispose()
+    await orm.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
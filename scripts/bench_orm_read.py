@@ -0,0 +1,97 @@
+"""AsyncORM读路径基准
+
+用法(在项目根目录运行,需要config/config.yaml):
+    python scripts/bench_orm_read.py [--messages 消息数] [--concurrency 1 8 32 64]
+
+在临时SQLite文件上模拟N个并发的消息处理器,每条消息执行--reads次按主键查询(权限、群设置等),
+每--write-every条消息执行一次写入,分别输出以下两种读路径的消息/秒:
+    serialized: 读语句经过AsyncORM.execute,与写入共用db_mutex(改动前的行为)
+    pooled:     读语句经过AsyncORM.fetch_all,使用只读连接池且不获取db_mutex
+"""
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import Column, Integer, MetaData, Table, insert, select  # noqa: E402
+
+from core.orm import AsyncORM  # noqa: E402
+
+metadata = MetaData()
+bench_perm = Table(
+    "bench_perm", metadata,
+    Column("group_id", Integer, primary_key=True),
+    Column("qq", Integer, primary_key=True),
+    Column("perm", Integer, nullable=False),
+)
+
+
+async def prepare(orm: AsyncORM, groups: int, members: int):
+    async with orm.engine.begin() as conn:
+        await conn.run_sync(metadata.create_all)
+    await orm.add_batch(bench_perm, [
+        {"group_id": group_id, "qq": qq, "perm": 16} for group_id in range(groups) for qq in range(members)
+    ])
+
+
+async def run(orm: AsyncORM, mode: str, concurrency: int, messages: int, reads: int, write_every: int,
+              groups: int, members: int) -> float:
+    """:return: 每秒处理的消息数"""
+    rng = random.Random(concurrency)
+    remaining = messages
+
+    async def read(group_id: int, qq: int):
+        stmt = select(bench_perm.c.perm).where(bench_perm.c.group_id == group_id, bench_perm.c.qq == qq)
+        if mode == "serialized":
+            return (await orm.execute(stmt)).fetchall()
+        return await orm.fetch_all(stmt)
+
+    async def handler():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            group_id, qq = rng.randrange(groups), rng.randrange(members)
+            for _ in range(reads):
+                await read(group_id, qq)
+            if remaining % write_every == 0:
+                await orm.execute(insert(bench_perm).prefix_with("OR REPLACE").values(
+                    group_id=group_id, qq=qq, perm=rng.choice([16, 32])
+                ))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(handler() for _ in range(concurrency)))
+    return messages / (time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=2000, help="每项测试处理的消息数")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64], help="并发处理器数量")
+    parser.add_argument("--reads", type=int, default=3, help="每条消息的查询次数")
+    parser.add_argument("--write-every", type=int, default=10, help="每多少条消息写入一次")
+    parser.add_argument("--groups", type=int, default=200)
+    parser.add_argument("--members", type=int, default=50)
+    args = parser.parse_args()
+    db_path = Path(tempfile.mkdtemp()) / "bench.db"
+    orm = AsyncORM(f"sqlite+aiosqlite:///{db_path}")
+    await prepare(orm, args.groups, args.members)
+    print(f"数据库: {db_path}, 每条消息{args.reads}次查询, 每{args.write_every}条消息写入一次")
+    for concurrency in args.concurrency:
+        results = []
+        for mode in ("serialized", "pooled"):
+            rate = await run(
+                orm, mode, concurrency, args.messages, args.reads, args.write_every, args.groups, args.members
+            )
+            results.append(f"{mode} {rate:.0f}条/s")
+        print(f"并发{concurrency:>3}: " + ", ".join(results))
+    await orm.read_engine.dispose()
+    await orm.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+"""OneMockUI渲染基准
+
+用法(在项目根目录运行,需要已安装playwright的chromium):
+    python scripts/bench_render.py [-n 渲染次数] [--concurrency 并发数]
+
+以OneMockUI模板渲染一张两列的菜单图片,分别输出以下两种方式的渲染/秒及p50/p95耗时:
+    new_page: 每次读取并编译模板,新建页面、加载CSS后截图再关闭页面(改动前HTMLRenderer的行为)
+    pool:     使用缓存的模板,从RenderPagePool取出预热过的页面渲染
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from jinja2 import Template  # noqa: E402
+from playwright.async_api import Browser, async_playwright  # noqa: E402
+
+from utils.render_pool import RENDER_CSS, RenderPagePool  # noqa: E402
+from utils.UI.models import (  # noqa: E402
+    Column, ColumnList, ColumnListItem, ColumnListItemSwitch, ColumnTitle, ColumnUserInfo, GenForm
+)
+
+TEMPLATE_PATH = Path(__file__).resolve().parent.parent / "utils" / "UI" / "OneMockUI" / "template.html"
+SCREENSHOT_OPTION = {"full_page": True, "type": "jpeg", "quality": 80, "scale": "device"}
+
+
+def make_form() -> GenForm:
+    return GenForm(columns=[
+        Column(elements=[
+            ColumnTitle(title=f"column{column}"),
+            ColumnList(rows=[
+                ColumnListItem(
+                    subtitle=f"子标题{row}", content=f"内容{row}",
+                    right_element=ColumnListItemSwitch(switch=row % 2 == 0)
+                )
+                for row in range(10)
+            ]),
+            ColumnUserInfo(name="你好", description="我是纱雾", avatar=""),
+        ])
+        for column in range(2)
+    ])
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+async def run(render, number: int, concurrency: int) -> tuple[float, list[float]]:
+    """:return: (渲染/秒, 每次渲染的耗时)"""
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await render()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(number)))
+    return number / (time.perf_counter() - start), latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=50, help="每项测试的渲染次数")
+    parser.add_argument("--concurrency", type=int, default=4, help="同时渲染的数量")
+    args = parser.parse_args()
+    form = make_form()
+    page_option = {"viewport": {"width": form.calc_body_width(), "height": 10}}
+    head = (
+        '<html><head><meta name="viewport" content="width=device-width,initial-scale=1.0">'
+        f"<style>{RENDER_CSS}</style></head><body>"
+    )
+    async with async_playwright() as playwright:
+        browser: Browser = await playwright.chromium.launch()
+
+        async def render_new_page():
+            html = Template(TEMPLATE_PATH.read_text(encoding="utf-8")).render(form.dict())
+            page = await browser.new_page(**page_option)
+            try:
+                await page.set_content(f"{head}{html}</body></html>")
+                return await page.screenshot(**SCREENSHOT_OPTION)
+            finally:
+                await page.close()
+
+        pool = RenderPagePool(max_pages=args.concurrency)
+        pool.browser = browser
+        template = Template(TEMPLATE_PATH.read_text(encoding="utf-8"))
+        # 与服务启动时一样预热页面
+        for page in await asyncio.gather(*(pool.new_page(page_option) for _ in range(pool.warm_up))):
+            await pool.release(pool.get_key(page_option), page)
+
+        async def render_pool():
+            return await pool.render(template.render(form.dict()), page_option, SCREENSHOT_OPTION)
+
+        print(f"{args.n}次渲染, 并发{args.concurrency}")
+        for name, render in (("new_page", render_new_page), ("pool", render_pool)):
+            await render()
+            rate, latencies = await run(render, args.n, args.concurrency)
+            print(
+                f"{name:>8}: {rate:.1f}张/s, p50 {percentile(latencies, 0.5) * 1000:.0f}ms, "
+                f"p95 {percentile(latencies, 0.95) * 1000:.0f}ms"
+            )
+        print(f"页面池: {pool.get_stats()}")
+        await pool.close_all()
+        await browser.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,26 @@
+import importlib
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def config_path(tmp_path_factory):
+    """包含最小config/config.yaml的目录,core.orm等模块导入时从工作目录读取配置"""
+    path = tmp_path_factory.mktemp("umaru")
+    (path / "config").mkdir()
+    (path / "config" / "config.yaml").write_text(
+        "Master: 1\nbot_accounts: [1]\ndefault_account: 1\ntest_group: 1\nproxy: proxy\nGroupMsg_log: false\n",
+        encoding="utf-8"
+    )
+    return path
+
+
+@pytest.fixture(scope="session")
+def import_with_config(config_path):
+    """在config_path下导入依赖配置的模块"""
+    def import_module(name: str):
+        with pytest.MonkeyPatch.context() as monkeypatch:
+            monkeypatch.chdir(config_path)
+            return importlib.import_module(name)
+
+    return import_module
@@ -0,0 +1,144 @@
+import asyncio
+
+import pytest
+
+from utils.bf1.blaze.BlazeClient import GameDataBatcher
+
+
+class FakeSocket:
+    """按GLST生成GDAT,包含bad_ids中的game_id时返回Error"""
+
+    def __init__(self, bad_ids: set[int] = frozenset(), timeout: bool = False):
+        self.bad_ids = set(bad_ids)
+        self.timeout = timeout
+        self.requests: list[list[int]] = []
+        self.drained = False
+
+    async def send(self, packet: dict, timeout: float, readable: bool = True, fields=None) -> dict:
+        game_ids = packet["data"]["GLST 40"]
+        self.requests.append(list(game_ids))
+        await asyncio.sleep(0)
+        if self.timeout:
+            raise TimeoutError
+        if self.bad_ids & set(game_ids):
+            return {"method": packet["method"], "type": "Error", "id": len(self.requests), "data": {"ERR": 1}}
+        return {
+            "method": packet["method"], "type": "Result", "id": len(self.requests),
+            "data": {"GDAT": [{"GID": game_id, "GNAM": f"server{game_id}"} for game_id in game_ids]}
+        }
+
+    async def drain(self):
+        self.drained = True
+
+
+def make_batcher(fake_socket: FakeSocket | None, **kwargs) -> GameDataBatcher:
+    async def get_socket():
+        return fake_socket
+
+    return GameDataBatcher(get_socket, **kwargs)
+
+
+def gids(result: dict) -> list[int]:
+    return [server["GID"] for server in result["data"]["GDAT"]]
+
+
+def test_merge_and_dedup():
+    async def main():
+        fake_socket = FakeSocket()
+        batcher = make_batcher(fake_socket)
+        results = await asyncio.gather(batcher.query([1, 2]), batcher.query([2, 3]), batcher.query([3, 3]))
+        assert [gids(result) for result in results] == [[1, 2], [2, 3], [3]]
+        assert all(result["type"] == "Result" for result in results)
+        # 三个调用合并为一个请求,重复的game_id只请求一次
+        assert len(fake_socket.requests) == 1
+        assert sorted(fake_socket.requests[0]) == [1, 2, 3]
+        assert batcher.get_stats() == {"queries": 3, "requests": 1, "pending": 0}
+
+    asyncio.run(main())
+
+
+def test_split_into_chunks():
+    async def main():
+        fake_socket = FakeSocket()
+        batcher = make_batcher(fake_socket, max_batch=16)
+        results = await asyncio.gather(*(batcher.query([i]) for i in range(40)))
+        assert [gids(result) for result in results] == [[i] for i in range(40)]
+        assert all(len(request) <= 16 for request in fake_socket.requests)
+        assert sorted(i for request in fake_socket.requests for i in request) == list(range(40))
+
+    asyncio.run(main())
+
+
+def test_error_chunk_retry():
+    async def main():
+        fake_socket = FakeSocket(bad_ids={2})
+        batcher = make_batcher(fake_socket)
+        good, bad, other = await asyncio.gather(batcher.query([1]), batcher.query([2]), batcher.query([3, 1]))
+        # 合并请求出错后,不含出错game_id的调用方单独重试成功
+        assert gids(good) == [1]
+        assert gids(other) == [3, 1]
+        assert bad["type"] == "Error"
+        assert sorted(map(sorted, fake_socket.requests)) == [[1], [1, 2, 3], [1, 3], [2]]
+
+    asyncio.run(main())
+
+
+def test_error_chunk_only_caller():
+    async def main():
+        fake_socket = FakeSocket(bad_ids={5})
+        batcher = make_batcher(fake_socket, max_batch=2)
+        # 出错的请求中只有该调用方的game_id时不重试
+        ok, bad = await asyncio.gather(batcher.query([1, 2]), batcher.query([5]))
+        assert gids(ok) == [1, 2]
+        assert bad["type"] == "Error"
+        assert len(fake_socket.requests) == 2
+
+    asyncio.run(main())
+
+
+def test_timeout():
+    async def main():
+        fake_socket = FakeSocket(timeout=True)
+        batcher = make_batcher(fake_socket)
+        results = await asyncio.gather(batcher.query([1]), batcher.query([2]), return_exceptions=True)
+        assert all(isinstance(result, TimeoutError) for result in results)
+        await asyncio.sleep(0)
+        assert fake_socket.drained
+
+    asyncio.run(main())
+
+
+def test_no_socket():
+    async def main():
+        batcher = make_batcher(None)
+        with pytest.raises(ConnectionError):
+            await batcher.query([1])
+
+    asyncio.run(main())
+
+
+def test_cancelled_caller():
+    async def main():
+        fake_socket = FakeSocket()
+        batcher = make_batcher(fake_socket)
+        cancelled = asyncio.create_task(batcher.query([1]))
+        other = asyncio.create_task(batcher.query([1, 2]))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        assert gids(await other) == [1, 2]
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+
+    asyncio.run(main())
+
+
+def test_empty_query():
+    async def main():
+        fake_socket = FakeSocket()
+        batcher = make_batcher(fake_socket)
+        result = await batcher.query([])
+        assert result["type"] == "Result"
+        assert result["data"] == {"GDAT": []}
+        assert fake_socket.requests == []
+
+    asyncio.run(main())
@@ -0,0 +1,127 @@
+import copy
+import random
+
+import pytest
+
+from utils.bf1.blaze.Blaze import Blaze
+
+# getGameDataFromId形状的数据包,GOLDEN_BYTES由重写前的编码器生成
+PACKET = {
+    "method": "GameManager.getGameDataFromId",
+    "type": "Command",
+    "id": 7,
+    "data": {
+        "DNAM 1": "csFullGameList",
+        "GLST 40": [8622724970463, 1],
+        "GDAT 43": [{
+            "GID  0": 8622724970463,
+            "GNAM 1": "[BF1]测试服务器",
+            "ATTR 511": {"operationindex": "3", "progress": "50"},
+            "CAP  40": [64, 0, 4, 0],
+            "ROST 43": [
+                {"NAME 1": "player_1", "PID  0": 1004755893484, "PATT 511": {"rank": "28"}, "TIDX 0": 65535},
+                {"NAME 1": "", "PID  0": 0, "PATT 511": {}, "TIDX 0": 1},
+            ],
+            "IDS  7": [1, 2, 3],
+            "UGID 3": {"GID  0": 1, "NAME 1": "x"},
+        }],
+    },
+}
+GOLDEN_BYTES = bytes.fromhex(
+    "000000e800000004006900000700000092e86d010f637346756c6c47616d654c697374009eccf40400029fdfaba7f4f5"
+    "03019e48740403019e9900009fdfaba7f4f5039ee86d01155b4246315de6b58be8af95e69c8de58aa1e599a800874d32"
+    "050101020f6f7065726174696f6e696e646578000233000970726f677265737300033530008e1c000400048001000400"
+    "cafcf4040302ba1b650109706c617965725f3100c2990000acf3f181be3ac21d34050101010572616e6b0003323800d2"
+    "993800bfff0700ba1b650100c299000000c21d3405010100d29938000100a64cc00703010203d67a64039e99000001ba"
+    "1b65010278000000"
+)
+READABLE_DATA = {
+    "DNAM": "csFullGameList",
+    "GLST": [8622724970463, 1],
+    "GDAT": [{
+        "GID": 8622724970463,
+        "GNAM": "[BF1]测试服务器",
+        "ATTR": {"operationindex": "3", "progress": "50"},
+        "CAP": [64, 0, 4, 0],
+        "ROST": [
+            {"NAME": "player_1", "PID": 1004755893484, "PATT": {"rank": "28"}, "TIDX": 65535},
+            {"NAME": "", "PID": 0, "PATT": {}, "TIDX": 1},
+        ],
+        "IDS": [1, 2, 3],
+        "UGID": {"GID": 1, "NAME": "x"},
+    }],
+}
+
+
+def integer_packet(value: int) -> dict:
+    return {"method": "GameManager.getGameDataFromId", "type": "Command", "id": 1, "data": {"VAL  0": value}}
+
+
+def test_encode_golden():
+    assert Blaze(copy.deepcopy(PACKET)).encode() == GOLDEN_BYTES
+
+
+def test_decode_golden():
+    packet = Blaze(GOLDEN_BYTES).decode()
+    assert packet["method"] == PACKET["method"]
+    assert packet["type"] == "Command"
+    assert packet["id"] == 7
+    assert packet["length"] == len(GOLDEN_BYTES) - 16
+    assert packet["data"] == PACKET["data"]
+
+
+def test_decode_readable():
+    assert Blaze(GOLDEN_BYTES).decode(True)["data"] == READABLE_DATA
+
+
+def test_decode_fields():
+    data = Blaze(GOLDEN_BYTES).decode(True, {"GDAT", "GID", "ROST", "NAME"})["data"]
+    assert data == {
+        "GDAT": [{"GID": 8622724970463, "ROST": [{"NAME": "player_1"}, {"NAME": ""}]}]
+    }
+
+
+@pytest.mark.parametrize("value", [-1, -63, -64, -65, -100000, -(2 ** 40)])
+def test_negative_integer(value):
+    # 旧的解码器把符号位算进了数值,-1会被解析为-65
+    encoded = Blaze(integer_packet(value)).encode()
+    assert Blaze(encoded).decode(True)["data"] == {"VAL": value}
+
+
+@pytest.mark.parametrize("value", [0, 63, 64, 8191, 8192, 2 ** 53 + 1, 2 ** 63 - 1])
+def test_large_integer_exact(value):
+    # 超过2**53的整数不能经过浮点数运算
+    encoded = Blaze(integer_packet(value)).encode()
+    assert Blaze(encoded).decode(True)["data"] == {"VAL": value}
+
+
+def test_negative_integer_bytes():
+    assert Blaze(integer_packet(-1)).encode()[16:] == bytes.fromhex("da1b000041")
+    assert Blaze(integer_packet(-64)).encode()[16:] == bytes.fromhex("da1b0000c001")
+
+
+def random_struct(rng: random.Random, depth: int = 0) -> dict:
+    tags = ["GID ", "GNAM", "ROST", "PID ", "NAME", "PATT", "ATTR", "TIDX", "LOC ", "JGTS"]
+    struct = {}
+    for _ in range(rng.randint(0, 5)):
+        tag = rng.choice(tags)
+        kind = rng.choice("0134" if depth < 2 else "01")
+        if kind == "0":
+            struct[f"{tag} 0"] = rng.choice([0, 1, 63, 64, 10 ** 12 + rng.randint(0, 10 ** 6), -rng.randint(1, 10 ** 6)])
+        elif kind == "1":
+            struct[f"{tag} 1"] = rng.choice(["", "a", "测试", "x" * 300])
+        elif kind == "3":
+            struct[f"{tag} 3"] = random_struct(rng, depth + 1)
+        else:
+            struct[f"{tag} 43"] = [random_struct(rng, depth + 1) for _ in range(rng.randint(1, 3))]
+    return struct
+
+
+def test_round_trip_random():
+    rng = random.Random(0)
+    for _ in range(500):
+        packet = {"method": "GameManager.getGameDataFromId", "type": "Command", "id": rng.randint(0, 65535),
+                  "data": random_struct(rng)}
+        decoded = Blaze(Blaze(copy.deepcopy(packet)).encode()).decode()
+        assert decoded["id"] == packet["id"]
+        assert decoded["data"] == packet["data"]
@@ -0,0 +1,74 @@
+import random
+
+import pytest
+
+from utils.bf1.blaze.Blaze import Blaze
+from utils.bf1.blaze.BlazeSocket import BlazeFrameDecoder
+
+
+def make_frames() -> list[bytes]:
+    frames = [
+        Blaze({
+            "method": "GameManager.getGameDataFromId", "type": "Command", "id": i,
+            "data": {"DNAM 1": "csFullGameList", "GLST 40": [i * 1000 + j for j in range(i % 7)]}
+        }).encode()
+        for i in range(1, 200)
+    ]
+    # 超过compact_size的大帧
+    frames.append(Blaze({
+        "method": "GameManager.getGameDataFromId", "type": "Command", "id": 5, "data": {"DNAM 1": "x" * 100000}
+    }).encode())
+    return frames
+
+
+FRAMES = make_frames()
+STREAM = b"".join(FRAMES)
+
+
+@pytest.mark.parametrize("compact_size", [10, 1000, 64 * 1024])
+def test_random_split(compact_size):
+    rng = random.Random(compact_size)
+    for _ in range(50):
+        decoder = BlazeFrameDecoder(compact_size=compact_size)
+        frames = []
+        index = 0
+        while index < len(STREAM):
+            size = rng.randint(1, 5000)
+            frames += decoder.feed(STREAM[index:index + size])
+            index += size
+        assert frames == FRAMES
+        assert len(decoder) == 0
+
+
+def test_byte_by_byte():
+    decoder = BlazeFrameDecoder(compact_size=100)
+    frames = []
+    for index in range(len(FRAMES[0]) + len(FRAMES[1])):
+        frames += decoder.feed(STREAM[index:index + 1])
+    assert frames == FRAMES[:2]
+    assert len(decoder) == 0
+
+
+def test_incomplete_tail():
+    decoder = BlazeFrameDecoder()
+    tail = FRAMES[1][:10]
+    assert decoder.feed(FRAMES[0] + tail) == [FRAMES[0]]
+    assert len(decoder) == len(tail)
+    assert decoder.feed(FRAMES[1][10:]) == [FRAMES[1]]
+    assert len(decoder) == 0
+
+
+def test_decoded_frame():
+    decoder = BlazeFrameDecoder()
+    frame = decoder.feed(STREAM[:len(FRAMES[0]) + len(FRAMES[1]) + len(FRAMES[2])])[2]
+    assert Blaze(frame).decode(True)["data"] == {"DNAM": "csFullGameList", "GLST": [3000, 3001, 3002]}
+
+
+def test_oversize_frame():
+    decoder = BlazeFrameDecoder(max_frame_size=1024)
+    decoder.feed(FRAMES[0][:8])
+    with pytest.raises(ValueError):
+        decoder.feed(FRAMES[0][8:] + FRAMES[-1])
+    # 数据错位后缓冲区被清空,之后的数据可以正常分帧
+    assert len(decoder) == 0
+    assert decoder.feed(FRAMES[1]) == [FRAMES[1]]
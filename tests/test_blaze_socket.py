@@ -0,0 +1,109 @@
+import asyncio
+import random
+
+from utils.bf1.blaze.Blaze import Blaze
+from utils.bf1.blaze.BlazeSocket import BlazeSocket
+
+
+class FakeWriter:
+    """按请求生成响应,响应由FakeServer乱序、分块写回"""
+
+    def __init__(self):
+        self.responses = []
+
+    def write(self, data: bytes):
+        request = Blaze(data).decode()
+        value = request["data"]["GLST 40"][0]
+        self.responses.append(Blaze({
+            "method": request["method"], "type": "Result", "id": request["id"],
+            "data": {"GIDX 0": value, "NAMX 1": f"name{value}", "SKIP 1": "skip"}
+        }).encode())
+
+    def is_closing(self):
+        return False
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+    async def drain(self):
+        pass
+
+
+async def pump(reader: asyncio.StreamReader, writer: FakeWriter, rng: random.Random):
+    while True:
+        await asyncio.sleep(0)
+        if not writer.responses:
+            continue
+        rng.shuffle(writer.responses)
+        data = b"".join(writer.responses)
+        writer.responses.clear()
+        while data:
+            size = rng.randint(1, 200)
+            reader.feed_data(data[:size])
+            data = data[size:]
+            await asyncio.sleep(0)
+
+
+async def query(blaze_socket: BlazeSocket, value: int, mode: str):
+    packet = {"method": "GameManager.getGameDataFromId", "type": "Command", "data": {"GLST 40": [value]}}
+    if mode == "raw":
+        result = await blaze_socket.send(packet, 5, readable=False)
+        assert result["data"] == {"GIDX 0": value, "NAMX 1": f"name{value}", "SKIP 1": "skip"}
+    elif mode == "readable":
+        result = await blaze_socket.send(packet, 5, readable=True)
+        assert result["data"] == {"GIDX": value, "NAMX": f"name{value}", "SKIP": "skip"}
+    else:
+        result = await blaze_socket.send(packet, 5, readable=True, fields={"GIDX", "NAMX"})
+        assert result["data"] == {"GIDX": value, "NAMX": f"name{value}"}
+
+
+async def run_stress(start_id: int, rounds: int, count: int):
+    rng = random.Random(start_id)
+    blaze_socket = BlazeSocket("localhost", 0)
+    blaze_socket.reader = asyncio.StreamReader()
+    blaze_socket.writer = FakeWriter()
+    blaze_socket.connect = True
+    blaze_socket.id = start_id
+    receiver = asyncio.create_task(blaze_socket.receive_data())
+    server = asyncio.create_task(pump(blaze_socket.reader, blaze_socket.writer, rng))
+    try:
+        for round_ in range(rounds):
+            await asyncio.gather(*(
+                query(blaze_socket, round_ * count + i, rng.choice(["raw", "readable", "fields"]))
+                for i in range(count)
+            ))
+        assert blaze_socket.pending == 0
+    finally:
+        server.cancel()
+        blaze_socket.reader.feed_eof()
+        await receiver
+
+
+def test_concurrent_mixed_requests():
+    asyncio.run(run_stress(1, 3, 500))
+
+
+def test_id_wraparound():
+    # 请求id只有2字节,超过65535后从1开始
+    asyncio.run(run_stress(65400, 2, 300))
+
+
+def test_connection_lost():
+    async def main():
+        blaze_socket = BlazeSocket("localhost", 0)
+        blaze_socket.reader = asyncio.StreamReader()
+        blaze_socket.writer = FakeWriter()
+        blaze_socket.connect = True
+        receiver = asyncio.create_task(blaze_socket.receive_data())
+        tasks = [asyncio.create_task(query(blaze_socket, i, "readable")) for i in range(10)]
+        await asyncio.sleep(0)
+        blaze_socket.reader.feed_eof()
+        await receiver
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert all(isinstance(result, ConnectionError) for result in results)
+        assert blaze_socket.pending == 0
+
+    asyncio.run(main())
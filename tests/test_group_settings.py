@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+
+class FakeORM:
+    """按查询的列数返回GroupPerm或GroupSetting的数据,fetch_all在返回前等待gate"""
+
+    def __init__(self, perm_rows: list, setting_rows: list):
+        self.perm_rows = perm_rows
+        self.setting_rows = setting_rows
+        self.gate: asyncio.Event | None = None
+        self.started: asyncio.Event | None = None
+
+    async def fetch_all(self, sql):
+        if self.started:
+            self.started.set()
+        if self.gate:
+            await self.gate.wait()
+        return self.perm_rows if len(sql.selected_columns) == 3 else self.setting_rows
+
+    async def fetch_one(self, sql):
+        group_id = sql.whereclause.right.value
+        if len(sql.selected_columns) == 2:
+            return next(((perm, active) for gid, perm, active in self.perm_rows if gid == group_id), None)
+        return next((tuple(row[1:]) for row in self.setting_rows if row[0] == group_id), None)
+
+
+@pytest.fixture
+def group_model(import_with_config, monkeypatch):
+    module = import_with_config("core.models.group_model")
+    fake_orm = FakeORM(
+        [(1, 32, True), (2, 32, True)],
+        [(1, True, "random", "default"), (2, False, "random", "default")],
+    )
+    monkeypatch.setattr(module, "orm", fake_orm)
+    return module, fake_orm
+
+
+def test_load(group_model):
+    module, _ = group_model
+    controller = module.GroupSettingsController()
+    asyncio.run(controller.load())
+    assert controller.settings_dict[1].frequency_limitation is True
+    assert controller.settings_dict[2].frequency_limitation is False
+
+
+def test_invalidate_during_load(group_model):
+    module, fake_orm = group_model
+    controller = module.GroupSettingsController()
+
+    async def main():
+        fake_orm.gate, fake_orm.started = asyncio.Event(), asyncio.Event()
+        load_task = asyncio.create_task(controller.load())
+        await fake_orm.started.wait()
+        # 加载期间群1的设置被修改并失效
+        fake_orm.setting_rows = [(1, False, "random", "default"), (2, False, "random", "default")]
+        controller.invalidate(1)
+        fake_orm.gate.set()
+        await load_task
+        assert 1 not in controller.settings_dict
+        assert controller.settings_dict[2].frequency_limitation is False
+        assert (await controller.get(1)).frequency_limitation is False
+
+    asyncio.run(main())
+
+
+def test_invalidate_all_during_load(group_model):
+    module, fake_orm = group_model
+    controller = module.GroupSettingsController()
+
+    async def main():
+        fake_orm.gate, fake_orm.started = asyncio.Event(), asyncio.Event()
+        load_task = asyncio.create_task(controller.load())
+        await fake_orm.started.wait()
+        controller.invalidate()
+        fake_orm.gate.set()
+        await load_task
+        assert controller.settings_dict == {}
+
+    asyncio.run(main())
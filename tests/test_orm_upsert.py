@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, UniqueConstraint, select
+
+metadata = MetaData()
+score_table = Table(
+    "score", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", String(32), nullable=False),
+    Column("group_id", Integer, nullable=False),
+    Column("qq", Integer, nullable=False),
+    Column("score", Integer, nullable=False, default=0),
+    Column("note", String(32)),
+    UniqueConstraint("group_id", "qq"),
+)
+# 没有唯一约束,重复插入只能由先查询再写入的原子性避免
+log_table = Table(
+    "log", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("qq", Integer, nullable=False),
+    Column("perm", Integer, nullable=False),
+)
+
+
+@pytest.fixture(scope="module")
+def orm(import_with_config, tmp_path_factory):
+    orm_module = import_with_config("core.orm")
+    path = tmp_path_factory.mktemp("orm")
+    orm = orm_module.AsyncORM(f"sqlite+aiosqlite:///{path / 'test.db'}")
+
+    async def create_all():
+        async with orm.engine.begin() as conn:
+            await conn.run_sync(metadata.create_all)
+
+    asyncio.run(create_all())
+    yield orm
+    asyncio.run(orm.engine.dispose())
+
+
+def run(orm, coro):
+    # db_mutex在第一次等待时绑定事件循环
+    orm.db_mutex = asyncio.Lock()
+
+    async def main():
+        try:
+            return await coro
+        finally:
+            # 每次asyncio.run使用新的事件循环,连接不能跨循环复用
+            await orm.engine.dispose()
+            await orm.read_engine.dispose()
+
+    return asyncio.run(main())
+
+
+def get_row(orm, row_id: int):
+    return run(orm, orm.fetch_one(select(score_table).where(score_table.c.id == row_id)))
+
+
+def test_conflict_columns(orm):
+    full = {"id": 1, "name": "a", "group_id": 1, "qq": 1}
+    assert orm.get_conflict_columns(score_table, full, [score_table.c.id == 1]) == ["id"]
+    # 缺少没有默认值的非空列时不能使用upsert
+    assert orm.get_conflict_columns(score_table, {"id": 1, "score": 5}, [score_table.c.id == 1]) is None
+    # 自增主键、有默认值的列和可空列可以缺省
+    assert orm.get_conflict_columns(
+        score_table, {"name": "a", "group_id": 1, "qq": 1},
+        [score_table.c.group_id == 1, score_table.c.qq == 1]
+    ) == ["group_id", "qq"]
+
+
+def test_partial_column_update(orm):
+    run(orm, orm.add(score_table, {"id": 10, "name": "a", "group_id": 10, "qq": 10, "score": 1}))
+    run(orm, orm.insert_or_update(score_table, {"id": 10, "score": 5}, [score_table.c.id == 10]))
+    row = get_row(orm, 10)
+    assert (row.name, row.score) == ("a", 5)
+
+
+def test_partial_column_update_batch(orm):
+    run(orm, orm.add_batch(score_table, [
+        {"id": 20, "name": "a", "group_id": 20, "qq": 20},
+        {"id": 21, "name": "b", "group_id": 21, "qq": 21},
+    ]))
+    run(orm, orm.insert_or_update_batch(
+        score_table,
+        [{"id": 20, "score": 7}, {"id": 21, "name": "c", "group_id": 21, "qq": 21, "score": 8}],
+        [[score_table.c.id == 20], [score_table.c.id == 21]]
+    ))
+    assert (get_row(orm, 20).name, get_row(orm, 20).score) == ("a", 7)
+    assert (get_row(orm, 21).name, get_row(orm, 21).score) == ("c", 8)
+
+
+def test_upsert_insert(orm):
+    data = {"id": 30, "name": "a", "group_id": 30, "qq": 30, "score": 3}
+    run(orm, orm.insert_or_update(score_table, data, [score_table.c.id == 30]))
+    run(orm, orm.insert_or_update(score_table, {**data, "score": 4}, [score_table.c.id == 30]))
+    assert get_row(orm, 30).score == 4
+
+
+def test_concurrent_insert_or_ignore(orm):
+    async def main():
+        await asyncio.gather(*(
+            orm.insert_or_ignore(log_table, {"qq": 1, "perm": perm}, [log_table.c.qq == 1]) for perm in range(20)
+        ))
+        return await orm.fetch_all(select(log_table).where(log_table.c.qq == 1))
+
+    assert len(run(orm, main())) == 1
+
+
+def test_concurrent_insert_or_update(orm):
+    async def main():
+        await asyncio.gather(*(
+            orm.insert_or_update(log_table, {"qq": 2, "perm": perm}, [log_table.c.qq == 2]) for perm in range(20)
+        ))
+        return await orm.fetch_all(select(log_table).where(log_table.c.qq == 2))
+
+    assert len(run(orm, main())) == 1
@@ -3,11 +3,12 @@ from pathlib import Path
 from utils.UI.models import *
 from utils.text2img import template2img
 
+TEMPLATE_PATH = Path(__file__).parent / "template.html"
+
 
 async def gen(form: GenForm) -> bytes:
-    template = Path(__file__).parent / "template.html"
     width = form.calc_body_width()
-    return await template2img(template, form.dict(), page_option={"viewport": {"width": width, "height": 10}})
+    return await template2img(TEMPLATE_PATH, form.dict(), page_option={"viewport": {"width": width, "height": 10}})
 
 
 # example
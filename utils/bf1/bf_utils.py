@@ -6,13 +6,10 @@ import time
 from functools import wraps
 from typing import Union
 
-import aiohttp
-import httpx
 import tiktoken
 import urllib3
 from bs4 import BeautifulSoup
 from creart import create
-from curl_cffi.requests import AsyncSession
 from graia.ariadne import Ariadne
 from graia.ariadne.message import Source
 from graia.ariadne.message.chain import MessageChain
@@ -23,13 +20,14 @@ from revChatGPT.V3 import Chatbot
 
 from core.config import GlobalConfig
 from core.control import Permission
-from utils.bf1.blaze.BlazeClient import BlazeClientManagerInstance
+from utils.bf1.blaze.BlazeClient import BlazeClientManagerInstance, GameDataBatcher
 from utils.bf1.blaze.BlazeSocket import BlazeSocket
 from utils.bf1.data_handle import BlazeData
 from utils.bf1.database import BF1DB
 from utils.bf1.default_account import BF1DA
 from utils.bf1.gateway_api import api_instance
 from utils.bf1.map_team_info import MapData
+from utils.http_pool import get_http_pool
 
 if platform.system() == "Windows":
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
@@ -136,47 +134,46 @@ async def BTR_get_recent_info(player_name: str) -> list[dict]:
         "Connection": "keep-alive",
         "User-Agent": "ProtoHttp 1.3/DS 15.1.2.1.0 (Windows)",
     }
-    async with aiohttp.ClientSession(headers=header, proxy=proxy) as session:
-        async with session.get(url) as response:
-            html = await response.text()
-            # 处理网页获取失败的情况
-            if not html:
-                return result
-            soup = BeautifulSoup(html, "html.parser")
-            # 从<div class="card-body player-sessions">获取对局数量，如果找不到则返回None
-            if not soup.select('div.card-body.player-sessions'):
-                return None
-            sessions = soup.select('div.card-body.player-sessions')[0].select('div.sessions')
-            # 每个sessions由标题和对局数据组成，标题包含时间和胜率，对局数据包含spm、kdr、kpm、btr、gs、tp
-            for item in sessions:
-                time_item = item.select('div.title > div.time > h4 > span')[0]
-                # 此时time_item =  <span data-livestamp="2023-03-22T14:00:00.000Z"></span>
-                # 提取UTC时间转换为本地时间的时间戳
-                time_item = time_item['data-livestamp']
-                # 将时间戳转换为时间
-                time_item = datetime.datetime.fromtimestamp(
-                    time.mktime(time.strptime(time_item, "%Y-%m-%dT%H:%M:%S.000Z")))
-                # 将时间转换为字符串
-                time_item = time_item.strftime('%Y年%m月%d日%H时')
-                # 提取胜率
-                win_rate = item.select('div.title > div.stat')[0].text
-                # 提取spm、kdr、kpm、btr、gs、tp
-                spm = item.select('div.session-stats > div:nth-child(1) > div:nth-child(1)')[0].text.strip()
-                kd = item.select('div.session-stats > div:nth-child(2) > div:nth-child(1)')[0].text.strip()
-                kpm = item.select('div.session-stats > div:nth-child(3) > div:nth-child(1)')[0].text.strip()
-                score = item.select('div.session-stats > div:nth-child(5)')[0].text.strip().replace('Game Score', '')
-                time_play = item.select('div.session-stats > div:nth-child(6)')[0].text.strip().replace('Time Played',
-                                                                                                        '')
-                result.append({
-                    'time': time_item.strip(),
-                    'win_rate': win_rate.strip(),
-                    'spm': spm.strip(),
-                    'kd': kd.strip(),
-                    'kpm': kpm.strip(),
-                    'score': score.strip(),
-                    'time_play': time_play.strip()
-                })
-            return result
+    async with get_http_pool().session.get(url, headers=header, proxy=proxy) as response:
+        html = await response.text()
+    # 处理网页获取失败的情况
+    if not html:
+        return result
+    soup = BeautifulSoup(html, "html.parser")
+    # 从<div class="card-body player-sessions">获取对局数量，如果找不到则返回None
+    if not soup.select('div.card-body.player-sessions'):
+        return None
+    sessions = soup.select('div.card-body.player-sessions')[0].select('div.sessions')
+    # 每个sessions由标题和对局数据组成，标题包含时间和胜率，对局数据包含spm、kdr、kpm、btr、gs、tp
+    for item in sessions:
+        time_item = item.select('div.title > div.time > h4 > span')[0]
+        # 此时time_item =  <span data-livestamp="2023-03-22T14:00:00.000Z"></span>
+        # 提取UTC时间转换为本地时间的时间戳
+        time_item = time_item['data-livestamp']
+        # 将时间戳转换为时间
+        time_item = datetime.datetime.fromtimestamp(
+            time.mktime(time.strptime(time_item, "%Y-%m-%dT%H:%M:%S.000Z")))
+        # 将时间转换为字符串
+        time_item = time_item.strftime('%Y年%m月%d日%H时')
+        # 提取胜率
+        win_rate = item.select('div.title > div.stat')[0].text
+        # 提取spm、kdr、kpm、btr、gs、tp
+        spm = item.select('div.session-stats > div:nth-child(1) > div:nth-child(1)')[0].text.strip()
+        kd = item.select('div.session-stats > div:nth-child(2) > div:nth-child(1)')[0].text.strip()
+        kpm = item.select('div.session-stats > div:nth-child(3) > div:nth-child(1)')[0].text.strip()
+        score = item.select('div.session-stats > div:nth-child(5)')[0].text.strip().replace('Game Score', '')
+        time_play = item.select('div.session-stats > div:nth-child(6)')[0].text.strip().replace('Time Played',
+                                                                                                '')
+        result.append({
+            'time': time_item.strip(),
+            'win_rate': win_rate.strip(),
+            'spm': spm.strip(),
+            'kd': kd.strip(),
+            'kpm': kpm.strip(),
+            'score': score.strip(),
+            'time_play': time_play.strip()
+        })
+    return result
 
 
 async def get_match_detail(session, match_url: str) -> list[dict]:
@@ -215,9 +212,8 @@ async def bfeac_checkBan(player_name: str) -> dict:
         "url": None
     }
     try:
-        async with aiohttp.ClientSession(headers=header) as session:
-            async with session.get(check_eacInfo_url, proxy=proxy) as response:
-                response = await response.json()
+        async with get_http_pool().session.get(check_eacInfo_url, headers=header, proxy=proxy) as response:
+            response = await response.json()
         if response.get("data"):
             data = response["data"][0]
             eac_status = eac_stat_dict[data["current_status"]]
@@ -248,9 +244,8 @@ async def bfban_checkBan(player_pid: str) -> dict:
         "url": None
     }
     try:
-        async with aiohttp.ClientSession(headers=header) as session:
-            async with session.get(bfban_url) as response:
-                response = await response.json()
+        async with get_http_pool().session.get(bfban_url, headers=header) as response:
+            response = await response.json()
     except Exception as e:
         logger.error(f"联ban查询出错! {e}")
         return result
@@ -282,9 +277,8 @@ async def gt_checkVban(player_pid) -> int:
         'Accept': 'application/json',
     }
     try:
-        async with aiohttp.ClientSession(headers=header) as session:
-            async with session.get(url, proxy=proxy) as response:
-                response = await response.json()
+        async with get_http_pool().session.get(url, headers=header, proxy=proxy) as response:
+            response = await response.json()
         return len(response["vban"])
     except:
         return 0
@@ -297,9 +291,8 @@ async def gt_bf1_stat() -> str:
     }
     # noinspection PyBroadException
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=header, proxy=proxy) as response:
-                html = await response.json()
+        async with get_http_pool().session.get(url, headers=header, proxy=proxy) as response:
+            html = await response.json()
         if html.get("errors"):
             # {'errors': ['Error connecting to the database']}
             return f"{html['errors'][0]}"
@@ -336,9 +329,8 @@ async def gt_get_player_id_by_name(player_name: str) -> Union[dict, None]:
         'accept': 'application/json'
     }
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers, proxy=proxy) as response:
-                response = await response.json()
+        async with get_http_pool().session.get(url, headers=headers, proxy=proxy) as response:
+            response = await response.json()
         if response.get("errors"):
             logger.error(f"{player_name}|gt_get_player_id: {response['errors']}")
             return None
@@ -354,12 +346,11 @@ async def gt_get_player_id_by_pid(player_pid: str) -> Union[dict, None]:
         'accept': 'application/json'
     }
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers, proxy=proxy) as response:
-                response = await response.json()
-            if response.get("errors"):
-                logger.error(f"{player_pid}|gt_get_player_id: {response['errors']}")
-                return None
+        async with get_http_pool().session.get(url, headers=headers, proxy=proxy) as response:
+            response = await response.json()
+        if response.get("errors"):
+            logger.error(f"{player_pid}|gt_get_player_id: {response['errors']}")
+            return None
     except Exception as e:
         logger.error(f"gt_get_player_id: {e}")
         return None
@@ -378,10 +369,10 @@ async def check_vban(player_pid) -> dict or str:
         "Connection": "Keep-Alive"
     }
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=header, timeout=5, proxy=proxy)
+        async with get_http_pool().session.get(url, headers=header, timeout=5, proxy=proxy) as response:
+            response = await response.text()
         try:
-            return eval(response.text)
+            return eval(response)
         except:
             return "获取出错!"
     except:
@@ -394,9 +385,8 @@ async def record_api(player_pid) -> Union[dict, None]:
         "personaId": player_pid
     }
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(record_url, json=data, proxy=proxy) as response:
-                response = await response.json()
+        async with get_http_pool().session.post(record_url, json=data, proxy=proxy) as response:
+            response = await response.json()
         return response
     except Exception as e:
         logger.error(f"record_api: {e}")
@@ -415,17 +405,16 @@ async def download_skin(url):
         logger.warning(e)
         i = 0
         while i < 3:
-            async with aiohttp.ClientSession() as session:
-                # noinspection PyBroadException
-                try:
-                    async with session.get(url, timeout=5, verify_ssl=False, proxy=proxy) as resp:
-                        pic = await resp.read()
-                        with open(file_name, 'wb') as fp:
-                            fp.write(pic)
-                        return file_name
-                except Exception as e:
-                    logger.error(e)
-                    i += 1
+            # noinspection PyBroadException
+            try:
+                async with get_http_pool().session.get(url, timeout=5, ssl=False, proxy=proxy) as resp:
+                    pic = await resp.read()
+                    with open(file_name, 'wb') as fp:
+                        fp.write(pic)
+                    return file_name
+            except Exception as e:
+                logger.error(e)
+                i += 1
         return None
 
 
@@ -442,9 +431,8 @@ async def get_playerList_byGameid(server_gameid: Union[str, int, list]) -> Union
     api_url = "https://delivery.easb.cc/games/get_server_status"
     data = {"gameIds": [server_gameid] if isinstance(server_gameid, (str, int)) else server_gameid}
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(api_url, headers=header, json=data, timeout=5, proxy=proxy) as response:
-                response = await response.json()
+        async with get_http_pool().session.post(api_url, headers=header, json=data, timeout=5, proxy=proxy) as response:
+            response = await response.json()
     except TimeoutError as e:
         logger.error(f"get_playerList_byGameid: {e}")
         return "网络超时!"
@@ -497,9 +485,8 @@ class BattlefieldTracker:
         route = "profile/origin/"
         url = f"{BattlefieldTracker.url_root}{route}{player_name}?forceCollect=true"
         try:
-            async with AsyncSession() as session:
-                response = await session.get(url, headers=BattlefieldTracker.header)
-                response = response.json()
+            response = await get_http_pool().curl_session.get(url, headers=BattlefieldTracker.header)
+            response = response.json()
             if response.get("errors"):
                 return response["errors"][0]["message"]
             return response
@@ -549,9 +536,8 @@ class BattlefieldTracker:
         route = "matches/origin/"
         url = f"{BattlefieldTracker.url_root}{route}{player_name}"
         try:
-            async with AsyncSession() as session:
-                response = await session.get(url, headers=BattlefieldTracker.header)
-                response = response.json()
+            response = await get_http_pool().curl_session.get(url, headers=BattlefieldTracker.header)
+            response = response.json()
             if response.get("errors"):
                 return response["errors"][0]["message"]
             return response
@@ -564,9 +550,8 @@ class BattlefieldTracker:
         route = "matches/"
         url = f"{BattlefieldTracker.url_root}{route}{match_id}"
         try:
-            async with AsyncSession() as session:
-                response = await session.get(url, headers=BattlefieldTracker.header)
-                response = response.json()
+            response = await get_http_pool().curl_session.get(url, headers=BattlefieldTracker.header)
+            response = response.json()
             if response.get("errors"):
                 return response["errors"][0]["message"]
             return response
@@ -812,8 +797,7 @@ class EACUtils:
             }
         }
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(report_url, headers=headers, json=body, timeout=10)
+            response = await get_http_pool().get_client().post(report_url, headers=headers, json=body, timeout=10)
             logger.debug(response.text)
             return response.json()
         except Exception as e:
@@ -884,8 +868,7 @@ class EACUtils:
             return self.tvbot_list["result"]
         url = "https://ea-api.2788.pro/account/list/bfeac"
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, timeout=5)
+            response = await get_http_pool().get_client().get(url, timeout=5)
             response = response.json()
             if isinstance(response, list):
                 self.tvbot_list["result"] = response
@@ -1309,14 +1292,24 @@ class BF1ServerVipManager:
 
 
 class BF1BlazeManager:
+    # 连接池中已登录连接的数量上限,每个账号一个连接
+    pool_size = 4
+    # 连接不足时两次补充之间的最短间隔(秒),避免失效账号反复登录
+    fill_interval = 60
+    fill_task: Union[asyncio.Task, None] = None
+    last_fill = 0.0
+    batcher: Union[GameDataBatcher, None] = None
 
     @staticmethod
     async def init_socket(pid: Union[str, int], remid: str, sid: str) -> Union[BlazeSocket, None]:
         pid = int(pid)
         if pid in BlazeClientManagerInstance.clients_by_pid:
             blaze_socket = BlazeClientManagerInstance.clients_by_pid[pid]
-            if blaze_socket.connect:
+            if blaze_socket.connect and blaze_socket.authenticated and not blaze_socket.draining:
                 return await BlazeClientManagerInstance.get_socket_for_pid(pid)
+            elif blaze_socket.draining:
+                # 等待关闭的连接由drain关闭,这里只移出连接池
+                del BlazeClientManagerInstance.clients_by_pid[pid]
             else:
                 await BlazeClientManagerInstance.remove_client(pid)
         # 连接blaze
@@ -1331,7 +1324,12 @@ class BF1BlazeManager:
             sid=sid
         )
         # 2.获取BlazeAuthcode
-        auth_code = await bf1_account.getBlazeAuthcode()
+        try:
+            auth_code = await bf1_account.getBlazeAuthcode()
+        except Exception as e:
+            logger.error(f"获取Blaze AuthCode失败: {e}")
+            await BlazeClientManagerInstance.remove_client(pid)
+            return None
         logger.success(f"获取到Blaze AuthCode: {auth_code}")
         # 3.Blaze登录
         login_packet = {
@@ -1352,38 +1350,81 @@ class BF1BlazeManager:
             uid = response["data"]["UID"]
             CGID = response["data"]["CGID"][2]
             logger.success(f"Blaze登录成功: Name:{name} Pid:{pid} Uid:{uid} CGID:{CGID}")
+            blaze_socket.authenticated = True
             BlazeClientManagerInstance.clients_by_pid[pid] = blaze_socket
             return blaze_socket
         except Exception as e:
             logger.error(f"Blaze登录失败: {response}, {e}")
+            await BlazeClientManagerInstance.remove_client(pid)
             return None
 
+    @staticmethod
+    async def fill_pool():
+        """为默认账号和服管账号建立连接,直到已登录的连接数达到pool_size"""
+        accounts = [{"pid": BF1DA.pid, "remid": BF1DA.remid, "sid": BF1DA.sid}]
+        try:
+            accounts += await BF1ManagerAccount.get_accounts() or []
+        except Exception as e:
+            logger.error(f"获取服管账号失败: {e}")
+        connected = {
+            int(pid) for pid, client in BlazeClientManagerInstance.clients_by_pid.items()
+            if client.connect and client.authenticated and not client.draining
+        }
+        targets = {}
+        for account in accounts:
+            if not account.get("pid") or not account.get("remid") or not account.get("sid"):
+                continue
+            pid = int(account["pid"])
+            if pid not in connected and pid not in targets:
+                targets[pid] = account
+        targets = list(targets.values())[:max(BF1BlazeManager.pool_size - len(connected), 0)]
+        results = await asyncio.gather(
+            *(BF1BlazeManager.init_socket(account["pid"], account["remid"], account["sid"]) for account in targets),
+            return_exceptions=True
+        )
+        for account, result in zip(targets, results):
+            if isinstance(result, Exception):
+                logger.error(f"Blaze连接池登录账号{account['pid']}失败: {result}")
+
+    @staticmethod
+    async def get_socket() -> Union[BlazeSocket, None]:
+        """从连接池中获取连接,连接不足时在后台补充,没有可用连接时等待补充完成"""
+        manager = BF1BlazeManager
+        if len(BlazeClientManagerInstance.get_pool_sockets()) < manager.pool_size and (
+                manager.fill_task is None or manager.fill_task.done()
+        ) and time.time() - manager.last_fill > manager.fill_interval:
+            manager.last_fill = time.time()
+            manager.fill_task = asyncio.create_task(manager.fill_pool())
+        if blaze_socket := BlazeClientManagerInstance.get_idle_socket():
+            return blaze_socket
+        if manager.fill_task is None or manager.fill_task.done():
+            manager.last_fill = time.time()
+            manager.fill_task = asyncio.create_task(manager.fill_pool())
+        await asyncio.shield(manager.fill_task)
+        return BlazeClientManagerInstance.get_idle_socket()
+
     @staticmethod
     async def get_player_list(
             game_ids: list[int], origin: bool = False, platoon: bool = False
     ) -> Union[dict, None, str]:
-        """获取玩家列表"""
+        """获取玩家列表,origin为True时返回的数据包只包含BlazeData.player_list_fields中的字段"""
         # 检查game_ids类型
         if not isinstance(game_ids, list):
             game_ids = [game_ids]
         game_ids = [int(game_id) for game_id in game_ids]
-        blaze_socket = await BF1BlazeManager.init_socket(BF1DA.pid, BF1DA.remid, BF1DA.sid)
-        if not blaze_socket:
-            return "BlazeClient初始化出错!"
-        packet = {
-            "method": "GameManager.getGameDataFromId",
-            "type": "Command",
-            "data": {
-                "DNAM 1": "csFullGameList",
-                "GLST 40": game_ids,
-            }
-        }
+        if not game_ids and not origin:
+            return {}
+        # 短时间内的查询会合并为一个请求,并分散到连接池中的多个连接
+        if BF1BlazeManager.batcher is None:
+            BF1BlazeManager.batcher = GameDataBatcher(BF1BlazeManager.get_socket, fields=BlazeData.player_list_fields)
         try:
-            response = await blaze_socket.send(packet)
+            response = await BF1BlazeManager.batcher.query(game_ids)
         except TimeoutError:
-            await blaze_socket.close()
             logger.error("Blaze后端超时!")
             return "Blaze后端超时!"
+        except ConnectionError as e:
+            logger.error(f"Blaze连接出错: {e}")
+            return "BlazeClient初始化出错!"
         if origin:
             return response
         response = BlazeData.player_list_handle(response)
@@ -1,5 +1,5 @@
-import contextlib
 import struct
+from typing import Container
 
 from utils.bf1.blaze.Method import Components, Commands, Methods, Components2Int
 
@@ -53,472 +53,402 @@ TYPE = {
     "10": "Float",
 }
 TYPE2INT = {v: int(k) for k, v in TYPE.items()}
-Tags = {}
+TYPE_NAMES = [TYPE[str(i)] for i in range(len(TYPE))]
+INTEGER, STRING, BLOB, STRUCT, LIST, MAP, UNION, INT_LIST, OBJECT_TYPE, OBJECT_ID, FLOAT = range(11)
+QTYPE_NAMES = {int(k): v for k, v in QType.items() if k.isdigit()}
+# (组件, 命令) -> 方法名,与原先一致只使用Command表
+METHOD_NAMES = {
+    (component_id, int(command_id)): f"{component}.{command}"
+    for component_id, component in Components.items()
+    for command_id, command in Commands.get(component, {}).get("Command", {}).items()
+}
+# 方法名 -> 头部中组件与命令的4字节
+METHOD_HEADERS = {
+    method: component_id.to_bytes(2, byteorder="big") + command_id.to_bytes(2, byteorder="big")
+    for method, (component_id, command_id) in Methods.items()
+}
+# 3字节tag -> (4字符标签, 去除空格的标签)
+Tags: dict[bytes, tuple[str, str]] = {}
+# 字段名(如"GLST 40") -> (3字节tag, 类型, 子类型1, 子类型2)
+Keys: dict[str, tuple[bytes, int, int | None, int | None]] = {}
 keepalive = bytearray(16)
 keepalive[13] = 128
-
-
-class Blaze:
-    packet = None
-    readable = False
-
-    def __init__(self, data):
-        self.packet = data
-
-    def decode(self, readable: bool = False) -> dict:
-        byte_data = self.packet
-        Blaze.readable = readable
-        offset = 16
-        length = int.from_bytes(byte_data[:4], byteorder='big') + int.from_bytes(
-            byte_data[4:6], byteorder='big'
-        )
-        q_type = byte_data[13]
-        type_ = QType.get(str(q_type), q_type)
-        component = int.from_bytes(byte_data[6:8], byteorder='big')
-        command = int.from_bytes(byte_data[8:10], byteorder='big')
-        id_ = int.from_bytes(byte_data[11:13], byteorder='big')
-        method = (
-            type_
-            if type_ in ["KeepAlive", "Pong"]
-            else f"{Components.get(component, str(component))}."
-                 + Commands[Components.get(component)][
-                     QType.get(q_type, "Command")
-                 ].get(str(command), str(command))
-        )
-
-        # if QType.get(str(type_)):
-        #     logger.debug(
-        #         f"\n头部:\n"
-        #         f"    长度: {length}\n"
-        #         f"    类型: {QType.get(str(type_))} {type_}\n"
-        #         f"    组件: {component} {Components.get(component)}\n"
-        #         f"    命令: {command} {Commands[Components.get(component)
-        # ][QType.get(q_type, 'Command')].get(str(command), str(command))}\n"
-        #         f"    ID: {id_}\n"
-        #         f"    方法: {method}"
-        #     )
-        # else:
-        #     component_value = Components.get(component, component)
-        #     qtype_value = QType.get(q_type, 'Command')
-        #     command_value = Commands.get(component_value, {}).get(qtype_value, {}).get(command, command)
-        #     result = f"{component_value}.{command_value}"
-        #     logger.debug(
-        #         f"\n头部:\n"
-        #         f"    长度: {length}\n"
-        #         f"    类型: {type_}\n"
-        #         f"    命令: {result}\n "
-        #         f"    ID: {id_}\n"
-        #         f"    方法: {method}"
-        #     )
-
-        if offset < len(byte_data):
-            data = self.parse_struct(byte_data, offset, Blaze.readable)
-        else:
-            data = {'struct': {}}
-        return {'method': method, 'type': type_, 'id': id_, 'length': length, 'data': data['struct']}
-
-    @staticmethod
-    def decode_tag(hex_str):
-        tag_buffer = bytearray(4)
-        tag_int = int(hex_str, 16)
-        tag_buffer[0] = ((tag_int >> 18) & 63) + 32
-        tag_buffer[1] = ((tag_int >> 12) & 63) + 32
-        tag_buffer[2] = ((tag_int >> 6) & 63) + 32
-        tag_buffer[3] = (tag_int & 63) + 32
-        return tag_buffer.decode('ascii')
-
-    @staticmethod
-    def parse_integer(byte_data, offset):
+float_struct = struct.Struct(">f")
+
+
+def decode_tag(raw: bytes) -> tuple[str, str]:
+    """3字节tag,每6位为一个字符(加32)"""
+    if tag := Tags.get(raw):
+        return tag
+    tag_int = int.from_bytes(raw, byteorder="big")
+    label = bytes((
+        ((tag_int >> 18) & 63) + 32,
+        ((tag_int >> 12) & 63) + 32,
+        ((tag_int >> 6) & 63) + 32,
+        (tag_int & 63) + 32,
+    )).decode("ascii")
+    Tags[raw] = tag = (label, label.strip())
+    return tag
+
+
+def encode_tag(tag: str) -> bytes:
+    tag_int = sum((ord(c) - 32) << (18 - 6 * i) for i, c in enumerate(tag[:4]))
+    return tag_int.to_bytes(3, byteorder="big")
+
+
+def parse_key(key: str) -> tuple[bytes, int, int | None, int | None]:
+    """字段名格式为"标签 类型子类型",如"GLST 40"表示整数列表"""
+    if parsed := Keys.get(key):
+        return parsed
+    parsed = Keys[key] = (
+        encode_tag(key[:4]),
+        int(key[5]),
+        int(key[6]) if len(key) > 6 else None,
+        int(key[7]) if len(key) > 7 else None,
+    )
+    return parsed
+
+
+class BlazeDecoder:
+    """在bytes上按偏移量解析TDF数据
+
+    readable为True时字段名只保留标签,否则为"标签 类型"。
+    fields不为None时只解析标签在fields中的字段,其余字段直接跳过,嵌套结构中的字段同样需要包含在fields中。
+    """
+    __slots__ = ("data", "readable", "fields")
+
+    def __init__(self, data: bytes, readable: bool = False, fields: Container[str] | None = None):
+        self.data = data if isinstance(data, bytes) else bytes(data)
+        self.readable = readable
+        self.fields = fields
+
+    def read_integer(self, offset: int) -> tuple[int, int]:
         """Integer 不定长整数
-        每个字节的第一位表示是否继续读取，将所有字节的后7位连起来，组成一个有符号整数（Little Endian）。
+        第一个字节的低6位为数值,0x40为符号位;之后每个字节低7位依次作为更高位,最高位表示是否继续读取。
         """
-        i, n = 1, byte_data[offset]
-        negative = n & 0x40
-        if n > 0x7f:
-            n &= 0x7f
-            while byte_data[offset] > 0x7f:
-                offset += 1
-                n += (byte_data[offset] & 0x7f) * (128 ** i * 0.5)
-                i += 1
+        data = self.data
+        byte = data[offset]
         offset += 1
-        n = int(n)
-        n = -n if negative else n
-        return n, offset
+        value = byte & 0x3f
+        negative = byte & 0x40
+        if not byte & 0x80:
+            return (-value if negative else value), offset
+        shift = 6
+        while byte & 0x80:
+            byte = data[offset]
+            offset += 1
+            value |= (byte & 0x7f) << shift
+            shift += 7
+        return (-value if negative else value), offset
 
-    @staticmethod
-    def parse_string(byte_data, offset):
+    def read_string(self, offset: int) -> tuple[str, int]:
         """String 字符串
-        字符串数据由两部分组成：第一部分是一个整数（Integer，0x00），第二部分是一个长度等于该整数值的字符串。"""
-        length, offset = Blaze.parse_integer(byte_data, offset)
-        start = offset
-        offset += length
-        end = offset - 1
+        长度(Integer,包含结尾的\\0) + 字符串"""
+        length, offset = self.read_integer(offset)
+        raw = self.data[offset:offset + length - 1]
         try:
-            return byte_data[start:end].decode('utf-8'), offset
-        except UnicodeDecodeError:
-            # logger.error(f"开始: {start}, 结束: {end}, 长度: {length}, offset: {offset}")
-            data = None
-            for i in range(length):
-                with contextlib.suppress(UnicodeDecodeError):
-                    data = byte_data[start:start + i].decode()
-            return ("", offset) if data is None else (data, offset)
-
-    @staticmethod
-    def parse_blob(byte_data, offset):
-        """Blob 二进制
-        Blob数据与String相似，也由两部分组成：第一部分是一个整数（Integer，0x00），第二部分是一个长度等于该整数值的二进制数据。"""
-        length, offset = Blaze.parse_integer(byte_data, offset)
-        value = byte_data[offset:offset + length - 1].hex()
-        offset += length
-        return value, offset
-
-    @staticmethod
-    def parse_list(byte_data, header, offset):
-        """List 列表
-        List 数据包含多个相同类型的数据项。
-        List 数据的第一个字节是 Type，表示存储的数据类型。之后是一个 Integer 类型的值，表示列表中包含的数据项的个数。最后是列表中的数据项。"""
-        type_ = byte_data[offset]
-        header["type"] += str(type_)
-        offset += 1
-        size, offset = Blaze.parse_integer(byte_data, offset)
-        data = []
-        if type_ == 3 and byte_data[offset] == 2:
-            offset += 1
-            header["type"] += "2"
-        for _ in range(size):
-            item_value, offset = Blaze.parse_block(byte_data, {"type": str(type_)}, offset, Blaze.readable)
-            data.append(item_value)
-        return data, offset
-
-    @staticmethod
-    def parse_map(byte_data, header, offset):
-        """Map 键值对
-        Map 数据包含多个键值对，每个键值对包含一个键和一个值。Map 数据的前两个字节分别表示键和值的类型。
-        之后是一个 Integer 类型的值，表示 Map 中包含的键值对的个数。接下来是按照键-值键-值的结构排列的数据项。
-        """
-        key_type = str(byte_data[offset])
-        val_type = str(byte_data[offset + 1])
-        header["type"] += key_type + val_type
-        offset += 2
-        size, offset = Blaze.parse_integer(byte_data, offset)
-        data = {}
-        for _ in range(size):
-            key_value, offset = Blaze.parse_block(byte_data, {"type": key_type}, offset, Blaze.readable)
-            val_value, offset = Blaze.parse_block(byte_data, {"type": val_type}, offset, Blaze.readable)
-            data[key_value] = val_value
-        return data, offset
-
-    @staticmethod
-    def parse_union(byte_data, header, offset):
-        """Union 联合体
-        """
-        data = {}
-        union_type = byte_data[offset]
-        header["type"] += str(union_type)
-        offset += 1
-        if union_type == 127:
-            return data, offset
-        u_header = {
-            'tag': Blaze.decode_tag(byte_data[offset:offset + 3].hex()),
-            'type': str(byte_data[offset + 3])
-        }
-        offset += 4
-        result, offset = Blaze.parse_block(byte_data, u_header, offset, Blaze.readable)
-        data[f"{u_header['tag'].ljust(4)} {u_header['type']}"] = result
-        return data, offset
+            value = raw.decode("utf-8")
+        except UnicodeDecodeError as e:
+            # 截断到第一个无法解析的位置
+            value = raw[:e.start].decode("utf-8")
+        return value, offset + length
 
-    @staticmethod
-    def parse_double(buffer, offset):
-        """Double 双精度浮点数
-        8字节，IEEE 754 标准的双精度浮点数
+    def read_value(self, type_: int, offset: int) -> tuple[object, int, str]:
         """
-        double_value = struct.unpack('>d', buffer[offset:offset + 8])[0]
-        offset += 8
-        return double_value, offset
-
-    @staticmethod
-    def parse_object_type(buffer, offset):
-        """ObjectType 类型定义
-        包含两个Integer，第一个是ComponentId，第二个是TypeId
-        """
-        component_id, offset = Blaze.parse_integer(buffer, offset)
-        component = Components.get(component_id)
-        type_id, offset = Blaze.parse_integer(buffer, offset)
-        type_ = TYPE[str(type_id)]
-        return (component, type_), offset
-
-    @staticmethod
-    def parse_object_id(buffer, offset):
-        """ObjectId 类型实体
-        包含三个Integer，第一个是ComponentId，第二个是TypeId，第三个是EntityId
+        :return: (值, 新偏移量, 字段名中类型之后追加的子类型)
         """
-        component_id, offset = Blaze.parse_integer(buffer, offset)
-        component = Components.get(component_id)
-        type_id, offset = Blaze.parse_integer(buffer, offset)
-        type_ = TYPE[str(type_id)]
-        entity_id, offset = Blaze.parse_integer(buffer, offset)
-        return (component, type_, entity_id), offset
-
-    @staticmethod
-    def parse_tripple(byte_data, offset):
-        data = []
-        for _ in range(3):
-            value, offset = Blaze.parse_integer(byte_data, offset)
-            data.append(value)
-        return data, offset
-
-    @staticmethod
-    def parse_int_list(byte_data, offset):
-        """IntList 整数列表
-        开头是一个Integer，后面是和开头的Int值相等数量的Int"""
-        size, offset = Blaze.parse_integer(byte_data, offset)
-        data = []
-        for _ in range(int(size)):
-            item_value, offset = Blaze.parse_integer(byte_data, offset)
-            data.append(item_value)
-        return data, offset
-
-    @staticmethod
-    def parse_float(buffer, offset):
-        float_value = struct.unpack_from('>f', buffer, offset)[0]
-        offset += 4
-        return float_value, offset
-
-    @staticmethod
-    def parse_block(byte_data, header, offset, readable: bool):
-        type_ = TYPE.get(header["type"], "Unknown")
-        if type_ == "Integer":
-            value, offset = Blaze.parse_integer(byte_data, offset)
-        elif type_ == "String":
-            value, offset = Blaze.parse_string(byte_data, offset)
-        elif type_ == "Struct":
-            data: dict = Blaze.parse_struct(byte_data, offset, readable)
-            value, offset = data["struct"], data["offset"]
-        elif type_ == "Blob":
-            value, offset = Blaze.parse_blob(byte_data, offset)
-        elif type_ == "List":
-            value, offset = Blaze.parse_list(byte_data, header, offset)
-        elif type_ == "Map":
-            value, offset = Blaze.parse_map(byte_data, header, offset)
-        elif type_ == "Union":
-            value, offset = Blaze.parse_union(byte_data, header, offset)
-        elif type_ == "Double":
-            value, offset = Blaze.parse_double(byte_data, offset)
-        elif type_ == "Tripple":
-            value, offset = Blaze.parse_tripple(byte_data, offset)
-        elif type_ == "IntList":
-            value, offset = Blaze.parse_int_list(byte_data, offset)
-        elif type_ == "Float":
-            value, offset = Blaze.parse_float(byte_data, offset)
-        elif type_ == "ObjectType":
-            value, offset = Blaze.parse_object_type(byte_data, offset)
-        elif type_ == "ObjectId":
-            value, offset = Blaze.parse_object_id(byte_data, offset)
-        else:
-            raise TypeError("未知类型")
-
-        return value, offset
-
-    @staticmethod
-    def parse_struct(byte_data, offset, readable: bool = False) -> dict:
-        data = {}
-        while byte_data[offset]:
-            tag = Blaze.decode_tag(byte_data[offset:offset + 3].hex())
-            type_ = str(byte_data[offset + 3])
-            header = {'tag': tag, 'type': type_}
+        data = self.data
+        if type_ == INTEGER:
+            value, offset = self.read_integer(offset)
+            return value, offset, ""
+        if type_ == STRING:
+            value, offset = self.read_string(offset)
+            return value, offset, ""
+        if type_ == STRUCT:
+            value, offset = self.read_struct(offset)
+            return value, offset, ""
+        if type_ == LIST:
+            item_type = data[offset]
+            size, offset = self.read_integer(offset + 1)
+            suffix = str(item_type)
+            if item_type == STRUCT and offset < len(data) and data[offset] == 2:
+                offset += 1
+                suffix += "2"
+            value = []
+            for _ in range(size):
+                item, offset, _ = self.read_value(item_type, offset)
+                value.append(item)
+            return value, offset, suffix
+        if type_ == MAP:
+            key_type, value_type = data[offset], data[offset + 1]
+            size, offset = self.read_integer(offset + 2)
+            value = {}
+            for _ in range(size):
+                key, offset, _ = self.read_value(key_type, offset)
+                value[key], offset, _ = self.read_value(value_type, offset)
+            return value, offset, f"{key_type}{value_type}"
+        if type_ == BLOB:
+            length, offset = self.read_integer(offset)
+            return data[offset:offset + length - 1].hex(), offset + length, ""
+        if type_ == UNION:
+            union_type = data[offset]
+            offset += 1
+            if union_type == 127:
+                return {}, offset, str(union_type)
+            label, _ = decode_tag(data[offset:offset + 3])
+            member_type = data[offset + 3]
+            member, offset, member_suffix = self.read_value(member_type, offset + 4)
+            return {f"{label} {member_type}{member_suffix}": member}, offset, str(union_type)
+        if type_ == INT_LIST:
+            size, offset = self.read_integer(offset)
+            value = []
+            for _ in range(size):
+                item, offset = self.read_integer(offset)
+                value.append(item)
+            return value, offset, ""
+        if type_ == FLOAT:
+            return float_struct.unpack_from(data, offset)[0], offset + 4, ""
+        if type_ == OBJECT_TYPE:
+            component_id, offset = self.read_integer(offset)
+            type_id, offset = self.read_integer(offset)
+            return (Components.get(component_id), TYPE_NAMES[type_id]), offset, ""
+        if type_ == OBJECT_ID:
+            component_id, offset = self.read_integer(offset)
+            type_id, offset = self.read_integer(offset)
+            entity_id, offset = self.read_integer(offset)
+            return (Components.get(component_id), TYPE_NAMES[type_id], entity_id), offset, ""
+        raise TypeError("未知类型")
+
+    def skip_integer(self, offset: int) -> int:
+        data = self.data
+        while data[offset] & 0x80:
+            offset += 1
+        return offset + 1
+
+    def skip_value(self, type_: int, offset: int) -> int:
+        """跳过一个值,不构造任何对象"""
+        data = self.data
+        if type_ == INTEGER:
+            return self.skip_integer(offset)
+        if type_ in (STRING, BLOB):
+            length, offset = self.read_integer(offset)
+            return offset + length
+        if type_ == STRUCT:
+            end = len(data)
+            while data[offset]:
+                offset = self.skip_value(data[offset + 3], offset + 4)
+                if offset >= end:
+                    break
+            return offset + 1
+        if type_ == LIST:
+            item_type = data[offset]
+            size, offset = self.read_integer(offset + 1)
+            if item_type == STRUCT and offset < len(data) and data[offset] == 2:
+                offset += 1
+            for _ in range(size):
+                offset = self.skip_value(item_type, offset)
+            return offset
+        if type_ == MAP:
+            key_type, value_type = data[offset], data[offset + 1]
+            size, offset = self.read_integer(offset + 2)
+            for _ in range(size):
+                offset = self.skip_value(value_type, self.skip_value(key_type, offset))
+            return offset
+        if type_ == UNION:
+            if data[offset] == 127:
+                return offset + 1
+            return self.skip_value(data[offset + 4], offset + 5)
+        if type_ == INT_LIST:
+            size, offset = self.read_integer(offset)
+            for _ in range(size):
+                offset = self.skip_integer(offset)
+            return offset
+        if type_ == FLOAT:
+            return offset + 4
+        if type_ == OBJECT_TYPE:
+            return self.skip_integer(self.skip_integer(offset))
+        if type_ == OBJECT_ID:
+            return self.skip_integer(self.skip_integer(self.skip_integer(offset)))
+        raise TypeError("未知类型")
+
+    def read_struct(self, offset: int) -> tuple[dict, int]:
+        data = self.data
+        end = len(data)
+        readable = self.readable
+        fields = self.fields
+        tags = Tags
+        struct_ = {}
+        while data[offset]:
+            raw = data[offset:offset + 3]
+            label, name = tags.get(raw) or decode_tag(raw)
+            type_ = data[offset + 3]
             offset += 4
-            result, offset = Blaze.parse_block(byte_data, header, offset, readable)
-            if readable:
-                data[f"{header['tag']}".strip()] = result
+            if fields is not None and name not in fields:
+                offset = self.skip_value(type_, offset)
             else:
-                data[f"{header['tag'].ljust(4, ' ')} {str(header['type'])}"] = result
-            if offset >= len(byte_data):
+                # 整数和字符串最常见,不经过read_value
+                if type_ == INTEGER:
+                    value, offset = self.read_integer(offset)
+                    suffix = ""
+                elif type_ == STRING:
+                    value, offset = self.read_string(offset)
+                    suffix = ""
+                else:
+                    value, offset, suffix = self.read_value(type_, offset)
+                struct_[name if readable else f"{label} {type_}{suffix}"] = value
+            if offset >= end:
                 break
-        offset += 1
-        return {'struct': data, 'offset': offset}
-
-    def encode(self) -> bytes:
-        hex_str = self.write_struct(self.packet.get('data'), end=False)
-
-        header = ""
-        length = len(hex_str) // 2
-
-        if length > 0xFFFFFFFF:
-            header += "FFFFFFFF"
-            header += (length - 0xFFFFFFFF).to_bytes(2, byteorder="big").hex()
-        else:
-            header += length.to_bytes(4, byteorder="big").hex()
-            header += "0000"
-
-        if Methods.get(self.packet.get('method')):
-            header += Methods[self.packet.get('method')][0].to_bytes(2, byteorder="big").hex()
-            header += Methods[self.packet.get('method')][1].to_bytes(2, byteorder="big").hex()
-        else:
-            method_split = self.packet.get('method').split(".")
-            header += int(method_split[0]).to_bytes(2, byteorder="big").hex()
-            header += int(method_split[1]).to_bytes(2, byteorder="big").hex()
-
-        header += self.packet.get("id", 0).to_bytes(3, byteorder="big").hex()
-        header += "000000"
-
-        return bytes.fromhex(header + hex_str)
-
-    @staticmethod
-    def write_struct(object_, end=True) -> hex:
-        hex_str = ""
-        for key, value in object_.items():
-            tag = Blaze.encode_tag(key[:4])
-            hex_str += f"{tag}0{key[5]}"
-            value_str = Blaze.write_block(key[5], value, key)
-            hex_str += value_str
-        if end:
-            hex_str += "00"
-        return hex_str
+        return struct_, offset + 1
 
-    @staticmethod
-    def encode_tag(tag: str) -> str:
-        hex_str = ""
-        if tag in Tags:
-            return Tags[tag]
-        buffer = sum(
-            ((int.from_bytes(c.encode(), byteorder='big') - 32) << (18 - 6 * i))
-            for i, c in enumerate(tag)
-        )
-        hex_str += hex(buffer)[2:]
-        Tags[tag] = hex_str
-        return hex_str
 
-    @staticmethod
-    def write_block(type_str=None, value=None, key=None) -> hex:
-        if TYPE[type_str] == "Integer":
-            value = Blaze.write_integer(value)
-        elif TYPE[type_str] == "String":
-            value = Blaze.write_string(value)
-        elif TYPE[type_str] == "Struct":
-            value = Blaze.write_struct(value)
-        elif TYPE[type_str] == "Blob":
-            value = Blaze.write_blob(value)
-        elif TYPE[type_str] == "List":
-            value = Blaze.write_list(value, key)
-        elif TYPE[type_str] == "Map":
-            value = Blaze.write_map(value, key)
-        elif TYPE[type_str] == "Union":
-            value = Blaze.write_union(value, key)
-        elif TYPE[type_str] == "Double":
-            value = Blaze.write_double(value)
-        elif TYPE[type_str] == "Tripple":
-            value = Blaze.write_tripple(value)
-        elif TYPE[type_str] == "IntList":
-            value = Blaze.write_int_list(value)
-        elif TYPE[type_str] == "Float":
-            value = Blaze.write_float(value)
-        elif TYPE[type_str] == "ObjectType":
-            value = Blaze.write_object_type(value)
-        elif TYPE[type_str] == "ObjectId":
-            value = Blaze.write_object_id(value)
-        else:
-            raise TypeError(f"Unknown Type {type_str}")
+class BlazeEncoder:
+    """将TDF数据写入bytearray"""
+    __slots__ = ("buffer",)
 
-        return value
+    def __init__(self):
+        self.buffer = bytearray()
 
-    @staticmethod
-    def write_integer(n):
-        negative = False
+    def write_integer(self, n):
+        buffer = self.buffer
         n = int(n)
+        first = 0
         if n < 0:
-            negative = True
+            first = 0x40
             n = -n
-        temp = [n % 64 + 128]
-        n = n // 64
-        while n > 0:
-            temp.append(n % 128 + 128)
-            n = n // 128
-        if negative:
-            temp[0] += 64
-        temp[-1] -= 128
-        return bytes(temp).hex()
-
-    @staticmethod
-    def write_string(text):
+        first |= n & 0x3f
+        n >>= 6
+        if not n:
+            buffer.append(first)
+            return
+        buffer.append(first | 0x80)
+        while n > 0x7f:
+            buffer.append((n & 0x7f) | 0x80)
+            n >>= 7
+        buffer.append(n)
+
+    def write_string(self, text):
         if not text:
-            return "00"
-        text_hex = f"{text.encode().hex()}00"
-        length = len(text_hex) // 2
-        length_hex = Blaze.write_integer(length)
-        return length_hex + text_hex
-
-    @staticmethod
-    def write_blob(blob_hex):
-        blob_bytes = bytes.fromhex(blob_hex)
-        length_hex = Blaze.write_integer(len(blob_bytes))
-        return length_hex + blob_bytes.hex()
-
-    @staticmethod
-    def write_list(lst, key):
-        hex_str = ""
-        hex_str += f"0{key[6]}"
-        hex_str += Blaze.write_integer(len(lst))  # size
-        for item in lst:
-            hex_str += Blaze.write_block(key[6], item, key)
-        return hex_str
-
-    @staticmethod
-    def write_map(map_data, key):
-        map_data = list(map_data.items())
-        result = f"0{key[6]}0{key[7]}"
-        result += Blaze.write_integer(len(map_data))
-        for k, v in map_data:
-            result += Blaze.write_block(key[6], k)
-            result += Blaze.write_block(key[7], v)
-        return result
-
-    @staticmethod
-    def write_union(data, key):
-        if key[6]:
-            hex_str = f"0{key[6]}"
-            hex_str += Blaze.write_struct(data, False)
+            self.buffer.append(0)
+            return
+        raw = text.encode()
+        self.write_integer(len(raw) + 1)
+        self.buffer += raw
+        self.buffer.append(0)
+
+    def write_blob(self, blob_hex):
+        raw = bytes.fromhex(blob_hex)
+        self.write_integer(len(raw))
+        self.buffer += raw
+
+    def write_struct(self, object_: dict, end: bool = True):
+        buffer = self.buffer
+        for key, value in object_.items():
+            tag, type_, sub_type, value_type = parse_key(key)
+            buffer += tag
+            buffer.append(type_)
+            self.write_value(type_, value, sub_type, value_type)
+        if end:
+            buffer.append(0)
+
+    def write_value(self, type_: int, value, sub_type: int | None = None, value_type: int | None = None):
+        """sub_type为列表元素/Map键/Union成员的类型,value_type为Map值的类型"""
+        buffer = self.buffer
+        if type_ == INTEGER:
+            self.write_integer(value)
+        elif type_ == STRING:
+            self.write_string(value)
+        elif type_ == STRUCT:
+            self.write_struct(value)
+        elif type_ == LIST:
+            buffer.append(sub_type)
+            self.write_integer(len(value))
+            for item in value:
+                self.write_value(sub_type, item, sub_type, value_type)
+        elif type_ == MAP:
+            buffer.append(sub_type)
+            buffer.append(value_type)
+            self.write_integer(len(value))
+            for k, v in value.items():
+                self.write_value(sub_type, k)
+                self.write_value(value_type, v)
+        elif type_ == BLOB:
+            self.write_blob(value)
+        elif type_ == UNION:
+            if sub_type is not None:
+                buffer.append(sub_type)
+                self.write_struct(value, False)
+            else:
+                buffer.append(127)
+        elif type_ == INT_LIST:
+            self.write_integer(len(value))
+            for item in value:
+                self.write_integer(item)
+        elif type_ == FLOAT:
+            buffer += float_struct.pack(value)
+        elif type_ == OBJECT_TYPE:
+            self.write_integer(Components2Int[value[0]])
+            self.write_integer(TYPE2INT[value[1]])
+        elif type_ == OBJECT_ID:
+            self.write_integer(Components2Int[value[0]])
+            self.write_integer(TYPE2INT[value[1]])
+            self.write_integer(value[2])
         else:
-            hex_str = "7f"
-        return hex_str
+            raise TypeError(f"Unknown Type {type_}")
 
-    @staticmethod
-    def write_double(values):
-        hex_str = ""
-        hex_str += Blaze.write_integer(values[0])
-        hex_str += Blaze.write_integer(values[1])
-        return hex_str
 
-    @staticmethod
-    def write_object_type(values):
-        hex_str = ""
-        hex_str += Blaze.write_integer(Components2Int[values[0]])
-        hex_str += Blaze.write_integer(TYPE2INT[values[1]])
-        return hex_str
+class Blaze:
+    packet = None
 
-    @staticmethod
-    def write_object_id(values):
-        hex_str = ""
-        hex_str += Blaze.write_integer(Components2Int[values[0]])
-        hex_str += Blaze.write_integer(TYPE2INT[values[1]])
-        hex_str += Blaze.write_integer(values[2])
-        return hex_str
+    def __init__(self, data):
+        self.packet = data
 
     @staticmethod
-    def write_tripple(values):
-        hex_str = ""
-        hex_str += Blaze.write_integer(values[0])
-        hex_str += Blaze.write_integer(values[1])
-        hex_str += Blaze.write_integer(values[2])
-        return hex_str
+    def get_id(data: bytes) -> int:
+        """只读取头部中的请求id,用于在解析前找到对应的请求"""
+        return int.from_bytes(data[11:13], byteorder='big')
 
-    @staticmethod
-    def write_int_list(values):
-        hex_str = ""
-        hex_str += Blaze.write_integer(len(values))
-        for value in values:
-            hex_str += Blaze.write_integer(value)
-        return hex_str
+    def decode(self, readable: bool = False, fields: Container[str] | None = None) -> dict:
+        """
+        :param readable: 字段名是否只保留标签
+        :param fields: 只解析这些标签的字段(包括嵌套结构中的字段),为None时解析全部
+        """
+        decoder = BlazeDecoder(self.packet, readable, fields)
+        byte_data = decoder.data
+        length = int.from_bytes(byte_data[:4], byteorder='big') + int.from_bytes(byte_data[4:6], byteorder='big')
+        q_type = byte_data[13]
+        type_ = QTYPE_NAMES.get(q_type, q_type)
+        component = int.from_bytes(byte_data[6:8], byteorder='big')
+        command = int.from_bytes(byte_data[8:10], byteorder='big')
+        id_ = int.from_bytes(byte_data[11:13], byteorder='big')
+        if type_ in ("KeepAlive", "Pong"):
+            method = type_
+        else:
+            method = METHOD_NAMES.get((component, command)) or f"{Components.get(component, component)}.{command}"
+        if len(byte_data) > 16:
+            data, _ = decoder.read_struct(16)
+        else:
+            data = {}
+        return {'method': method, 'type': type_, 'id': id_, 'length': length, 'data': data}
 
-    @staticmethod
-    def write_float(value):
-        return struct.pack(">f", value).hex()
+    def encode(self) -> bytes:
+        encoder = BlazeEncoder()
+        encoder.write_struct(self.packet.get('data'), end=False)
+        body = encoder.buffer
+        length = len(body)
+
+        header = bytearray()
+        if length > 0xFFFFFFFF:
+            header += b"\xff\xff\xff\xff"
+            header += (length - 0xFFFFFFFF).to_bytes(2, byteorder="big")
+        else:
+            header += length.to_bytes(4, byteorder="big")
+            header += b"\x00\x00"
+        method = self.packet.get('method')
+        if method_header := METHOD_HEADERS.get(method):
+            header += method_header
+        else:
+            component, command = method.split(".")
+            header += int(component).to_bytes(2, byteorder="big") + int(command).to_bytes(2, byteorder="big")
+        header += self.packet.get("id", 0).to_bytes(3, byteorder="big")
+        header += b"\x00\x00\x00"
+        return bytes(header + body)
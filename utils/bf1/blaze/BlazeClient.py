@@ -1,5 +1,8 @@
+import asyncio
 import random
-from typing import Union
+from typing import Awaitable, Callable, Container, Union
+
+from loguru import logger
 
 from utils.bf1.blaze.BlazeSocket import BlazeSocket, BlazeServerREQ
 
@@ -22,6 +25,23 @@ class BlazeClient:
 class BlazeClientManager:
     def __init__(self):
         self.clients_by_pid = {}
+        self.index = 0
+
+    def get_pool_sockets(self) -> list[BlazeSocket]:
+        """所有已连接、已登录且未在等待关闭的连接"""
+        return [
+            client for client in self.clients_by_pid.values()
+            if client.connect and client.authenticated and not client.draining
+        ]
+
+    def get_idle_socket(self) -> Union[BlazeSocket, None]:
+        """从已登录的连接中选出等待响应最少的一个,数量相同时轮流选择"""
+        sockets = self.get_pool_sockets()
+        if not sockets:
+            return None
+        self.index = (self.index + 1) % len(sockets)
+        sockets = sockets[self.index:] + sockets[:self.index]
+        return min(sockets, key=lambda x: x.pending)
 
     async def get_socket_for_pid(self, pid=None) -> Union[BlazeSocket, None]:
         if not pid:
@@ -33,10 +53,12 @@ class BlazeClientManager:
 
         if pid in self.clients_by_pid:
             client = self.clients_by_pid[pid]
-            if client.connect:
+            if client.connect and not client.draining:
                 return client
-            await client.close()
             del self.clients_by_pid[pid]
+            # 等待关闭的连接由drain在请求完成后关闭
+            if not client.draining:
+                await client.close()
 
         new_client = BlazeClient()
         host, port = await BlazeServerREQ.get_server_address()
@@ -59,4 +81,155 @@ class BlazeClientManager:
             del self.clients_by_pid[pid]
 
 
+class GameDataBatcher:
+    """合并getGameDataFromId请求
+
+    window秒内发起的查询合并为一个GLST列表,超过max_batch个game_id时拆分为多个请求,
+    分别发往连接池中不同的连接并行等待,收到响应后按GID拆分给各个调用方。
+    合并的请求返回Error时无法确定是哪个game_id导致的,涉及的调用方各自单独重试。
+    """
+
+    def __init__(
+            self,
+            get_socket: Callable[[], Awaitable[Union[BlazeSocket, None]]],
+            window: float = 0.02,
+            max_batch: int = 16,
+            timeout: float = 60,
+            fields: Container[str] | None = None
+    ):
+        """
+        :param get_socket: 获取连接的函数,返回None表示没有可用连接
+        :param window: 合并请求的等待时间(秒)
+        :param max_batch: 单个请求中game_id的数量上限
+        :param timeout: 单个请求的超时时间(秒)
+        :param fields: 响应只解析这些标签的字段,为None时解析全部
+        """
+        self.get_socket = get_socket
+        self.window = window
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.fields = fields
+        self.pending: list[tuple[list[int], asyncio.Future]] = []
+        self.pending_ids: set[int] = set()
+        self.flush_handle: Union[asyncio.TimerHandle, None] = None
+        self.queries = 0
+        self.requests = 0
+
+    async def query(self, game_ids: list[int]) -> dict:
+        """
+        查询服务器数据
+        :return: 与直接请求相同结构的数据包,GDAT中只包含game_ids对应的服务器;请求出错时返回出错的数据包
+        """
+        if not game_ids:
+            # 没有需要查询的服务器,不发出请求
+            return {"method": "GameManager.getGameDataFromId", "type": "Result", "id": 0, "data": {"GDAT": []}}
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((game_ids, future))
+        self.pending_ids.update(game_ids)
+        self.queries += 1
+        if len(self.pending_ids) >= self.max_batch:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.window, self.flush)
+        return await future
+
+    def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        pending, self.pending = self.pending, []
+        game_ids, self.pending_ids = list(self.pending_ids), set()
+        if pending:
+            _ = asyncio.create_task(self.dispatch(pending, game_ids))
+
+    async def request(self, game_ids: list[int]) -> dict:
+        blaze_socket = await self.get_socket()
+        if not blaze_socket:
+            raise ConnectionError("没有可用的Blaze连接")
+        packet = {
+            "method": "GameManager.getGameDataFromId",
+            "type": "Command",
+            "data": {
+                "DNAM 1": "csFullGameList",
+                "GLST 40": game_ids,
+            }
+        }
+        self.requests += 1
+        try:
+            return await blaze_socket.send(packet, self.timeout, fields=self.fields)
+        except TimeoutError:
+            # 连接上还有其他请求在等待响应,不直接关闭,停止分配新请求并在其完成后关闭
+            _ = asyncio.create_task(blaze_socket.drain())
+            raise
+
+    async def dispatch(self, pending: list[tuple[list[int], asyncio.Future]], game_ids: list[int]):
+        try:
+            await self.split_results(pending, game_ids)
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+
+    @staticmethod
+    def is_failed(result) -> bool:
+        return not isinstance(result, dict) or result.get("type") == "Error"
+
+    async def retry(self, game_ids: list[int], future: asyncio.Future):
+        try:
+            result = await self.request(game_ids)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(result)
+
+    async def split_results(self, pending: list[tuple[list[int], asyncio.Future]], game_ids: list[int]):
+        chunks = [game_ids[i:i + self.max_batch] for i in range(0, len(game_ids), self.max_batch)]
+        results = await asyncio.gather(*(self.request(chunk) for chunk in chunks), return_exceptions=True)
+        # {game_id: 所在请求的序号}
+        chunk_index = {}
+        servers = {}
+        for index, (chunk, result) in enumerate(zip(chunks, results)):
+            for game_id in chunk:
+                chunk_index[game_id] = index
+            if not self.is_failed(result) and result.get("data"):
+                for server_data in result["data"].get("GDAT", []):
+                    servers[server_data["GID"]] = server_data
+        retries = []
+        for ids, future in pending:
+            if future.done():
+                continue
+            failed = [index for index in dict.fromkeys(chunk_index[game_id] for game_id in ids)
+                      if self.is_failed(results[index])]
+            if not failed:
+                origin = results[chunk_index[ids[0]]]
+                future.set_result({
+                    **origin,
+                    "data": {"GDAT": [servers[game_id] for game_id in dict.fromkeys(ids) if game_id in servers]}
+                })
+                continue
+            result = results[failed[0]]
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            elif all(set(chunks[index]) <= set(ids) for index in failed):
+                # 出错的请求中只有该调用方的game_id
+                future.set_result(result)
+            else:
+                retries.append((ids, future))
+        if retries:
+            logger.debug(f"Blaze合并查询返回错误, {len(retries)}个调用单独重试")
+            await asyncio.gather(*(self.retry(ids, future) for ids, future in retries))
+        if len(chunks) > 1 or len(pending) > 1:
+            logger.debug(f"Blaze合并查询: {len(pending)}个调用, {len(game_ids)}个服务器, {len(chunks)}个请求")
+
+    def get_stats(self) -> dict:
+        return {
+            "queries": self.queries,
+            "requests": self.requests,
+            "pending": len(self.pending),
+        }
+
+
 BlazeClientManagerInstance = BlazeClientManager()
@@ -1,11 +1,12 @@
 import asyncio
 import ssl
-from typing import Union
+import time
+from typing import Container, NamedTuple, Union
 
-import httpx
 from loguru import logger
 
 from utils.bf1.blaze.Blaze import Blaze, keepalive
+from utils.http_pool import get_http_pool
 
 context = ssl.create_default_context()
 context.check_hostname = False
@@ -45,31 +46,102 @@ class BlazeServerREQ:
             'defaultDnsAddress': 0
         }
         """
-        async with httpx.AsyncClient(verify=False) as client:
-            response = await client.post(
-                'https://spring18.gosredirector.ea.com:42230/redirector/getServerInstance',
-                headers={
-                    'Content-Type': 'application/xml',
-                    'Accept': 'application/json'
-                },
-                data=game_code
-            )
-            response.raise_for_status()
-            host = response.json()["address"]["ipAddress"]["hostname"]
-            port = response.json()["address"]["ipAddress"]["port"]
-            return host, port
+        response = await get_http_pool().get_client(verify=False).post(
+            'https://spring18.gosredirector.ea.com:42230/redirector/getServerInstance',
+            headers={
+                'Content-Type': 'application/xml',
+                'Accept': 'application/json'
+            },
+            content=game_code
+        )
+        response.raise_for_status()
+        host = response.json()["address"]["ipAddress"]["hostname"]
+        port = response.json()["address"]["ipAddress"]["port"]
+        return host, port
+
+
+class BlazeFrameDecoder:
+    """Blaze数据流分帧
+
+    每帧由16字节头部和数据组成,数据长度为头部前4字节与4~6字节之和。
+    收到的数据追加到缓冲区,每次取出所有完整的帧,不完整的尾部留在缓冲区等待后续数据。
+    已取出的数据只移动偏移量,超过compact_size后才整体前移,避免每帧都复制剩余数据。
+    """
+    header_length = 16
+
+    def __init__(self, max_frame_size: int = 16 * 1024 * 1024, compact_size: int = 64 * 1024):
+        """
+        :param max_frame_size: 单帧最大长度,超过时视为数据错位
+        :param compact_size: 已取出的数据超过该长度时清理缓冲区
+        """
+        self.max_frame_size = max_frame_size
+        self.compact_size = compact_size
+        self.buffer = bytearray()
+        self.offset = 0
+
+    def __len__(self):
+        """缓冲区中尚未取出的数据长度"""
+        return len(self.buffer) - self.offset
+
+    @staticmethod
+    def get_frame_length(header) -> int:
+        return int.from_bytes(header[:4], byteorder='big') + int.from_bytes(header[4:6], byteorder='big')
+
+    def feed(self, data: bytes) -> list[bytes]:
+        """
+        写入收到的数据
+        :return: 本次可以取出的所有完整帧
+        """
+        self.buffer += data
+        frames = []
+        with memoryview(self.buffer) as view:
+            while len(view) - self.offset >= self.header_length:
+                length = self.get_frame_length(view[self.offset:self.offset + 6])
+                if length > self.max_frame_size:
+                    self.reset()
+                    raise ValueError(f"Blaze数据帧长度{length}超出上限,数据可能已错位")
+                end = self.offset + self.header_length + length
+                if end > len(view):
+                    break
+                frames.append(bytes(view[self.offset:end]))
+                self.offset = end
+        if self.offset == len(self.buffer):
+            self.reset()
+        elif self.offset >= self.compact_size:
+            del self.buffer[:self.offset]
+            self.offset = 0
+        return frames
+
+    def reset(self):
+        self.buffer = bytearray()
+        self.offset = 0
+
+
+class PendingRequest(NamedTuple):
+    """等待响应的请求及其响应的解析选项"""
+    future: asyncio.Future
+    readable: bool = True
+    fields: Container[str] | None = None
 
 
 class BlazeSocket:
+    # 没有对应请求的数据包(通知、心跳等)的解析方式
     readable = True
+    # 心跳间隔及等待Pong的超时时间(秒)
+    keepalive_interval = 60
+    keepalive_timeout = 15
 
     def __init__(self, host: str, port: int, callback=None):
         self.callback = callback
         self.connect = False
-        self.finish = True
-        self.map = {}
+        self.map: dict[int, PendingRequest] = {}
+        # 是否已完成Authentication.login,只有已登录的连接可以放入连接池
+        self.authenticated = False
+        # 连接异常时不再分配新请求,等待已发出的请求完成后关闭
+        self.draining = False
+        self.last_receive = time.monotonic()
         self.id = 1
-        self.temp = {}
+        self.decoder = BlazeFrameDecoder()
         self.ssl_context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
         self.ssl_context.check_hostname = False
         self.ssl_context.verify_mode = ssl.CERT_NONE
@@ -98,43 +170,85 @@ class BlazeSocket:
     async def close(self):
         # 关闭连接
         self.connect = False
+        if not self.writer or self.writer.is_closing():
+            return
         self.writer.close()
-        await self.writer.wait_closed()
+        try:
+            await self.writer.wait_closed()
+        except (ConnectionError, ssl.SSLError) as e:
+            logger.debug(f"关闭Blaze连接时出错: {e}")
         logger.success(f"已断开与Blaze服务器 {self.host}:{self.port} 的连接")
 
+    async def drain(self, timeout: float = 60):
+        """停止接受新请求,等待已发出的请求完成或超时后关闭连接"""
+        if self.draining:
+            return
+        self.draining = True
+        deadline = time.monotonic() + timeout
+        while self.connect and self.map and time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+        await self.close()
+
+    @property
+    def pending(self) -> int:
+        """等待响应的请求数量"""
+        return len(self.map)
+
     async def keepalive(self):
+        # 定时发送Ping,超时未收到任何数据视为连接失效并关闭,连接池不会再选中该连接
         while self.connect:
-            await asyncio.sleep(60)
-            if self.writer:
+            await asyncio.sleep(self.keepalive_interval)
+            if not self.connect or not self.writer:
+                break
+            ping_time = time.monotonic()
+            try:
                 self.writer.write(keepalive)
+                await asyncio.wait_for(self.writer.drain(), self.keepalive_timeout)
+            except (asyncio.TimeoutError, ConnectionError, ssl.SSLError) as e:
+                logger.warning(f"Blaze心跳发送失败: {e}")
+                await self.close()
+                break
+            await asyncio.sleep(self.keepalive_timeout)
+            if self.connect and self.last_receive < ping_time:
+                logger.warning(f"Blaze连接{self.host}:{self.port}在{self.keepalive_timeout}秒内未响应心跳,已断开")
+                await self.close()
+
+    def next_id(self) -> int:
+        """下一个未被占用的请求id,头部中只解析2字节因此在1~65535内循环"""
+        while True:
+            id_ = self.id
+            self.id = self.id % 65535 + 1
+            if id_ not in self.map:
+                return id_
 
-    async def send(self, packet, timeout=60, readable: bool = True):
-        BlazeSocket.readable = readable
-        # 发送数据包
+    async def send(self, packet, timeout=60, readable: bool = True, fields: Container[str] | None = None):
+        """
+        发送数据包并等待响应
+        :param timeout: 等待响应的超时时间(秒)
+        :param readable: 响应的字段名是否只保留标签
+        :param fields: 响应只解析这些标签的字段,为None时解析全部
+        解析选项随请求保存,同一连接上的并发请求互不影响
+        """
         if not self.connect:
             raise ConnectionError("连接已关闭")
-        if self.id > 65535:
-            self.id = 1
         if isinstance(packet, bytes):
             packet = Blaze(packet).decode()
 
-        future = asyncio.Future()
-        if "id" not in packet:
-            packet["id"] = self.id
-            self.id += 1
-        if packet["id"] in self.map:
-            packet["id"] = self.id
-            self.id += 1
-        self.map[packet['id']] = future
-        self.id += 1
-        await self.request(packet)
+        future = asyncio.get_running_loop().create_future()
+        if "id" not in packet or packet["id"] in self.map:
+            packet["id"] = self.next_id()
+        self.map[packet['id']] = PendingRequest(future, readable, fields)
         try:
+            await self.request(packet)
             return await asyncio.wait_for(future, timeout)
         except asyncio.TimeoutError as e:
-            del self.map[packet['id']]
             raise TimeoutError(
                 f"Timeout waiting for response to packet ID: {packet['id']}"
             ) from e
+        finally:
+            # 超时或调用方取消时不再等待该id的响应
+            if (pending := self.map.get(packet['id'])) and pending.future is future:
+                del self.map[packet['id']]
 
     async def request(self, packet):
         # 请求数据包
@@ -148,42 +262,39 @@ class BlazeSocket:
             raise TypeError("packet must be dict or bytes")
 
     async def receive_data(self):
-        # 接收数据
+        # 接收数据,一次读取可能包含多个数据包或数据包的一部分
         while self.connect:
             try:
-                data = await self.reader.read(65565)
-            except ConnectionResetError:
-                self.connect = False
+                data = await self.reader.read(65536)
+            except (ConnectionResetError, ssl.SSLError) as e:
+                logger.error(f"Blaze连接异常: {e}")
                 break
             if not data:
-                self.connect = False
                 break
-            await self.concat(data)
-
-    async def concat(self, buffer):
-        if self.finish:
-            header = Blaze(buffer[:16]).decode()
-            # logger.debug(f"Header received: {header}")
-            if len(buffer) - 16 < header['length']:
-                self.temp['data'] = bytearray(header['length'] + 16)
-                self.temp['length'] = len(buffer)
-                self.temp['origin'] = header['length'] + 16
-                self.finish = False
-                self.temp['data'][:len(buffer)] = buffer
-            else:
-                await self.response(Blaze(buffer).decode(BlazeSocket.readable))
-                self.temp = {}
-        elif self.temp['length'] >= self.temp['origin']:
-            # 超长了
-            self.finish = True
-            self.temp = {}
-        else:
-            self.temp['data'][self.temp['length']:self.temp['length'] + len(buffer)] = buffer
-            self.temp['length'] += len(buffer)
-            if self.temp['length'] >= self.temp['origin']:
-                self.finish = True
-                await self.response(Blaze(self.temp['data']).decode(BlazeSocket.readable))
-                self.temp = {}
+            self.last_receive = time.monotonic()
+            try:
+                frames = self.decoder.feed(data)
+            except ValueError as e:
+                logger.error(e)
+                break
+            for frame in frames:
+                # 按头部中的id找到对应的请求,使用该请求的解析选项
+                pending = self.map.get(Blaze.get_id(frame))
+                try:
+                    if pending:
+                        packet = Blaze(frame).decode(pending.readable, pending.fields)
+                    else:
+                        packet = Blaze(frame).decode(BlazeSocket.readable)
+                except Exception as e:
+                    logger.error(f"Blaze数据包解析失败: {e}")
+                    continue
+                await self.response(packet)
+        self.connect = False
+        # 连接断开后等待中的请求不会再收到响应
+        for pending in self.map.values():
+            if not pending.future.done():
+                pending.future.set_exception(ConnectionError("连接已关闭"))
+        self.map.clear()
 
     async def response(self, packet):
         # 处理接收到的数据包
@@ -191,9 +302,9 @@ class BlazeSocket:
             return
         if packet['id'] in self.map:
             # logger.debug(f"Response received for packet ID: {packet['id']}")
-            future = self.map[packet['id']]
-            future.set_result(packet)
-            del self.map[packet['id']]
+            future = self.map.pop(packet['id']).future
+            if not future.done():
+                future.set_result(packet)
         elif packet['method'] == 'UserSessions.getPermissions':
             logger.error(f"用户登录信息已过期，请重新登录/连接！\n{packet}")
             await self.close()
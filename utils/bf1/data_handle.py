@@ -631,6 +631,11 @@ class BlazeData:
         "ro": "罗",
         "ar": "阿",
     }
+    # player_list_handle用到的字段,请求时只解析这些字段
+    player_list_fields = frozenset({
+        "GDAT", "GID", "GNAM", "ATTR", "CAP", "ROST", "ROLE", "PATT", "JGTS", "NAME", "PID", "EXID", "TIDX", "LOC",
+        "ERRC",
+    })
 
     @staticmethod
     def player_list_handle(data: dict) -> Union[dict, str]:
@@ -9,7 +9,6 @@ from io import BytesIO
 from pathlib import Path
 from typing import Union, Tuple
 
-import aiohttp
 import matplotlib.font_manager as fm
 import matplotlib.pyplot as plt
 import pandas as pd
@@ -23,6 +22,7 @@ from utils.bf1.data_handle import VehicleData, WeaponData
 from utils.bf1.default_account import BF1DA
 from utils.bf1.draw.choose_bg_pic import bg_pic
 from utils.bf1.map_team_info import MapData
+from utils.http_pool import get_http_pool
 
 BB_PREFIX = "https://eaassets-a.akamaihd.net/battlelog/battlebinary"
 # 整图大小
@@ -327,12 +327,11 @@ class PilImageUtils:
     @staticmethod
     async def read_img_by_url(url: str) -> Union[bytes, None]:
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as resp:
-                    if resp.status == 200:
-                        return await resp.read()
-                    logger.warning(f"读取图片失败，url: {url}")
-                    return None
+            async with get_http_pool().session.get(url) as resp:
+                if resp.status == 200:
+                    return await resp.read()
+                logger.warning(f"读取图片失败，url: {url}")
+                return None
         except TimeoutError:
             logger.warning(f"读取图片失败，url: {url}")
             return None
@@ -2322,17 +2321,16 @@ class PlayerListPic:
             logger.warning(e)
             i = 0
             while i < 3:
-                async with aiohttp.ClientSession() as session:
-                    # noinspection PyBroadException
-                    try:
-                        async with session.get(url, timeout=5, verify_ssl=False, proxy=proxy) as resp:
-                            pic = await resp.read()
-                            with open(file_name, 'wb') as fp:
-                                fp.write(pic)
-                            return file_name
-                    except Exception as e:
-                        logger.error(e)
-                        i += 1
+                # noinspection PyBroadException
+                try:
+                    async with get_http_pool().session.get(url, timeout=5, ssl=False, proxy=proxy) as resp:
+                        pic = await resp.read()
+                        with open(file_name, 'wb') as fp:
+                            fp.write(pic)
+                        return file_name
+                except Exception as e:
+                    logger.error(e)
+                    i += 1
             return None
 
     @staticmethod
@@ -4,11 +4,10 @@ import time
 import uuid
 from typing import Union
 
-import aiohttp
 from creart import create
-import httpx
 from loguru import logger
 from core.config import GlobalConfig
+from utils.http_pool import get_http_pool
 
 config = create(GlobalConfig)
 proxy = config.proxy if config.proxy != "proxy" else ""
@@ -227,7 +226,11 @@ class bf1_api(object):
             }
         }
         self.auto_login_count = 0
-        self.http_session = aiohttp.ClientSession()
+
+    @property
+    def http_session(self):
+        # 所有账号共用连接池,cookie在请求头中携带
+        return get_http_pool().session
 
     # api调用
     async def check_session_expire(self) -> bool:
@@ -344,8 +347,7 @@ class bf1_api(object):
             "X-Origin-Platform": "PCWIN"
         }
         try:
-            async with httpx.AsyncClient() as client:
-                response2 = await client.get(url2, headers=header2)
+            response2 = await get_http_pool().get_client().get(url2, headers=header2)
             authcode = response2.headers['location']
             authcode = authcode[authcode.rfind('=') + 1:]
             self.authcode = authcode
@@ -423,9 +425,8 @@ class bf1_api(object):
             'password': password,
             'bypass2fa': 'true',
         }
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, data=data) as response:
-                return await response.json()
+        async with get_http_pool().session.post(url, headers=headers, data=data) as response:
+            return await response.json()
 
     async def auto_login(self, pid):
         file_path = "utils/bf1/ap_info.json"
@@ -469,21 +470,22 @@ class bf1_api(object):
             'Accept-Language': 'zh-TW',
             'Cookie': f'remid={remid}; sid={sid}'
         }
-        response = await self.http_session.get(
+        # 只读取头部,需要及时释放连接
+        async with self.http_session.get(
             url=url,
             headers=header,
             timeout=10,
             allow_redirects=False,
             proxy=proxy
-        )
-        try:
-            authcode = response.headers['location']
-            return authcode[authcode.rfind('=') + 1:]
-        except Exception as e:
-            logger.error(e)
-            logger.error(await response.text())
-            logger.error(f"BF1账号{self.pid}登录获取authcode失败!")
-            return await response.text()
+        ) as response:
+            try:
+                authcode = response.headers['location']
+                return authcode[authcode.rfind('=') + 1:]
+            except Exception as e:
+                logger.error(e)
+                logger.error(await response.text())
+                logger.error(f"BF1账号{self.pid}登录获取authcode失败!")
+                return await response.text()
 
     async def Authentication_getEnvIdViaAuthCode(self, authcode) -> dict | str:
         """
@@ -503,7 +505,7 @@ class bf1_api(object):
         }
         header = {
             "Host": "sparta-gw.battlelog.com",
-            "Connection": "close",
+            "Connection": "keep-alive",
             "User-Agent": "ProtoHttp 1.3/DS 15.1.2.1.0 (Windows)",
             "X-Guest": "no-session-id",
             "X-ClientVersion": "release-bf1-lsu35_26385_ad7bf56a_tunguska_all_prod",
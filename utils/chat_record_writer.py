@@ -0,0 +1,164 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import jieba
+from loguru import logger
+
+from core.orm import orm
+from core.orm.tables import ChatRecord
+
+# 关闭 jieba 的 Debug log
+jieba.setLogLevel(jieba.logging.INFO)
+
+_writer: "ChatRecordWriter | None" = None
+
+
+def get_chat_record_writer() -> "ChatRecordWriter":
+    global _writer
+    if _writer is None:
+        _writer = ChatRecordWriter()
+    return _writer
+
+
+def segment(contents: list[str]) -> list[str]:
+    """分词,在线程池中执行"""
+    return ["|".join(jieba.lcut(content)) if content else "" for content in contents]
+
+
+class ChatRecordWriter:
+    """聊天记录缓冲写入器
+
+    消息先进入有界队列,后台任务每攒够batch_size条或距本批第一条超过flush_interval秒时,
+    在线程池中统一分词,再以一次批量写入落库。队列满时生产者等待(背压),关闭时会写完队列中剩余的记录。
+    批量写入在同一个事务内,失败时整批重试,仍失败则对半拆分写入,只丢弃本身无法写入的记录。
+    """
+
+    def __init__(
+            self,
+            max_queue_size: int = 5000,
+            batch_size: int = 200,
+            flush_interval: float = 0.5,
+            max_retries: int = 2,
+            retry_interval: float = 0.5
+    ):
+        """
+        :param max_queue_size: 队列长度上限
+        :param batch_size: 单次写入的最大条数
+        :param flush_interval: 单批最长等待时间(秒)
+        :param max_retries: 整批写入失败后的重试次数
+        :param retry_interval: 首次重试前的等待时间(秒),之后每次翻倍
+        """
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_interval = retry_interval
+        self.queue: asyncio.Queue | None = None
+        self.task: asyncio.Task | None = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat_recorder")
+        # 背压指标
+        self.enqueued = 0
+        self.written = 0
+        self.failed = 0
+        self.retried = 0
+        self.blocked = 0
+        self.high_watermark = 0
+
+    def start(self):
+        if self.task and not self.task.done():
+            return
+        if self.task:
+            if self.task.cancelled():
+                logger.warning("聊天记录写入任务已被取消,重新启动")
+            elif e := self.task.exception():
+                logger.error(f"聊天记录写入任务异常退出,重新启动: {e!r}")
+        # 保留原有队列,其中尚未写入的记录由新任务继续写入
+        if self.queue is None:
+            self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self.task = asyncio.create_task(self.run())
+
+    async def put(self, record: dict):
+        """
+        加入待写入队列,队列已满时等待
+        :param record: ChatRecord的数据,其中content为待分词的纯文本
+        """
+        self.start()
+        if self.queue.full():
+            self.blocked += 1
+        await self.queue.put(record)
+        self.enqueued += 1
+        self.high_watermark = max(self.high_watermark, self.queue.qsize())
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            record = await self.queue.get()
+            if record is None:
+                break
+            batch = [record]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                if (timeout := deadline - loop.time()) <= 0:
+                    break
+                try:
+                    record = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if record is None:
+                    stopping = True
+                    break
+                batch.append(record)
+            await self.flush(batch)
+
+    async def flush(self, batch: list[dict]):
+        contents = [record.pop("content") for record in batch]
+        try:
+            seg_list = await asyncio.get_running_loop().run_in_executor(self.executor, segment, contents)
+        except Exception as e:
+            # 分词失败不影响聊天记录本身
+            logger.error(f"聊天记录分词失败({len(batch)}条): {e}")
+            seg_list = [""] * len(batch)
+        for record, seg in zip(batch, seg_list):
+            record["seg"] = seg
+        await self.write(batch, self.max_retries)
+
+    async def write(self, batch: list[dict], retries: int = 0):
+        """写入一批记录,失败时重试retries次,仍失败则对半拆分,单条仍失败时丢弃"""
+        for attempt in range(retries + 1):
+            try:
+                await orm.add_batch(table=ChatRecord, data_list=batch)
+                self.written += len(batch)
+                return
+            except Exception as e:
+                error = e
+            if attempt < retries:
+                self.retried += 1
+                await asyncio.sleep(self.retry_interval * 2 ** attempt)
+        if len(batch) > 1:
+            middle = len(batch) // 2
+            await self.write(batch[:middle])
+            await self.write(batch[middle:])
+            return
+        self.failed += 1
+        logger.error(f"写入聊天记录失败,已丢弃: {error}\n{batch[0]}")
+
+    async def stop(self):
+        """写完队列中剩余的记录后停止"""
+        if not self.task or self.task.done():
+            return
+        await self.queue.put(None)
+        await self.task
+        logger.info(f"聊天记录写入器已停止: {self.get_stats()}")
+
+    def get_stats(self) -> dict:
+        return {
+            "queue_size": self.queue.qsize() if self.queue else 0,
+            "max_queue_size": self.max_queue_size,
+            "high_watermark": self.high_watermark,
+            "blocked": self.blocked,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "failed": self.failed,
+            "retried": self.retried,
+        }
@@ -0,0 +1,223 @@
+import time
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+
+import aiohttp
+import httpx
+from creart import create
+from launart import Launart, Launchable
+from loguru import logger
+
+from core.config import GlobalConfig
+from core.models.metrics_model import LatencyHistogram
+
+_http_pool: "HttpClientPool | None" = None
+
+
+def get_http_pool() -> "HttpClientPool":
+    global _http_pool
+    if _http_pool is None:
+        config = create(GlobalConfig)
+        _http_pool = HttpClientPool(limit=config.http_limit, limit_per_host=config.http_limit_per_host)
+    return _http_pool
+
+
+class RejectCookieJar(CookieJar):
+    """不保存任何cookie的CookieJar
+
+    策略拒绝所有域名,httpx按策略提取响应中的cookie时全部丢弃;
+    curl_cffi直接调用set_cookie写入响应的cookie而不检查策略,因此同时忽略set_cookie。
+    """
+
+    def __init__(self):
+        super().__init__(policy=DefaultCookiePolicy(allowed_domains=[]))
+
+    def set_cookie(self, cookie):
+        return
+
+
+class HttpClientPool(Launchable):
+    """共享的HTTP连接池
+
+    所有请求共用一个aiohttp.ClientSession和按verify区分的httpx.AsyncClient,
+    连接在请求间保持并复用,避免每次请求都重新解析DNS和进行TLS握手。
+    aiohttp缓存DNS,连接数上限默认不限制:调用处的timeout包含等待空闲连接的时间,
+    多账号并发请求同一主机(如sparta-gw)时设置上限会使原本不会超时的请求超时。
+    需要模拟浏览器TLS指纹的请求(如tracker.gg)使用共享的curl_cffi会话。
+    不同账号共用连接池,因此各客户端均不保存cookie,需要cookie的请求自行在头部或参数中携带。
+    """
+    id = "umaru.core.http_pool"
+
+    def __init__(
+        self,
+        limit: int = 0,
+        limit_per_host: int = 0,
+        keepalive_timeout: float = 30,
+        dns_cache_ttl: int = 300
+    ):
+        """
+        :param limit: 连接总数上限,0为不限制
+        :param limit_per_host: 单个主机的连接数上限(aiohttp),0为不限制
+        :param keepalive_timeout: 空闲连接的保持时间(秒)
+        :param dns_cache_ttl: DNS缓存时间(秒)
+        """
+        super().__init__()
+        global _http_pool
+        _http_pool = self
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self._session: aiohttp.ClientSession | None = None
+        self._clients: dict[bool, httpx.AsyncClient] = {}
+        self._curl_session = None
+        self.requests = 0
+        self.errors = 0
+        self.connections = 0
+        self.reused = 0
+        self.dns_hits = 0
+        self.dns_misses = 0
+        self.httpx_requests = 0
+        self.httpx_connections = 0
+        self.curl_requests = 0
+        self.latency = LatencyHistogram()
+
+    @property
+    def required(self):
+        return set()
+
+    @property
+    def stages(self):
+        return {"blocking", "cleanup"}
+
+    async def launch(self, mgr: Launart):
+        async with self.stage("blocking"):
+            await mgr.status.wait_for_sigexit()
+        async with self.stage("cleanup"):
+            await self.close()
+
+    def get_trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(_, context, __):
+            context.start = time.perf_counter()
+            self.requests += 1
+
+        async def on_request_end(_, context, __):
+            self.latency.observe(time.perf_counter() - context.start)
+
+        async def on_request_exception(*_):
+            self.errors += 1
+
+        async def on_connection_create_end(*_):
+            self.connections += 1
+
+        async def on_connection_reuseconn(*_):
+            self.reused += 1
+
+        async def on_dns_cache_hit(*_):
+            self.dns_hits += 1
+
+        async def on_dns_cache_miss(*_):
+            self.dns_misses += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_request_exception.append(on_request_exception)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace_config
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """共享的aiohttp会话,不要关闭或用async with包裹"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                cookie_jar=aiohttp.DummyCookieJar(),
+                trace_configs=[self.get_trace_config()],
+            )
+        return self._session
+
+    async def httpx_trace(self, event_name: str, _):
+        if event_name == "connection.connect_tcp.complete":
+            self.httpx_connections += 1
+
+    async def on_httpx_request(self, request: httpx.Request):
+        self.httpx_requests += 1
+        request.extensions["trace"] = self.httpx_trace
+
+    def get_client(self, verify: bool = True) -> httpx.AsyncClient:
+        """共享的httpx客户端,不要关闭或用async with包裹"""
+        client = self._clients.get(verify)
+        if client is None or client.is_closed:
+            client = self._clients[verify] = httpx.AsyncClient(
+                verify=verify,
+                limits=httpx.Limits(
+                    max_connections=self.limit or None,
+                    max_keepalive_connections=self.limit or None,
+                    keepalive_expiry=self.keepalive_timeout
+                ),
+                event_hooks={"request": [self.on_httpx_request]},
+                cookies=RejectCookieJar(),
+            )
+        return client
+
+    @property
+    def curl_session(self):
+        """共享的curl_cffi会话,用于需要浏览器指纹的请求,不要关闭或用async with包裹"""
+        if self._curl_session is None:
+            # curl_cffi只有部分插件使用,用到时再导入
+            from curl_cffi.requests import AsyncSession
+            self._curl_session = AsyncSession(max_clients=self.limit_per_host or 10, cookies=RejectCookieJar())
+        self.curl_requests += 1
+        return self._curl_session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        for client in self._clients.values():
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.debug(f"关闭httpx客户端失败: {e}")
+        self._clients.clear()
+        if self._curl_session is not None:
+            try:
+                await self._curl_session.close()
+            except Exception as e:
+                logger.debug(f"关闭curl_cffi会话失败: {e}")
+            self._curl_session = None
+
+    def get_stats(self) -> dict:
+        requests = self.requests + self.httpx_requests
+        connections = self.connections + self.httpx_connections
+        return {
+            "requests": requests,
+            "connections": connections,
+            # 没有新建连接的请求均复用了已有连接
+            "reuse_rate": max(requests - connections, 0) / requests if requests else 0.0,
+            "aiohttp": {
+                "requests": self.requests,
+                "errors": self.errors,
+                "connections": self.connections,
+                "reused": self.reused,
+                "dns_hits": self.dns_hits,
+                "dns_misses": self.dns_misses,
+            },
+            "httpx": {
+                "requests": self.httpx_requests,
+                "connections": self.httpx_connections,
+            },
+            "curl_cffi": {
+                "requests": self.curl_requests,
+            },
+            "latency": self.latency.get_stats(),
+        }
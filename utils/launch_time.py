@@ -1,4 +1,5 @@
 import os
+import time
 from datetime import datetime
 from typing import Literal
 
@@ -13,11 +14,52 @@ _code_map: dict[int, str] = {
 
 _launch_time: dict[str, tuple[float, Literal[0, 1]]] = {}
 
+_phase_time: dict[str, float] = {}
+
+_first_response_time: float | None = None
+
 
 def add_launch_time(module: str, _time: float, status: Literal[0, 1]):
     _launch_time[module] = (_time, status)
 
 
+def add_phase_time(phase: str, _time: float):
+    """记录账号初始化各阶段的耗时"""
+    _phase_time[phase] = _time
+
+
+def get_phase_time() -> dict[str, float]:
+    return dict(_phase_time)
+
+
+def record_first_response():
+    """记录从进程启动到首次回复消息的耗时,只记录一次"""
+    global _first_response_time
+    if _first_response_time is not None:
+        return
+    _first_response_time = time.time() - psutil.Process(os.getpid()).create_time()
+    logger.opt(colors=True).success(
+        f"<red>首次响应耗时 </red><yellow>{_first_response_time:.3f}</yellow> <red>秒</red>"
+    )
+
+
+def get_first_response_time() -> float | None:
+    return _first_response_time
+
+
+def log_phase_time():
+    if not _phase_time:
+        return
+    name_length = max(len(phase) for phase in _phase_time.keys())
+    top = (
+        f"\n\n<red>初始化总耗时 </red><yellow>{sum(_phase_time.values()):.6f}</yellow> <red>秒</red>\n\n"
+        f"<red>{'阶段':<{name_length}}</red> | <yellow>耗时</yellow>\n"
+    )
+    for phase, _time in _phase_time.items():
+        top += f"<red>{phase:<{name_length}}</red> | <yellow>{_time:.6f}</yellow> <red>s</red>\n"
+    logger.opt(colors=True).success(top)
+
+
 class LaunchTimeService(Launchable):
     id = "sagiri.core.launch_time"
 
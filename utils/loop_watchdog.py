@@ -0,0 +1,138 @@
+import asyncio
+import heapq
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from launart import Launart, Launchable
+from loguru import logger
+
+_watchdog: "LoopWatchdogService | None" = None
+
+
+def get_loop_watchdog() -> "LoopWatchdogService | None":
+    return _watchdog
+
+
+class LoopWatchdogService(Launchable):
+    """事件循环卡顿检测
+
+    事件循环内的心跳任务每interval秒记录一次时间并计算延迟,
+    后台线程发现心跳超过threshold秒未更新时抓取事件循环线程的调用栈,
+    心跳恢复后记录本次卡顿的时长,保留最近和最严重的卡顿记录。
+    """
+    id = "umaru.core.loop_watchdog"
+
+    def __init__(self, threshold: float = 0.2, interval: float = 0.05, max_records: int = 20):
+        """
+        :param threshold: 事件循环超过该时长(秒)未响应视为卡顿
+        :param interval: 心跳间隔(秒)
+        :param max_records: 保留的卡顿记录数量
+        """
+        super().__init__()
+        global _watchdog
+        _watchdog = self
+        self.threshold = threshold
+        self.interval = interval
+        self.max_records = max_records
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.loop_thread_id: int | None = None
+        self.last_beat = time.perf_counter()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.current_stall: dict | None = None
+        self.recent: deque[dict] = deque(maxlen=max_records)
+        # 最小堆,只保留时长最长的max_records条
+        self.worst: list[tuple[float, int, dict]] = []
+        self.stall_count = 0
+        self.lag = 0.0
+        self.max_lag = 0.0
+
+    @property
+    def required(self):
+        return set()
+
+    @property
+    def stages(self):
+        return {"preparing", "blocking", "cleanup"}
+
+    async def launch(self, mgr: Launart):
+        async with self.stage("preparing"):
+            self.loop = asyncio.get_running_loop()
+            self.loop_thread_id = threading.get_ident()
+            self.last_beat = time.perf_counter()
+            threading.Thread(target=self.watch, name="loop_watchdog", daemon=True).start()
+        async with self.stage("blocking"):
+            heartbeat_task = asyncio.create_task(self.heartbeat())
+            await mgr.status.wait_for_sigexit()
+        async with self.stage("cleanup"):
+            heartbeat_task.cancel()
+            self.stop_event.set()
+
+    async def heartbeat(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            self.lag = max(now - expected, 0.0)
+            self.max_lag = max(self.max_lag, self.lag)
+            with self.lock:
+                self.last_beat = now
+                stall, self.current_stall = self.current_stall, None
+            if stall:
+                stall["duration"] = self.lag
+                self.add_record(stall)
+
+    def watch(self):
+        """在后台线程中运行"""
+        while not self.stop_event.wait(self.interval):
+            with self.lock:
+                if self.current_stall or time.perf_counter() - self.last_beat < self.threshold:
+                    continue
+                self.current_stall = self.capture()
+
+    def capture(self) -> dict:
+        """抓取事件循环线程当前的调用栈和正在执行的任务"""
+        frame = sys._current_frames().get(self.loop_thread_id)
+        task = asyncio.tasks._current_tasks.get(self.loop)
+        return {
+            "time": time.time(),
+            "duration": 0.0,
+            "task": task.get_name() if task else None,
+            "coro": getattr(task.get_coro(), "__qualname__", repr(task.get_coro())) if task else None,
+            "stack": [line.rstrip() for line in traceback.format_stack(frame)[-10:]] if frame else [],
+        }
+
+    def add_record(self, record: dict):
+        self.stall_count += 1
+        self.recent.append(record)
+        item = (record["duration"], self.stall_count, record)
+        if len(self.worst) < self.max_records:
+            heapq.heappush(self.worst, item)
+        else:
+            heapq.heappushpop(self.worst, item)
+        location = record["stack"][-1].splitlines()[0].strip() if record["stack"] else "未知位置"
+        logger.warning(
+            f"[卡顿检测] 事件循环阻塞{record['duration'] * 1000:.0f}ms, 任务:{record['coro'] or record['task']}, {location}"
+        )
+
+    def get_worst(self, limit: int | None = None) -> list[dict]:
+        return [item[2] for item in heapq.nlargest(limit or self.max_records, self.worst)]
+
+    def get_stats(self, with_stack: bool = False) -> dict:
+        """
+        :param with_stack: 是否包含调用栈,调用栈含有源码路径和代码内容,不应通过HTTP接口返回
+        """
+        def strip(record: dict) -> dict:
+            return record if with_stack else {key: value for key, value in record.items() if key != "stack"}
+
+        return {
+            "threshold": self.threshold,
+            "lag": self.lag,
+            "max_lag": self.max_lag,
+            "stall_count": self.stall_count,
+            "recent": [strip(record) for record in self.recent],
+            "worst": [strip(record) for record in self.get_worst()],
+        }
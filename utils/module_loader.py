@@ -0,0 +1,147 @@
+import ast
+import importlib
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+
+# 插件监听这些事件时必须在启动时加载,否则会错过事件
+LIFECYCLE_EVENTS = {"ApplicationLaunched", "ApplicationLaunch", "AccountLaunch"}
+# graia-scheduler只在启动时运行已注册的定时任务,之后注册的任务不会执行,因此定时任务插件同样需要立即加载
+SCHEDULER_NAMES = {"SchedulerSchema", "timers"}
+
+
+@dataclass
+class ModuleInfo:
+    """插件模块的静态分析结果"""
+    name: str
+    # 插件及其引用的项目内模块在顶层导入的第三方模块
+    dependencies: set[str] = field(default_factory=set)
+    # 是否监听了生命周期事件
+    lifecycle: bool = False
+    # 是否注册了定时任务
+    scheduled: bool = False
+
+    @property
+    def eager(self) -> bool:
+        """是否需要在启动时加载"""
+        return self.lifecycle or self.scheduled
+
+
+def is_local(module_name: str) -> bool:
+    """是否为项目内的模块(以运行目录为根)"""
+    top = module_name.split(".")[0]
+    return Path(top).is_dir() or Path(f"{top}.py").is_file()
+
+
+def get_module_file(module_name: str) -> Path | None:
+    path = Path(*module_name.split("."))
+    if (path / "__init__.py").is_file():
+        return path / "__init__.py"
+    if path.with_suffix(".py").is_file():
+        return path.with_suffix(".py")
+    return None
+
+
+def get_package(file: Path) -> list[str]:
+    return list(file.with_suffix("").parts[:-1])
+
+
+def iter_top_level(tree: ast.AST):
+    """遍历模块顶层执行的语句,不进入函数体"""
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        yield node
+        for child in ast.iter_child_nodes(node):
+            if not isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+                stack.append(child)
+
+
+@lru_cache(maxsize=None)
+def parse_file(file: Path) -> tuple[set[str], set[str], set[str]]:
+    """
+    :return: (第三方模块, 项目内模块, 出现的名称)
+    """
+    external, internal, names = set(), set(), set()
+    try:
+        tree = ast.parse(file.read_text(encoding="utf-8"))
+    except (OSError, SyntaxError, UnicodeDecodeError):
+        return external, internal, names
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            names.add(node.id)
+        elif isinstance(node, ast.Attribute):
+            names.add(node.attr)
+        elif isinstance(node, ast.alias):
+            names.add(node.name.split(".")[-1])
+    for node in iter_top_level(tree):
+        targets = []
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if is_local(alias.name):
+                    internal.add(alias.name)
+                elif alias.name.split(".")[0] not in sys.stdlib_module_names:
+                    external.add(alias.name)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                package = get_package(file)
+                base = package[:len(package) - node.level + 1]
+                module = ".".join(base + ([node.module] if node.module else []))
+                # from . import xxx 可能导入的是子模块
+                targets = [module] + [f"{module}.{alias.name}" for alias in node.names]
+            elif node.module:
+                targets = [node.module] + [f"{node.module}.{alias.name}" for alias in node.names]
+        for target in targets:
+            if is_local(target):
+                internal.add(target)
+        # 第三方模块只导入from后的模块,导入的名称大多不是子模块
+        if targets and not is_local(targets[0]) and targets[0].split(".")[0] not in sys.stdlib_module_names:
+            external.add(targets[0])
+    return external, internal, names
+
+
+def inspect_module(module_name: str) -> ModuleInfo:
+    """分析插件及其引用的项目内模块,得到需要预加载的第三方模块"""
+    info = ModuleInfo(module_name)
+    path = Path(*module_name.split("."))
+    files = list(path.rglob("*.py")) if path.is_dir() else [path.with_suffix(".py")]
+    module_files = set(files)
+    visited = {file.resolve() for file in files}
+    while files:
+        file = files.pop()
+        external, internal, names = parse_file(file)
+        info.dependencies |= external
+        # 只有插件本身的生命周期监听和定时任务需要立即加载
+        if file in module_files and names & LIFECYCLE_EVENTS:
+            info.lifecycle = True
+        if file in module_files and names & SCHEDULER_NAMES:
+            info.scheduled = True
+        for module in internal:
+            if (module_file := get_module_file(module)) and module_file.resolve() not in visited:
+                visited.add(module_file.resolve())
+                files.append(module_file)
+    return info
+
+
+def import_quietly(module_name: str):
+    try:
+        importlib.import_module(module_name)
+    except Exception:
+        # 加载失败时交由saya.require报错
+        pass
+
+
+def preload_dependencies(module_names: set[str], max_workers: int = 4) -> float:
+    """
+    在线程池中并行导入第三方依赖,之后saya.require时直接使用sys.modules中的模块
+    :return: 耗时(秒)
+    """
+    start = time.perf_counter()
+    module_names = {name for name in module_names if name not in sys.modules}
+    if module_names:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="module_loader") as executor:
+            list(executor.map(import_quietly, sorted(module_names)))
+    return time.perf_counter() - start
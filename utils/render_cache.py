@@ -0,0 +1,157 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Hashable
+
+from loguru import logger
+
+
+class RenderCache(object):
+    """按内容寻址的渲染结果缓存
+
+    以渲染参数的sha256作为键,内存中按LRU淘汰,可选同时写入磁盘。
+    tag用于按群等维度失效: 同一tag的版本号变化时,丢弃该tag下的所有内存缓存。
+    磁盘缓存只依赖内容哈希,参数不变则结果不变,因此无需失效,仅按数量清理。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 128,
+        max_bytes: int = 64 * 1024 * 1024,
+        cache_dir: Path | None = None,
+        max_disk_entries: int = 512
+    ):
+        """
+        :param max_entries: 内存中最多缓存的图片数量
+        :param max_bytes: 内存中缓存的图片总大小上限
+        :param cache_dir: 磁盘缓存目录,为None时不写入磁盘
+        :param max_disk_entries: 磁盘中最多缓存的图片数量
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_entries = max_disk_entries
+        self.entries: OrderedDict[str, bytes] = OrderedDict()
+        self.size = 0
+        # {tag: (版本号, {内容哈希})}
+        self.tags: dict[Hashable, tuple[Hashable, set[str]]] = {}
+        # 同一内容同时只渲染一次
+        self.rendering: dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(str(part).encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def invalidate(self, tag: Hashable):
+        """丢弃tag下的所有内存缓存"""
+        _, keys = self.tags.pop(tag, (None, set()))
+        for key in keys:
+            if (data := self.entries.pop(key, None)) is not None:
+                self.size -= len(data)
+        self.invalidations += 1
+
+    def check_version(self, tag: Hashable, version: Hashable):
+        if tag in self.tags and self.tags[tag][0] != version:
+            self.invalidate(tag)
+        self.tags.setdefault(tag, (version, set()))
+
+    def put(self, key: str, data: bytes, tag: Hashable | None = None):
+        if (old := self.entries.pop(key, None)) is not None:
+            self.size -= len(old)
+        self.entries[key] = data
+        self.size += len(data)
+        if tag is not None and tag in self.tags:
+            self.tags[tag][1].add(key)
+        while self.entries and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+            _, data = self.entries.popitem(last=False)
+            self.size -= len(data)
+
+    def get(self, key: str) -> bytes | None:
+        if (data := self.entries.get(key)) is not None:
+            self.entries.move_to_end(key)
+        return data
+
+    def read_disk(self, key: str) -> bytes | None:
+        path = self.cache_dir / key
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        return data
+
+    def write_disk(self, key: str, data: bytes):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        temp_path = self.cache_dir / f"{key}.tmp"
+        temp_path.write_bytes(data)
+        os.replace(temp_path, self.cache_dir / key)
+        files = [path for path in self.cache_dir.iterdir() if not path.name.endswith(".tmp")]
+        if len(files) > self.max_disk_entries:
+            files.sort(key=lambda x: x.stat().st_mtime)
+            for path in files[:len(files) - self.max_disk_entries]:
+                path.unlink(missing_ok=True)
+
+    async def get_or_render(
+        self,
+        key: str,
+        render: Callable[[], Awaitable[bytes]],
+        tag: Hashable | None = None,
+        version: Hashable = None
+    ) -> bytes:
+        """
+        获取缓存,不存在时调用render渲染并写入缓存
+        :param key: make_key生成的内容哈希
+        :param render: 渲染函数
+        :param tag: 失效维度,如群号
+        :param version: tag当前的版本号,与缓存时不同则先失效该tag
+        """
+        if tag is not None:
+            self.check_version(tag, version)
+        if (data := self.get(key)) is not None:
+            self.hits += 1
+            if tag is not None:
+                self.tags[tag][1].add(key)
+            return data
+        if not (task := self.rendering.get(key)):
+            # 在独立的任务中渲染,发起渲染的调用方被取消时不影响其他等待同一内容的调用方
+            task = self.rendering[key] = asyncio.create_task(self.load(key, render, tag))
+            task.add_done_callback(lambda _: self.rendering.pop(key, None))
+            # 避免无人等待时出现Task exception was never retrieved
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return await asyncio.shield(task)
+
+    async def load(self, key: str, render: Callable[[], Awaitable[bytes]], tag: Hashable | None = None) -> bytes:
+        """从磁盘缓存读取,不存在时渲染,结果写入缓存"""
+        data = await asyncio.to_thread(self.read_disk, key) if self.cache_dir else None
+        if data is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            data = await render()
+            if self.cache_dir:
+                try:
+                    await asyncio.to_thread(self.write_disk, key, data)
+                except OSError as e:
+                    logger.warning(f"写入渲染缓存失败: {e}")
+        self.put(key, data, tag)
+        return data
+
+    def get_stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,198 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from graiax.playwright import PlaywrightBrowser
+from graiax.text2img.playwright.renderer import BuiltinCSS
+from launart import Launart, Launchable
+from loguru import logger
+from playwright.async_api import Page
+
+from core.models.metrics_model import LatencyHistogram
+
+RENDER_CSS = "\n".join(
+    (
+        BuiltinCSS.reset.value,
+        BuiltinCSS.github.value,
+        BuiltinCSS.one_dark.value,
+        BuiltinCSS.container.value,
+        "body {padding: 0 !important}",
+    )
+)
+DEFAULT_PAGE_OPTION = {"viewport": {"width": 1000, "height": 10}, "device_scale_factor": 1.5}
+
+_render_pool: "RenderPagePool | None" = None
+
+
+def get_render_pool() -> "RenderPagePool":
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = RenderPagePool()
+    return _render_pool
+
+
+class RenderPagePool(Launchable):
+    """渲染页面池
+
+    按页面参数(viewport、device_scale_factor、proxy等)缓存空闲页面,渲染时复用而不是每次新建页面和上下文,
+    同时渲染的页面数量由信号量限制。启动时按默认参数预先创建若干页面,省去首次渲染时创建页面和启动渲染进程的耗时。
+    每次渲染都以set_content加载完整文档,CSS随文档一起重新解析,复用页面并不省去这部分耗时。
+    """
+    id = "umaru.core.render_pool"
+
+    def __init__(
+        self,
+        max_pages: int = 4,
+        max_idle: int = 8,
+        max_uses: int = 200,
+        warm_up: int = 2,
+        style: str = RENDER_CSS
+    ):
+        """
+        :param max_pages: 同时渲染的页面数量上限
+        :param max_idle: 保留的空闲页面数量上限,超出时关闭最久未使用的页面
+        :param max_uses: 单个页面的最大复用次数,超出后关闭重建
+        :param warm_up: 启动时预热的页面数量
+        :param style: 每次渲染时加载的CSS
+        """
+        super().__init__()
+        global _render_pool
+        _render_pool = self
+        self.max_pages = max_pages
+        self.max_idle = max_idle
+        self.max_uses = max_uses
+        self.warm_up = warm_up
+        self.head = (
+            '<html><head><meta name="viewport" content="width=device-width,initial-scale=1.0">'
+            f"<style>{style}</style></head><body>"
+        )
+        self.browser: PlaywrightBrowser | None = None
+        self.semaphore = asyncio.Semaphore(max_pages)
+        # {页面参数: [空闲页面]},按最近使用排序
+        self.idle: OrderedDict[str, list[Page]] = OrderedDict()
+        self.idle_count = 0
+        self.uses: dict[Page, int] = {}
+        self.in_use = 0
+        self.created = 0
+        self.hits = 0
+        self.misses = 0
+        self.latency = LatencyHistogram()
+
+    @property
+    def required(self):
+        return {"web.render/playwright"}
+
+    @property
+    def stages(self):
+        return {"preparing", "blocking", "cleanup"}
+
+    async def launch(self, mgr: Launart):
+        async with self.stage("preparing"):
+            self.browser = mgr.get_interface(PlaywrightBrowser)
+            try:
+                pages = await asyncio.gather(*(self.new_page(DEFAULT_PAGE_OPTION) for _ in range(self.warm_up)))
+                for page in pages:
+                    await self.release(self.get_key(DEFAULT_PAGE_OPTION), page)
+            except Exception as e:
+                logger.warning(f"渲染页面预热失败: {e}")
+        async with self.stage("blocking"):
+            await mgr.status.wait_for_sigexit()
+        async with self.stage("cleanup"):
+            await self.close_all()
+
+    @staticmethod
+    def get_key(page_option: dict) -> str:
+        return json.dumps(page_option, sort_keys=True)
+
+    async def new_page(self, page_option: dict) -> Page:
+        browser = self.browser or Launart.current().get_interface(PlaywrightBrowser)
+        page = await browser.new_page(**page_option)
+        # 加载一次空文档,使渲染进程在首次渲染前启动
+        await page.set_content(f"{self.head}</body></html>")
+        self.uses[page] = 0
+        self.created += 1
+        return page
+
+    def take_idle(self, key: str) -> Page | None:
+        pages = self.idle.get(key)
+        page = None
+        while pages and page is None:
+            page = pages.pop()
+            self.idle_count -= 1
+            if page.is_closed():
+                self.uses.pop(page, None)
+                page = None
+        if pages is not None and not pages:
+            del self.idle[key]
+        return page
+
+    async def release(self, key: str, page: Page):
+        self.idle.setdefault(key, []).append(page)
+        self.idle.move_to_end(key)
+        self.idle_count += 1
+        while self.idle_count > self.max_idle:
+            oldest_key, pages = next(iter(self.idle.items()))
+            oldest = pages.pop(0)
+            if not pages:
+                del self.idle[oldest_key]
+            self.idle_count -= 1
+            await self.close_page(oldest)
+
+    async def close_page(self, page: Page):
+        self.uses.pop(page, None)
+        try:
+            await page.close()
+        except Exception as e:
+            logger.debug(f"关闭渲染页面失败: {e}")
+
+    async def close_all(self):
+        pages = [page for pages in self.idle.values() for page in pages]
+        self.idle.clear()
+        self.idle_count = 0
+        for page in pages:
+            await self.close_page(page)
+
+    @asynccontextmanager
+    async def page(self, page_option: dict):
+        """从池中取出一个页面,使用后放回;使用中出现异常的页面会直接关闭"""
+        key = self.get_key(page_option)
+        async with self.semaphore:
+            if page := self.take_idle(key):
+                self.hits += 1
+            else:
+                self.misses += 1
+                page = await self.new_page(page_option)
+            self.in_use += 1
+            reusable = False
+            try:
+                yield page
+                reusable = True
+            finally:
+                self.in_use -= 1
+                self.uses[page] = self.uses.get(page, 0) + 1
+                if reusable and self.uses[page] < self.max_uses and not page.is_closed():
+                    await self.release(key, page)
+                else:
+                    await self.close_page(page)
+
+    async def render(self, html: str, page_option: dict, screenshot_option: dict) -> bytes:
+        start = time.perf_counter()
+        async with self.page(page_option) as page:
+            # 模板中的<body class=...>等需要按完整文档解析,因此仍使用set_content
+            await page.set_content(f"{self.head}{html}</body></html>")
+            result = await page.screenshot(**screenshot_option)
+        self.latency.observe(time.perf_counter() - start)
+        return result
+
+    def get_stats(self) -> dict:
+        return {
+            "max_pages": self.max_pages,
+            "in_use": self.in_use,
+            "idle": self.idle_count,
+            "created": self.created,
+            "hits": self.hits,
+            "misses": self.misses,
+            "latency": self.latency.get_stats(),
+        }
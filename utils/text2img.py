@@ -1,52 +1,70 @@
+from functools import lru_cache
 from pathlib import Path
 from jinja2 import Template
 from markdown_it import MarkdownIt
 from mdit_py_plugins.dollarmath import dollarmath_plugin
 
 from creart import create
-from graiax.text2img.playwright.renderer import BuiltinCSS
 from graiax.text2img.playwright.plugins.code.highlighter import Highlighter
-from graiax.text2img.playwright import HTMLRenderer, MarkdownConverter, PageOption, ScreenshotOption
+from graiax.text2img.playwright import MarkdownConverter
 
 from core.bot import Umaru
+from utils.render_pool import DEFAULT_PAGE_OPTION, get_render_pool
 
 config = create(Umaru).config
 proxy = config.proxy if config.proxy != "proxy" else None
+# {模板路径: (修改时间, 模板)}
+_file_templates: dict[Path, tuple[int, Template]] = {}
+
+
+@lru_cache(maxsize=64)
+def compile_template(source: str) -> Template:
+    return Template(source)
+
+
+def load_template(path: Path) -> Template:
+    """读取并编译模板文件,文件未修改时直接使用缓存"""
+    if not path.is_file():
+        raise ValueError("Path for template is not a file!")
+    mtime = path.stat().st_mtime_ns
+    cached = _file_templates.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    template = Template(path.read_text(encoding="utf-8"))
+    _file_templates[path] = (mtime, template)
+    return template
+
+
+@lru_cache(maxsize=None)
+def get_markdown_converter() -> MarkdownConverter:
+    md = MarkdownIt("gfm-like", {"highlight": Highlighter()}).use(
+        dollarmath_plugin,
+        allow_labels=True,
+        allow_space=True,
+        allow_digits=True,
+        double_inline=True,
+    ).enable("table")
+    return MarkdownConverter(md)
 
 
 async def html2img(
     html: str, page_option: dict | None = None, extra_screenshot_option: dict | None = None, use_proxy: bool = False
 ) -> bytes:
-    page_option = page_option or {"viewport": {"width": 1000, "height": 10}, "device_scale_factor": 1.5}
+    page_option = dict(page_option or DEFAULT_PAGE_OPTION)
     if use_proxy and proxy:
         page_option["proxy"] = {"server": proxy}
-    extra_screenshot_option = extra_screenshot_option or {"type": "jpeg", "quality": 80, "scale": "device"}
-    return await HTMLRenderer(
-        css=(
-            BuiltinCSS.reset,
-            BuiltinCSS.github,
-            BuiltinCSS.one_dark,
-            BuiltinCSS.container,
-            "body {padding: 0 !important}"
-        )
-    ).render(
-        html,
-        extra_page_option=PageOption(**page_option),
-        extra_screenshot_option=ScreenshotOption(**extra_screenshot_option),
-    )
+    screenshot_option = {
+        "full_page": True,
+        "type": "jpeg",
+        **(extra_screenshot_option or {"type": "jpeg", "quality": 80, "scale": "device"})
+    }
+    return await get_render_pool().render(html, page_option, screenshot_option)
 
 
 async def md2img(
     markdown: str, page_option: dict | None = None, extra_screenshot_option: dict | None = None, use_proxy: bool = False
 ) -> bytes:
-    md = MarkdownIt("gfm-like", {"highlight": Highlighter()}).use(
-        dollarmath_plugin,
-        allow_labels=True,
-        allow_space=True,
-        allow_digits=True,
-        double_inline=True,
-    ).enable("table")
-    res = MarkdownConverter(md).convert(markdown)
+    res = get_markdown_converter().convert(markdown)
     return await html2img(res, page_option, extra_screenshot_option, use_proxy)
 
 
@@ -58,9 +76,7 @@ async def template2img(
     use_proxy: bool = False
 ) -> bytes:
     if isinstance(template, str):
-        template = Template(template)
+        template = compile_template(template)
     elif isinstance(template, Path):
-        if not template.is_file():
-            raise ValueError("Path for template is not a file!") 
-        template = Template(template.read_text(encoding="utf-8"))
+        template = load_template(template)
     return await html2img(template.render(params), page_option, extra_screenshot_option, use_proxy)